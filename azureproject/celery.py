@@ -0,0 +1,20 @@
+"""
+Celery application for azureproject.
+
+Workers are started per queue, so CPU-heavy session processing never waits behind weather requests:
+
+    celery -A azureproject worker -Q default,cpu --concurrency <cores>
+    celery -A azureproject worker -Q io --pool threads --concurrency 32
+
+Configuration is read from the CELERY_* Django settings.
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'azureproject.settings')
+
+app = Celery('azureproject')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
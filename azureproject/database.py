@@ -0,0 +1,79 @@
+"""
+Connection management for the Postgres database, configured from environment variables.
+
+DB_CONN_MAX_AGE        Seconds a connection is kept open between requests (default 600, 0 closes it after
+                       every request). Each gunicorn thread holds its own connection, so a deployment keeps
+                       up to workers x threads connections open.
+DB_CONN_HEALTH_CHECKS  Check a persistent connection before a request reuses it (default true), so a
+                       connection dropped by the server or a failover costs a reconnect instead of an error.
+DB_CONNECT_TIMEOUT     Seconds to wait for a new connection (default 10).
+DB_POOL                Share a psycopg 3 connection pool between the threads of a process instead of keeping
+                       one persistent connection per thread (default false, requires Django 5.1+ and psycopg 3).
+DB_POOL_MIN_SIZE       Connections the pool keeps open (default 1).
+DB_POOL_MAX_SIZE       Connections the pool opens at most (default 4, the gunicorn threads in startup.sh).
+DB_POOL_TIMEOUT        Seconds a request waits for a pooled connection (default 10).
+DB_PGBOUNCER           The host is a PgBouncer in transaction pooling mode (default false). Server-side
+                       cursors and prepared statements do not survive across transactions there, so both are
+                       disabled.
+"""
+
+import importlib.util
+import os
+
+import django
+from django.core.exceptions import ImproperlyConfigured
+
+
+def env_bool(name, default=False):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.lower() in ['true', '1', 't', 'y', 'yes']
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    if value in (None, ''):
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ImproperlyConfigured(f"{name} must be an integer, got {value!r}")
+
+
+def postgres_database(name, host, user, password, **options):
+    """A DATABASES entry for Postgres with connection management configured from the environment.
+
+    Extra keyword arguments are passed on to the driver as connection options (e.g. sslmode).
+    """
+    psycopg3 = importlib.util.find_spec('psycopg') is not None
+    options = {'connect_timeout': env_int('DB_CONNECT_TIMEOUT', 10), **options}
+    database = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': name,
+        'HOST': host,
+        'USER': user,
+        'PASSWORD': password,
+        'CONN_MAX_AGE': env_int('DB_CONN_MAX_AGE', 600),
+        'CONN_HEALTH_CHECKS': env_bool('DB_CONN_HEALTH_CHECKS', True),
+        'OPTIONS': options,
+    }
+
+    if env_bool('DB_PGBOUNCER'):
+        database['DISABLE_SERVER_SIDE_CURSORS'] = True
+        if psycopg3:
+            # psycopg 3 prepares statements that run repeatedly on one connection; psycopg2 never does
+            options['prepare_threshold'] = None
+
+    if env_bool('DB_POOL'):
+        if django.VERSION < (5, 1) or not psycopg3:
+            raise ImproperlyConfigured("DB_POOL requires Django 5.1+ and psycopg 3 (pip install 'psycopg[pool]')")
+        # the pool replaces persistent connections, Django refuses to combine the two
+        database['CONN_MAX_AGE'] = 0
+        options['pool'] = {
+            'min_size': env_int('DB_POOL_MIN_SIZE', 1),
+            'max_size': env_int('DB_POOL_MAX_SIZE', 4),
+            'timeout': env_int('DB_POOL_TIMEOUT', 10),
+        }
+
+    return database
@@ -1,6 +1,7 @@
 import os
 
 from .settings import *  # noqa
+from .database import postgres_database
 from .settings import BASE_DIR
 
 # Configure the domain name using the environment variable
@@ -31,13 +32,12 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 conn_str = os.environ['AZURE_POSTGRESQL_CONNECTIONSTRING']
 conn_str_params = {pair.split('=')[0]: pair.split('=')[1] for pair in conn_str.split(' ')}
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': conn_str_params['dbname'],
-        'HOST': conn_str_params['host'],
-        'USER': conn_str_params['user'],
-        'PASSWORD': conn_str_params['password'],
-    }
+    'default': postgres_database(
+        name=conn_str_params['dbname'],
+        host=conn_str_params['host'],
+        user=conn_str_params['user'],
+        password=conn_str_params['password'],
+    )
 }
 
 CACHES = {
@@ -49,4 +49,6 @@ CACHES = {
                 "COMPRESSOR": "django_redis.compressors.zlib.ZlibCompressor",
         },
     }
-}
\ No newline at end of file
+}
+
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL') or os.environ.get('AZURE_REDIS_CONNECTIONSTRING')
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 import os
 from pathlib import Path
 
+from azureproject.database import postgres_database
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -92,19 +94,24 @@ WSGI_APPLICATION = 'azureproject.wsgi.application'
 
 # Configure Postgres database for local development
 #   Set these environment variables in the .env file for this project.
+#   Persistent connections and pooling are configured with the DB_* variables described in database.py.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': os.environ.get('DBNAME'),
-        'HOST': os.environ.get('DBHOST'),
-        'USER': os.environ.get('DBUSER'),
-        'PASSWORD': os.environ.get('DBPASS'),
-    }
+    'default': postgres_database(
+        name=os.environ.get('DBNAME'),
+        host=os.environ.get('DBHOST'),
+        user=os.environ.get('DBUSER'),
+        password=os.environ.get('DBPASS'),
+    )
 }
 
+# OpenWeather One Call API key, used to enrich sessions with wind data
+OPENWEATHERMAP_API_KEY = os.environ.get('OPENWEATHERMAP_API_KEY')
+
 # Media files
 MEDIA_ROOT = os.path.join(BASE_DIR, 'upload_data') # media directory in the root directory
 MEDIA_URL = '/upload_data/'
+# largest TCX document accepted, in bytes after decompressing a gzip upload (10 hours at 1 Hz are ~15 MB)
+TCX_MAX_DECOMPRESSED_SIZE = int(os.getenv('TCX_MAX_DECOMPRESSED_SIZE', 100 * 2**20))
 
 
 # Password validation
@@ -147,6 +154,28 @@ else:
     SESSION_ENGINE = "django.contrib.sessions.backends.cache"
 
 
+# Celery: the broker defaults to the Redis cache, or to an in-process memory broker without Redis
+#   (enough for tests and for sending tasks; workers then have to run in the same process).
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL') or (os.environ.get('CACHELOCATION') if USE_REDIS else 'memory://')
+CELERY_TASK_IGNORE_RESULT = True  # callers follow UserSession.status instead of task results
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+# CPU-heavy pipeline stages and I/O-bound weather requests get their own queues and workers
+CELERY_TASK_ROUTES = {
+    'sessionData.tasks.run_session_stage': {'queue': 'cpu'},
+    'sessionData.tasks.finish_session_processing': {'queue': 'cpu'},
+    'sessionData.tasks.fetch_session_weather': {'queue': 'io'},
+}
+# tasks run for seconds to minutes: reserve one at a time and acknowledge it only once it is done,
+# and requeue the task of a worker process that died (e.g. killed for its memory) instead of
+# acknowledging it as failed, so it is redelivered instead of dropped
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+CELERY_TASK_SOFT_TIME_LIMIT = int(os.getenv('CELERY_TASK_SOFT_TIME_LIMIT', 300))
+CELERY_TASK_TIME_LIMIT = int(os.getenv('CELERY_TASK_TIME_LIMIT', 360))
+CELERY_WORKER_MAX_MEMORY_PER_CHILD = int(os.getenv('CELERY_WORKER_MAX_MEMORY_PER_CHILD', 512_000))  # KiB
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.0/topics/i18n/
 
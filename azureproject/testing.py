@@ -0,0 +1,27 @@
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """TestCase mixin that fails when code runs more database queries than its budget.
+
+    Unlike assertNumQueries, staying below the budget passes, so budgets only have to be touched
+    when a view gets more expensive. The failure message lists every query, which makes N+1
+    patterns easy to spot.
+    """
+    @contextmanager
+    def assertQueryBudget(self, budget, using=DEFAULT_DB_ALIAS):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        if len(context) > budget:
+            queries = '\n'.join(f"{i}. {query['sql']}" for i, query in enumerate(context.captured_queries, 1))
+            self.fail(f"{len(context)} queries executed, the budget is {budget}:\n{queries}")
+
+    def assertViewQueryBudget(self, budget, url, method='get', data=None, status_code=200, **extra):
+        """Request `url` with the test client, asserting its status code and query budget; returns the response."""
+        with self.assertQueryBudget(budget):
+            response = getattr(self.client, method)(url, data, **extra)
+        self.assertEqual(response.status_code, status_code)
+        return response
@@ -0,0 +1,54 @@
+import os
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+
+from .database import postgres_database
+
+
+def database(**environ):
+    with mock.patch.dict(os.environ, environ):
+        return postgres_database(name='app', host='db', user='user', password='password')
+
+
+class PostgresDatabaseTestCase(SimpleTestCase):
+    def test_persistent_connections_with_health_checks_by_default(self):
+        with mock.patch.dict(os.environ):
+            for name in [name for name in os.environ if name.startswith('DB_')]:
+                del os.environ[name]
+            settings = database()
+        self.assertEqual(settings['CONN_MAX_AGE'], 600)
+        self.assertTrue(settings['CONN_HEALTH_CHECKS'])
+        self.assertEqual(settings['OPTIONS'], {'connect_timeout': 10})
+        self.assertNotIn('DISABLE_SERVER_SIDE_CURSORS', settings)
+
+    def test_environment_sizing(self):
+        settings = database(DB_CONN_MAX_AGE='0', DB_CONN_HEALTH_CHECKS='false', DB_CONNECT_TIMEOUT='3')
+        self.assertEqual(settings['CONN_MAX_AGE'], 0)
+        self.assertFalse(settings['CONN_HEALTH_CHECKS'])
+        self.assertEqual(settings['OPTIONS']['connect_timeout'], 3)
+
+        with self.assertRaisesMessage(ImproperlyConfigured, "DB_CONN_MAX_AGE must be an integer"):
+            database(DB_CONN_MAX_AGE='forever')
+
+    def test_pgbouncer_disables_server_side_cursors(self):
+        with mock.patch('importlib.util.find_spec', return_value=None):
+            settings = database(DB_PGBOUNCER='true')
+        self.assertTrue(settings['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertNotIn('prepare_threshold', settings['OPTIONS'])
+
+        with mock.patch('importlib.util.find_spec', return_value=object()):
+            settings = database(DB_PGBOUNCER='true')
+        self.assertIsNone(settings['OPTIONS']['prepare_threshold'])
+
+    def test_pool_replaces_persistent_connections(self):
+        with mock.patch('importlib.util.find_spec', return_value=object()), \
+                mock.patch('django.VERSION', (5, 1, 0, 'final', 0)):
+            settings = database(DB_POOL='true', DB_POOL_MAX_SIZE='8')
+        self.assertEqual(settings['CONN_MAX_AGE'], 0)
+        self.assertEqual(settings['OPTIONS']['pool'], {'min_size': 1, 'max_size': 8, 'timeout': 10})
+
+        with mock.patch('importlib.util.find_spec', return_value=None):
+            with self.assertRaisesMessage(ImproperlyConfigured, "DB_POOL requires"):
+                database(DB_POOL='true')
@@ -0,0 +1,49 @@
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from restaurant_review.models import Restaurant, Review
+
+
+def add_rating(restaurant_id, rating):
+    """Count a new review's rating in its restaurant's aggregates.
+
+    The increment is done by the database, so concurrent reviews never overwrite each other; call
+    it in the transaction that saves the review.
+    """
+    Restaurant.objects.filter(pk=restaurant_id).update(
+        rating_sum=F('rating_sum') + rating,
+        review_count=F('review_count') + 1,
+    )
+
+
+def _actual(restaurant_model=Restaurant, review_model=Review):
+    # rating sum and review count computed from the reviews, per restaurant
+    totals = (review_model.objects.filter(restaurant=OuterRef('pk'))
+              .order_by().values('restaurant')
+              .annotate(rating_sum=Sum('rating'), review_count=Count('pk')))
+    return {
+        'rating_sum': Coalesce(Subquery(totals.values('rating_sum')), 0),
+        'review_count': Coalesce(Subquery(totals.values('review_count')), 0),
+    }
+
+
+def backfill(batch_size=1000, restaurant_model=Restaurant, review_model=Review):
+    """Recompute the aggregates of all restaurants from their reviews, one UPDATE per batch of restaurants.
+
+    Also used by the migration that adds the columns, with its historical models.
+    """
+    ids = list(restaurant_model.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), batch_size):
+        restaurant_model.objects.filter(pk__in=ids[start:start + batch_size]).update(
+            **_actual(restaurant_model, review_model)
+        )
+    return len(ids)
+
+
+def inconsistent_restaurants():
+    """Restaurants whose stored aggregates differ from their reviews, annotated with the actual values."""
+    actual = _actual()
+    return (Restaurant.objects
+            .annotate(actual_rating_sum=actual['rating_sum'], actual_review_count=actual['review_count'])
+            .exclude(rating_sum=F('actual_rating_sum'), review_count=F('actual_review_count'))
+            .order_by('pk'))
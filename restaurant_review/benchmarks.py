@@ -0,0 +1,123 @@
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+
+import requests
+
+from django.db import transaction
+from django.db.models import Avg, Count
+from django.test import RequestFactory
+from django.utils import timezone
+
+from restaurant_review import aggregates
+from restaurant_review.caching import INDEX_VERSION_KEY, index_cache
+from restaurant_review.models import Restaurant, Review
+from restaurant_review.views import index
+
+
+def populate(n_restaurants, n_reviews, seed=0, batch_size=10_000):
+    """Create synthetic restaurants and reviews spread randomly across them."""
+    rng = random.Random(seed)
+    Restaurant.objects.bulk_create(
+        (Restaurant(name=f"Restaurant {i}", street_address=f"{i} Benchmark Street", description="Synthetic")
+         for i in range(n_restaurants)),
+        batch_size=batch_size,
+    )
+    ids = list(Restaurant.objects.values_list('pk', flat=True))
+    now = timezone.now()
+    for start in range(0, n_reviews, batch_size):
+        Review.objects.bulk_create([
+            Review(restaurant_id=rng.choice(ids), user_name="benchmark", rating=rng.randint(1, 5),
+                   review_text="Synthetic review", review_date=now)
+            for _ in range(start, min(start + batch_size, n_reviews))
+        ])
+
+
+def _timed(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark_index(n_restaurants=10_000, n_reviews=1_000_000, repeat=3):
+    """Index page latency with the GROUP BY over all reviews versus the maintained aggregates.
+
+    Runs in the configured database inside a transaction that is rolled back, so the synthetic
+    rows never become visible. Times are the best of `repeat` runs.
+    """
+    request = RequestFactory().get('/')
+    request.session = {}
+    with transaction.atomic():
+        start = time.perf_counter()
+        populate(n_restaurants, n_reviews)
+        populate_seconds = time.perf_counter() - start
+        backfill_seconds = _timed(aggregates.backfill, 1)
+
+        results = {
+            'restaurants': n_restaurants,
+            'reviews': n_reviews,
+            'populate_seconds': populate_seconds,
+            'backfill_seconds': backfill_seconds,
+            'group_by_query_seconds': _timed(lambda: list(
+                Restaurant.objects.annotate(avg=Avg('review__rating'), count=Count('review'))), repeat),
+            'aggregate_query_seconds': _timed(lambda: list(
+                Restaurant.objects.only('name', 'rating_sum', 'review_count')), repeat),
+            'index_view_seconds': _timed(lambda: (index_cache.bump(INDEX_VERSION_KEY), index(request)), repeat),
+            'index_view_cached_seconds': _timed(lambda: index(request), repeat),
+        }
+        index_cache.bump(INDEX_VERSION_KEY)
+        transaction.set_rollback(True)
+    return results
+
+
+def _percentile(latencies, percent):
+    # nearest rank on the sorted latencies
+    index = max(0, min(len(latencies) - 1, round(percent / 100 * len(latencies)) - 1))
+    return latencies[index]
+
+
+def load_test(urls, total_requests=1000, concurrency=8, warmup=10, timeout=30, headers=None):
+    """Latency percentiles of `total_requests` GETs spread over `urls` by `concurrency` threads.
+
+    Every thread keeps its own HTTP session (keep-alive), like a browser, so the measured latency is
+    the server's: a server that opens a new database connection per request shows it in every sample.
+    The first `warmup` requests are not measured. `headers` are sent with every request, e.g. the
+    session cookie of a logged in user.
+    """
+    local = threading.local()
+
+    def get(url):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+            local.session.headers.update(headers or {})
+        start = time.perf_counter()
+        try:
+            status = local.session.get(url, timeout=timeout).status_code
+        except requests.RequestException:
+            status = None
+        return time.perf_counter() - start, status
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(get, islice(cycle(urls), warmup)))
+        start = time.perf_counter()
+        results = list(executor.map(get, islice(cycle(urls), total_requests)))
+        seconds = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, status in results if status is not None and status < 400)
+    return {
+        'requests': total_requests,
+        'concurrency': concurrency,
+        'errors': total_requests - len(latencies),
+        'seconds': seconds,
+        'requests_per_second': total_requests / seconds if seconds else 0.0,
+        'mean_seconds': statistics.fmean(latencies) if latencies else None,
+        'p50_seconds': _percentile(latencies, 50) if latencies else None,
+        'p90_seconds': _percentile(latencies, 90) if latencies else None,
+        'p99_seconds': _percentile(latencies, 99) if latencies else None,
+    }
@@ -0,0 +1,131 @@
+import hashlib
+import logging
+import math
+import random
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+logger = logging.getLogger(__name__)
+
+
+class FragmentCache:
+    """Cache of rendered fragments, invalidated by bumping a version counter per object.
+
+    Entries are stored under (object key, current version, variant), so bump() makes every cached
+    variant of an object unreachable at once and entries can live for a long time. A version that
+    is missing (never set or evicted) starts at the current time, so it never returns to a value
+    stale entries were stored under.
+
+    Against stampedes, only the request holding a short lock renders a missing entry while the
+    others wait for it (up to lock_wait seconds, or until the lock is released without an entry,
+    e.g. because render() raised), and entries are recomputed probabilistically
+    before they expire (XFetch: the slower the render, the earlier), while the old value is still
+    served from the cache for `grace` seconds. Hits, misses (renders) and stale values served
+    are counted in the cache (see stats()).
+    """
+    def __init__(self, name, timeout, grace=300, lock_timeout=30, lock_wait=5.0, beta=1.0):
+        self.name = name
+        self.timeout = timeout
+        self.grace = grace
+        self.lock_timeout = lock_timeout
+        self.lock_wait = lock_wait
+        self.beta = beta
+
+    def _key(self, *parts):
+        return ':'.join(['restaurant_review', self.name, *map(str, parts)])
+
+    def version(self, key):
+        version_key = self._key('version', key)
+        version = cache.get(version_key)
+        if version is None:
+            cache.add(version_key, time.time_ns(), timeout=None)
+            version = cache.get(version_key)
+        return version
+
+    def bump(self, key):
+        version_key = self._key('version', key)
+        try:
+            cache.incr(version_key)
+        except ValueError:
+            cache.add(version_key, time.time_ns(), timeout=None)
+
+    def bump_on_commit(self, key):
+        # readers must not cache the old state again before the change is visible to them
+        transaction.on_commit(lambda: self.bump(key))
+
+    def get_or_set(self, key, render, variant=''):
+        """The cached fragment for the object `key` (and variant), rendered with render() on a miss."""
+        variant = hashlib.md5(variant.encode()).hexdigest() if variant else ''
+        entry_key = self._key(key, self.version(key), variant)
+        entry = cache.get(entry_key)
+        if entry is not None and not self._recompute_early(entry):
+            return self._hit(key, entry)
+
+        lock_key = f'{entry_key}:lock'
+        if cache.add(lock_key, 1, self.lock_timeout):
+            try:
+                return self._render(key, entry_key, render)
+            finally:
+                cache.delete(lock_key)
+        if entry is not None:
+            # another request is recomputing it
+            self._count('stale')
+            return entry['value']
+
+        deadline = time.monotonic() + self.lock_wait
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(entry_key)
+            if entry is not None:
+                return self._hit(key, entry)
+            if cache.get(lock_key) is None:
+                # the lock holder failed, so the entry will not come
+                break
+        return self._render(key, entry_key, render)
+
+    def _recompute_early(self, entry):
+        # XFetch: recompute with a probability that rises as the logical expiry approaches
+        return time.time() - entry['delta'] * self.beta * math.log(1.0 - random.random()) >= entry['expires']
+
+    def _hit(self, key, entry):
+        self._count('hits')
+        logger.debug(f"{self.name} cache hit for {key}")
+        return entry['value']
+
+    def _render(self, key, entry_key, render):
+        self._count('misses')
+        logger.debug(f"{self.name} cache miss for {key}")
+        start = time.perf_counter()
+        value = render()
+        delta = time.perf_counter() - start
+        cache.set(entry_key, {'value': value, 'delta': delta, 'expires': time.time() + self.timeout},
+                  self.timeout + self.grace)
+        return value
+
+    def _count(self, counter):
+        counter_key = self._key('stats', counter)
+        try:
+            cache.incr(counter_key)
+        except ValueError:
+            if not cache.add(counter_key, 1, timeout=None):
+                cache.incr(counter_key)
+
+    def stats(self):
+        counts = cache.get_many([self._key('stats', counter) for counter in ('hits', 'misses', 'stale')])
+        hits, misses, stale = (counts.get(self._key('stats', counter), 0) for counter in ('hits', 'misses', 'stale'))
+        served = hits + misses + stale
+        return {'hits': hits, 'misses': misses, 'stale': stale, 'hit_ratio': (hits + stale) / served if served else None}
+
+    def reset_stats(self):
+        cache.delete_many([self._key('stats', counter) for counter in ('hits', 'misses', 'stale')])
+
+
+details_cache = FragmentCache('details', timeout=24 * 3600)
+# every restaurant list page, under one version bumped by every write
+index_cache = FragmentCache('index', timeout=3600)
+INDEX_VERSION_KEY = 'all'
+
+FRAGMENT_CACHES = [index_cache, details_cache]
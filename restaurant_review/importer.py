@@ -0,0 +1,184 @@
+import csv
+import json
+import time
+from dataclasses import dataclass, field
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from restaurant_review.caching import INDEX_VERSION_KEY, details_cache, index_cache
+from restaurant_review.models import Restaurant, Review
+
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+MAX_REPORTED_ERRORS = 100
+
+# columns of an import row; a row without review columns only creates its restaurant
+RESTAURANT_COLUMNS = {'restaurant_name': 'name', 'street_address': 'street_address', 'description': 'description'}
+REVIEW_COLUMNS = ('user_name', 'rating', 'review_text', 'review_date')
+
+
+@dataclass
+class ImportStats:
+    rows: int = 0
+    invalid: int = 0
+    restaurants: int = 0
+    reviews: int = 0
+    seconds: float = 0.0
+    errors: list = field(default_factory=list)  # (row number, message), the first MAX_REPORTED_ERRORS
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {'rows': self.rows, 'invalid': self.invalid, 'restaurants': self.restaurants, 'reviews': self.reviews,
+                'seconds': round(self.seconds, 3), 'rows_per_second': round(self.rows_per_second, 1), 'errors': self.errors}
+
+
+def read_records(lines, format):
+    """(row number, record) for every row of CSV (with a header) or NDJSON text lines.
+
+    Rows that cannot be decoded are yielded as (row number, ValueError).
+    """
+    if format == 'csv':
+        for number, record in enumerate(csv.DictReader(lines), 1):
+            yield number, record
+    elif format == 'ndjson':
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("expected a JSON object")
+                yield number, record
+            except ValueError as e:
+                yield number, ValueError(f"invalid JSON: {e}")
+    else:
+        raise ValueError(f"Unknown import format {format!r}, expected one of {', '.join(IMPORT_FORMATS)}")
+
+
+def _clean(model, name, value):
+    return model._meta.get_field(name).clean(value, None)
+
+
+def validate_record(record):
+    """Cleaned restaurant lookup and review fields of a row (review None for a restaurant-only row).
+
+    The restaurant is either an existing `restaurant_id` or the restaurant columns. Raises ValidationError.
+    """
+    if record.get('restaurant_id') not in (None, ''):
+        restaurant = {'pk': _clean(Restaurant, 'id', record['restaurant_id'])}
+    else:
+        restaurant = {name: _clean(Restaurant, name, record.get(column))
+                      for column, name in RESTAURANT_COLUMNS.items()}
+
+    if not any(record.get(column) not in (None, '') for column in REVIEW_COLUMNS):
+        return restaurant, None
+    review = {name: _clean(Review, name, record.get(name)) for name in ('user_name', 'rating', 'review_text')}
+    review_date = record.get('review_date')
+    review_date = _clean(Review, 'review_date', review_date) if review_date else timezone.now()
+    if timezone.is_naive(review_date):
+        review_date = timezone.make_aware(review_date)
+    review['review_date'] = review_date
+    return restaurant, review
+
+
+def _error_message(error):
+    if isinstance(error, ValidationError):
+        return '; '.join(error.messages)
+    return str(error)
+
+
+def import_records(records, batch_size=1000, stats=None):
+    """Import restaurants and reviews from (row number, record) pairs, one transaction per batch.
+
+    Each batch is validated first; invalid rows are counted and reported, the valid ones are
+    written with bulk_create and the rating aggregates of every restaurant in the batch are
+    updated with one UPDATE per distinct increment.
+    """
+    stats = stats or ImportStats()
+    start = time.perf_counter()
+    records = iter(records)
+    while batch := list(islice(records, batch_size)):
+        _import_batch(batch, stats)
+    stats.seconds += time.perf_counter() - start
+    return stats
+
+
+def _import_batch(batch, stats):
+    valid = []
+    for number, record in batch:
+        stats.rows += 1
+        try:
+            if isinstance(record, Exception):
+                raise record
+            valid.append((number, *validate_record(record)))
+        except (ValidationError, ValueError, TypeError) as e:
+            _reject(stats, number, _error_message(e))
+
+    with transaction.atomic():
+        restaurants = _resolve_restaurants([restaurant for _, restaurant, _ in valid], stats)
+        reviews = []
+        for number, restaurant, review in valid:
+            restaurant_id = restaurants.get(_restaurant_key(restaurant))
+            if restaurant_id is None:
+                _reject(stats, number, f"Restaurant {restaurant['pk']} does not exist.")
+                continue
+            if review is None:
+                continue
+            reviews.append(Review(restaurant_id=restaurant_id, **review))
+        Review.objects.bulk_create(reviews)
+        stats.reviews += len(reviews)
+        _add_ratings(reviews)
+
+        for restaurant_id in {review.restaurant_id for review in reviews}:
+            details_cache.bump_on_commit(restaurant_id)
+        index_cache.bump_on_commit(INDEX_VERSION_KEY)
+
+
+def _reject(stats, number, message):
+    stats.invalid += 1
+    if len(stats.errors) < MAX_REPORTED_ERRORS:
+        stats.errors.append((number, message))
+
+
+def _restaurant_key(restaurant):
+    return restaurant.get('pk') or (restaurant['name'], restaurant['street_address'])
+
+
+def _resolve_restaurants(restaurants, stats):
+    # restaurant key -> id: existing ids are checked, (name, address) pairs are looked up or created
+    ids = {restaurant['pk'] for restaurant in restaurants if 'pk' in restaurant}
+    resolved = {pk: pk for pk in Restaurant.objects.filter(pk__in=ids).values_list('pk', flat=True)}
+
+    named = {_restaurant_key(restaurant): restaurant for restaurant in restaurants if 'pk' not in restaurant}
+    if named:
+        existing = Restaurant.objects.filter(name__in={name for name, _ in named}).values_list('name', 'street_address', 'pk')
+        for name, street_address, pk in existing:
+            if (name, street_address) in named:
+                resolved.setdefault((name, street_address), pk)
+        created = Restaurant.objects.bulk_create([Restaurant(**restaurant) for key, restaurant in named.items() if key not in resolved])
+        for restaurant in created:
+            resolved[(restaurant.name, restaurant.street_address)] = restaurant.pk
+        stats.restaurants += len(created)
+    return resolved
+
+
+def _add_ratings(reviews):
+    # race-safe F() increments, one UPDATE per distinct (rating sum, review count) in the batch;
+    # a CASE with a branch per restaurant costs more to build than the rows it saves
+    totals = {}
+    for review in reviews:
+        rating_sum, review_count = totals.get(review.restaurant_id, (0, 0))
+        totals[review.restaurant_id] = (rating_sum + review.rating, review_count + 1)
+    increments = {}
+    for pk, total in totals.items():
+        increments.setdefault(total, []).append(pk)
+    for (rating_sum, review_count), pks in increments.items():
+        Restaurant.objects.filter(pk__in=pks).update(
+            rating_sum=F('rating_sum') + rating_sum, review_count=F('review_count') + review_count)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from restaurant_review import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Benchmark the restaurant pages on synthetic data (written in a transaction that is rolled back)"
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='target', required=True)
+
+        index = subparsers.add_parser('index', help="Index page latency: GROUP BY over reviews vs maintained aggregates")
+        index.add_argument('--restaurants', type=int, default=10_000)
+        index.add_argument('--reviews', type=int, default=1_000_000)
+        index.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        getattr(self, f"handle_{options['target']}")(options)
+
+    def handle_index(self, options):
+        result = benchmarks.benchmark_index(options['restaurants'], options['reviews'], options['repeat'])
+        self.stdout.write(f"{result['restaurants']} restaurants x {result['reviews']} reviews "
+                          f"(populated in {result['populate_seconds']:.1f}s, backfilled in {result['backfill_seconds']:.2f}s)")
+        self.stdout.write(f"{'GROUP BY query':>20} {result['group_by_query_seconds']:>8.3f}s")
+        self.stdout.write(f"{'aggregate query':>20} {result['aggregate_query_seconds']:>8.3f}s")
+        self.stdout.write(f"{'index view':>20} {result['index_view_seconds']:>8.3f}s")
+        self.stdout.write(f"{'index view (cached)':>20} {result['index_view_cached_seconds']:>8.6f}s")
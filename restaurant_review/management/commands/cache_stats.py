@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from restaurant_review.caching import FRAGMENT_CACHES
+
+
+class Command(BaseCommand):
+    help = "Show the hit/miss counts of the restaurant fragment caches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Reset the counters after showing them")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'cache':>10} {'hits':>10} {'misses':>10} {'hit ratio':>10}")
+        for fragment_cache in FRAGMENT_CACHES:
+            stats = fragment_cache.stats()
+            ratio = f"{stats['hit_ratio']:.1%}" if stats['hit_ratio'] is not None else '-'
+            self.stdout.write(f"{fragment_cache.name:>10} {stats['hits']:>10} {stats['misses']:>10} {ratio:>10}")
+            if options['reset']:
+                fragment_cache.reset_stats()
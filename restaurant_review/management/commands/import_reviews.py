@@ -0,0 +1,36 @@
+import io
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from restaurant_review.importer import IMPORT_FORMATS, import_records, read_records
+
+
+class Command(BaseCommand):
+    help = "Import restaurants and reviews from a CSV or NDJSON file, streamed in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, '-' for standard input")
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help="Input format (default: from the file extension)")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows validated and written per transaction")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if format not in IMPORT_FORMATS:
+            raise CommandError(f"Cannot tell the format of {path}, pass --format")
+
+        if path == '-':
+            stats = import_records(read_records(io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline=''), format),
+                                   options['batch_size'])
+        else:
+            with open(path, encoding='utf-8', newline='') as file:
+                stats = import_records(read_records(file, format), options['batch_size'])
+
+        for number, message in stats.errors:
+            self.stderr.write(f"row {number}: {message}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats.rows - stats.invalid} of {stats.rows} rows ({stats.restaurants} new restaurants, "
+            f"{stats.reviews} reviews, {stats.invalid} invalid) in {stats.seconds:.2f}s: {stats.rows_per_second:.0f} rows/s"
+        ))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from restaurant_review import benchmarks
+
+
+class Command(BaseCommand):
+    help = ("Load test a running server and report latency percentiles; run it once per configuration "
+            "(e.g. DB_CONN_MAX_AGE=0 and the default, or SERVER_MODE=asgi and wsgi) to compare them")
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help="URLs to request in turn, e.g. http://localhost:8000/")
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[8],
+                            help="Concurrent clients; several values measure how a server copes as they grow")
+        parser.add_argument('--warmup', type=int, default=10, help="Requests sent before measuring")
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--header', action='append', default=[], metavar='"NAME: VALUE"',
+                            help="Header sent with every request, e.g. \"Cookie: sessionid=...\"")
+
+    def handle(self, *args, **options):
+        headers = {}
+        for header in options['header']:
+            name, separator, value = header.partition(':')
+            if not separator:
+                raise CommandError(f"Invalid header {header!r}, expected \"NAME: VALUE\"")
+            headers[name.strip()] = value.strip()
+
+        self.stdout.write(f"{'clients':>8} {'requests/s':>11} {'errors':>7} {'mean ms':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}")
+        for concurrency in options['concurrency']:
+            result = benchmarks.load_test(options['urls'], options['requests'], concurrency,
+                                          options['warmup'], options['timeout'], headers)
+            if result['p50_seconds'] is None:
+                raise CommandError(f"All {result['requests']} requests failed with {concurrency} clients")
+            self.stdout.write(
+                f"{concurrency:>8} {result['requests_per_second']:>11.1f} {result['errors']:>7} "
+                + ' '.join(f"{result[f'{name}_seconds'] * 1000:>9.1f}" for name in ('mean', 'p50', 'p90', 'p99'))
+            )
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from restaurant_review import aggregates
+from restaurant_review.caching import INDEX_VERSION_KEY, details_cache, index_cache
+from restaurant_review.models import Restaurant
+
+
+class Command(BaseCommand):
+    help = "Backfill or check the denormalized restaurant rating aggregates"
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='target', required=True)
+
+        backfill = subparsers.add_parser('backfill', help="Recompute the aggregates of every restaurant from its reviews")
+        backfill.add_argument('--batch-size', type=int, default=1000)
+
+        check = subparsers.add_parser('check', help="List restaurants whose aggregates differ from their reviews")
+        check.add_argument('--fix', action='store_true', help="Backfill if any restaurant is inconsistent")
+
+    def handle(self, *args, **options):
+        getattr(self, f"handle_{options['target']}")(options)
+
+    def bump_caches(self, restaurant_ids):
+        # the index shows every restaurant's rating, the details page of each its own
+        index_cache.bump(INDEX_VERSION_KEY)
+        for restaurant_id in restaurant_ids:
+            details_cache.bump(restaurant_id)
+
+    def handle_backfill(self, options):
+        count = aggregates.backfill(options['batch_size'])
+        self.bump_caches(Restaurant.objects.values_list('pk', flat=True).iterator())
+        self.stdout.write(self.style.SUCCESS(f"Recomputed rating aggregates of {count} restaurants"))
+
+    def handle_check(self, options):
+        inconsistent = list(aggregates.inconsistent_restaurants())
+        for restaurant in inconsistent:
+            self.stdout.write(
+                f"{restaurant.pk} {restaurant.name}: stored {restaurant.rating_sum}/{restaurant.review_count}, "
+                f"actual {restaurant.actual_rating_sum}/{restaurant.actual_review_count}"
+            )
+        if not inconsistent:
+            self.stdout.write(self.style.SUCCESS("All rating aggregates are consistent"))
+        elif options['fix']:
+            aggregates.backfill()
+            self.bump_caches(restaurant.pk for restaurant in inconsistent)
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(inconsistent)} inconsistent restaurants"))
+        else:
+            raise CommandError(f"{len(inconsistent)} restaurants have inconsistent rating aggregates")
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.6 on 2026-10-18 05:49
+
+from django.db import migrations, models
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    from restaurant_review.aggregates import backfill
+
+    backfill(
+        restaurant_model=apps.get_model("restaurant_review", "Restaurant"),
+        review_model=apps.get_model("restaurant_review", "Review"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("restaurant_review", "0002_alter_review_rating"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="restaurant",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="restaurant",
+            name="review_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.6 on 2026-10-18 05:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("restaurant_review", "0003_rating_aggregates"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["restaurant", "review_date", "id"],
+                name="review_restaurant_date_idx",
+            ),
+        ),
+    ]
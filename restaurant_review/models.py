@@ -7,10 +7,17 @@ class Restaurant(models.Model):
     name = models.CharField(max_length=50)
     street_address = models.CharField(max_length=50)
     description = models.CharField(max_length=250)
+    # denormalized rating aggregates, kept up to date by add_review (see restaurant_review.aggregates)
+    rating_sum = models.PositiveIntegerField(default=0)
+    review_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.name
 
+    @property
+    def avg_rating(self):
+        return self.rating_sum / self.review_count if self.review_count else None
+
 
 class Review(models.Model):
     restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE)
@@ -19,5 +26,11 @@ class Review(models.Model):
     review_text = models.CharField(max_length=500)
     review_date = models.DateTimeField('review date')
 
+    class Meta:
+        indexes = [
+            # keyset pagination of a restaurant's reviews by date (see restaurant_review.pagination)
+            models.Index(fields=['restaurant', 'review_date', 'id'], name='review_restaurant_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.restaurant.name} ({self.review_date:%x})"
\ No newline at end of file
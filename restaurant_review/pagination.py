@@ -0,0 +1,95 @@
+import base64
+import json
+from dataclasses import dataclass
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+
+
+def _encode_value(value):
+    # full precision: DjangoJSONEncoder would cut datetimes to milliseconds and break ties between rows
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+@dataclass
+class KeysetPage:
+    object_list: list
+    next_cursor: str = None
+    previous_cursor: str = None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """Keyset (seek) pagination of a queryset in a unique order, e.g. ['-review_date', '-id'].
+
+    A cursor holds the ordering values of the row a page ends (or starts) at, and a page is the
+    next page_size rows past it: one range query on an index matching the ordering, so its cost
+    does not depend on how deep the page is, and pages do not shift when rows are added.
+    """
+    def __init__(self, queryset, ordering, page_size=25):
+        self.queryset = queryset
+        self.keys = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+        self.ordering = ordering
+        self.page_size = page_size
+
+    def encode_cursor(self, obj):
+        values = [getattr(obj, name) for name, _ in self.keys]
+        return base64.urlsafe_b64encode(json.dumps(values, default=_encode_value).encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            if len(values) != len(self.keys):
+                raise ValueError("wrong number of values")
+            model = self.queryset.model
+            return [model._meta.get_field(name).to_python(value) for (name, _), value in zip(self.keys, values)]
+        except Exception as e:
+            raise InvalidPage(f"Invalid cursor: {e}")
+
+    def _seek(self, values, forward):
+        # (a, b) > (x, y) as (a > x) or (a = x and b > y), with the comparison flipped for descending keys
+        condition = Q()
+        for i, (name, descending) in enumerate(self.keys):
+            lookup = 'lt' if descending == forward else 'gt'
+            equal = {prefix: value for (prefix, _), value in zip(self.keys[:i], values[:i])}
+            condition |= Q(**equal, **{f'{name}__{lookup}': values[i]})
+        return condition
+
+    def page(self, after=None, before=None):
+        """The page following the cursor `after`, the page preceding `before`, or the first page."""
+        if before:
+            reverse = [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+            rows = list(self.queryset.filter(self._seek(self.decode_cursor(before), False))
+                        .order_by(*reverse)[:self.page_size + 1])
+            has_previous = len(rows) > self.page_size
+            rows = rows[:self.page_size][::-1]
+            has_next = True
+        else:
+            queryset = self.queryset
+            if after:
+                queryset = queryset.filter(self._seek(self.decode_cursor(after), True))
+            rows = list(queryset.order_by(*self.ordering)[:self.page_size + 1])
+            has_next = len(rows) > self.page_size
+            rows = rows[:self.page_size]
+            has_previous = bool(after)
+
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1]) if has_next and rows else None,
+            previous_cursor=self.encode_cursor(rows[0]) if has_previous and rows else None,
+        )
@@ -4,6 +4,8 @@ register = template.Library()
 
 
 @register.inclusion_tag('restaurant_review/star_rating.html')
-def star_rating(avg_rating, review_count):
+def star_rating(restaurant):
+    # reads the restaurant's maintained rating aggregates
+    avg_rating, review_count = restaurant.avg_rating, restaurant.review_count
     stars_percent = round((avg_rating / 5.0) * 100) if review_count > 0 else 0
     return {'avg_rating': avg_rating, 'review_count': review_count, 'stars_percent': stars_percent}
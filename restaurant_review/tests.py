@@ -1,9 +1,28 @@
 import datetime
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest.mock
 
-from django.test import TestCase
+from django.core.management import CommandError, call_command
+from django.core.cache import cache
+from django.core.paginator import InvalidPage
+from django.test import LiveServerTestCase, TestCase
 from django.urls import reverse
+from django.utils import timezone
 
-from .models import Restaurant
+from azureproject.testing import QueryBudgetMixin
+
+from django.contrib.auth.models import Permission, User
+
+from . import aggregates, benchmarks
+from .caching import FragmentCache, details_cache
+from .importer import import_records, read_records
+from .pagination import KeysetPaginator
+from .models import Restaurant, Review
 
 
 def create_restaurant():
@@ -16,6 +35,9 @@ def create_restaurant():
 
 # Initial tests created with GitHub Copilot
 class RestaurantRoutesTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
     def test_restaurant_review_page_loads(self):
         restaurant = create_restaurant()
         response = self.client.get(reverse("index"))
@@ -60,6 +82,33 @@ class RestaurantRoutesTestCase(TestCase):
         self.assertEqual(review.rating, 5)
         self.assertEqual(review.review_text, "Test Review")
         self.assertRedirects(response, reverse("details", args=(restaurant.id,)))
+        restaurant.refresh_from_db()
+        self.assertEqual((restaurant.rating_sum, restaurant.review_count), (5, 1))
+
+    def test_add_review_rejects_invalid_ratings(self):
+        restaurant = create_restaurant()
+        for rating in (-50, 0, 6, 1000, "x"):
+            response = self.client.post(
+                reverse("add_review", args=(restaurant.id,)),
+                {"user_name": "Test User", "rating": rating, "review_text": "Test Review"},
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertContains(response, "alert-danger", status_code=400)
+            self.assertContains(response, restaurant.name, status_code=400)
+        self.assertEqual(restaurant.review_set.count(), 0)
+        restaurant.refresh_from_db()
+        self.assertEqual((restaurant.rating_sum, restaurant.review_count), (0, 0))
+
+    def test_index_shows_aggregated_rating(self):
+        restaurant = create_restaurant()
+        for rating in (4, 5):
+            self.client.post(
+                reverse("add_review", args=(restaurant.id,)),
+                {"user_name": "Test User", "rating": rating, "review_text": "Test Review"},
+            )
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("index"))
+        self.assertContains(response, "4.5 (2  reviews)")
 
 
 class RestaurantModels(TestCase):
@@ -82,3 +131,356 @@ class RestaurantModels(TestCase):
         self.assertEqual(review.rating, 5)
         self.assertEqual(review.review_text, "Test Review")
         self.assertEqual(str(review), "Test Restaurant (01/01/01)")
+
+
+class RatingAggregatesTestCase(TestCase):
+    def create_reviews(self, restaurant, ratings):
+        for rating in ratings:
+            restaurant.review_set.create(
+                user_name="Test User", rating=rating, review_text="Test Review", review_date=timezone.now()
+            )
+
+    def test_backfill_and_check(self):
+        restaurant = create_restaurant()
+        empty = create_restaurant()
+        self.create_reviews(restaurant, [1, 3, 5])
+        self.assertEqual(list(aggregates.inconsistent_restaurants()), [restaurant])
+
+        with self.assertRaises(CommandError):
+            call_command("rating_aggregates", "check", stdout=io.StringIO())
+        call_command("rating_aggregates", "backfill", stdout=io.StringIO())
+
+        restaurant.refresh_from_db()
+        empty.refresh_from_db()
+        self.assertEqual((restaurant.rating_sum, restaurant.review_count, restaurant.avg_rating), (9, 3, 3.0))
+        self.assertEqual((empty.rating_sum, empty.review_count, empty.avg_rating), (0, 0, None))
+        out = io.StringIO()
+        call_command("rating_aggregates", "check", stdout=out)
+        self.assertIn("consistent", out.getvalue())
+
+    def test_check_fix(self):
+        restaurant = create_restaurant()
+        self.create_reviews(restaurant, [2])
+        call_command("rating_aggregates", "check", "--fix", stdout=io.StringIO())
+        self.assertFalse(aggregates.inconsistent_restaurants().exists())
+
+    def test_fixes_reach_cached_details_pages(self):
+        cache.clear()
+        restaurant = create_restaurant()
+        url = reverse("details", args=(restaurant.id,))
+        for target in (["backfill"], ["check", "--fix"]):
+            self.client.get(url)  # cached without the review
+            self.create_reviews(restaurant, [4])  # bypasses add_review, as a bulk import or a bug would
+            call_command("rating_aggregates", *target, stdout=io.StringIO())
+            restaurant.refresh_from_db()
+            self.assertContains(self.client.get(url), f"{restaurant.avg_rating:.1f} ({restaurant.review_count} ",
+                                msg_prefix=target[0])
+
+    def test_benchmark_rolls_back(self):
+        result = benchmarks.benchmark_index(20, 200, repeat=1)
+        self.assertEqual((result["restaurants"], result["reviews"]), (20, 200))
+        self.assertFalse(Restaurant.objects.exists())
+
+
+class KeysetPaginationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.restaurant = create_restaurant()
+        start = timezone.now()
+        # pairs of reviews share a date, so the id has to break ties
+        for i in range(9):
+            self.restaurant.review_set.create(
+                user_name=f"User {i}", rating=3, review_text="Test Review",
+                review_date=start + datetime.timedelta(minutes=i // 2),
+            )
+        self.ordered = list(Review.objects.order_by("-review_date", "-id"))
+
+    def test_pages_forward_and_back(self):
+        paginator = KeysetPaginator(Review.objects.all(), ["-review_date", "-id"], page_size=4)
+        pages = [paginator.page()]
+        while pages[-1].has_next:
+            pages.append(paginator.page(after=pages[-1].next_cursor))
+        self.assertEqual([review for page in pages for review in page], self.ordered)
+        self.assertEqual([len(page) for page in pages], [4, 4, 1])
+        self.assertFalse(pages[0].has_previous)
+
+        previous = paginator.page(before=pages[2].previous_cursor)
+        self.assertEqual(previous.object_list, pages[1].object_list)
+        self.assertEqual(paginator.page(before=previous.previous_cursor).object_list, pages[0].object_list)
+        self.assertFalse(paginator.page(before=previous.previous_cursor).has_previous)
+
+    def test_cursor_is_stable_when_rows_are_added(self):
+        paginator = KeysetPaginator(Review.objects.all(), ["-review_date", "-id"], page_size=4)
+        cursor = paginator.page().next_cursor
+        self.restaurant.review_set.create(
+            user_name="Newest", rating=5, review_text="Test Review", review_date=timezone.now() + datetime.timedelta(days=1)
+        )
+        self.assertEqual(paginator.page(after=cursor).object_list, self.ordered[4:8])
+
+    def test_invalid_cursor(self):
+        paginator = KeysetPaginator(Review.objects.all(), ["-review_date", "-id"])
+        with self.assertRaises(InvalidPage):
+            paginator.page(after="not-a-cursor")
+        response = self.client.get(reverse("details", args=(self.restaurant.id,)), {"after": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_details_pages_reviews(self):
+        with self.settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}):
+            from . import views
+
+            with unittest.mock.patch.object(views, "REVIEWS_PER_PAGE", 4):
+                response = self.client.get(reverse("details", args=(self.restaurant.id,)))
+                self.assertEqual(list(response.context["reviews"]), self.ordered[:4])
+                response = self.client.get(
+                    reverse("details", args=(self.restaurant.id,)), {"after": response.context["reviews"].next_cursor}
+                )
+                self.assertEqual(list(response.context["reviews"]), self.ordered[4:8])
+                self.assertContains(response, "?before=")
+
+    def test_index_pages_restaurants(self):
+        for i in range(3):
+            create_restaurant()
+        from . import views
+
+        with unittest.mock.patch.object(views, "RESTAURANTS_PER_PAGE", 3):
+            response = self.client.get(reverse("index"))
+            self.assertEqual(len(response.context["restaurants"]), 3)
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse("index"), {"after": response.context["restaurants"].next_cursor})
+            self.assertEqual(len(response.context["restaurants"]), 1)
+
+
+class DetailsCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        details_cache.reset_stats()
+        self.restaurant = create_restaurant()
+        self.url = reverse("details", args=(self.restaurant.id,))
+
+    def test_hit_serves_without_queries_and_updates_session(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertContains(response, self.restaurant.name)
+        self.assertEqual(self.client.session["lastViewedRestaurant"], self.restaurant.name)
+
+        other = Restaurant.objects.create(name="Other", street_address="1 Other Street", description="Other")
+        self.client.get(reverse("details", args=(other.id,)))
+        self.client.get(self.url)
+        self.assertEqual(self.client.session["lastViewedRestaurant"], self.restaurant.name)
+        self.assertEqual(details_cache.stats(), {"hits": 2, "misses": 2, "stale": 0, "hit_ratio": 0.5})
+
+    def test_new_review_is_visible_immediately(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("add_review", args=(self.restaurant.id,)),
+                {"user_name": "Fresh Reviewer", "rating": 4, "review_text": "Test Review"},
+            )
+        self.assertContains(self.client.get(self.url), "Fresh Reviewer")
+
+    def test_other_query_parameters_share_the_entry(self):
+        self.client.get(self.url)
+        for params in ({"x": 1}, {"x": 2, "utm_source": "mail"}):
+            with self.assertNumQueries(0):
+                self.assertContains(self.client.get(self.url, params), self.restaurant.name)
+        self.assertEqual(details_cache.stats()["misses"], 1)
+
+    def test_cache_stats_command(self):
+        self.client.get(self.url)
+        out = io.StringIO()
+        call_command("cache_stats", "--reset", stdout=out)
+        self.assertIn("details", out.getvalue())
+        self.assertEqual(details_cache.stats()["misses"], 0)
+
+
+class IndexCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_index_is_cached_until_a_write(self):
+        create_restaurant()
+        self.client.get(reverse("index"))
+        with self.assertNumQueries(0):
+            self.client.get(reverse("index"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("add_restaurant"),
+                {"restaurant_name": "Fresh Restaurant", "street_address": "1 New Street", "description": "New"},
+            )
+        self.assertContains(self.client.get(reverse("index")), "Fresh Restaurant")
+
+    def test_review_bumps_each_version_once(self):
+        restaurant = create_restaurant()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(
+                reverse("add_review", args=(restaurant.id,)),
+                {"user_name": "Reviewer", "rating": 4, "review_text": "Test Review"},
+            )
+        self.assertEqual(len(callbacks), 2)  # the restaurant's details and the index
+
+
+class FragmentCacheStampedeTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.fragments = FragmentCache("test", timeout=60, lock_wait=2.0)
+        self.renders = 0
+
+    def render(self):
+        self.renders += 1
+        return f"render {self.renders}"
+
+    def entry_key(self):
+        return self.fragments._key("object", self.fragments.version("object"), "")
+
+    def test_waits_for_the_lock_holder(self):
+        cache.add(f"{self.entry_key()}:lock", 1)
+        other = threading.Timer(0.2, lambda: cache.set(self.entry_key(), {"value": "from other", "delta": 0, "expires": time.time() + 60}))
+        other.start()
+        self.assertEqual(self.fragments.get_or_set("object", self.render), "from other")
+        other.join()
+        self.assertEqual(self.renders, 0)
+
+    def test_stops_waiting_when_the_lock_holder_fails(self):
+        cache.add(f"{self.entry_key()}:lock", 1)
+        other = threading.Timer(0.2, lambda: cache.delete(f"{self.entry_key()}:lock"))
+        other.start()
+        start = time.monotonic()
+        self.assertEqual(self.fragments.get_or_set("object", self.render), "render 1")
+        other.join()
+        self.assertLess(time.monotonic() - start, self.fragments.lock_wait / 2)
+
+    def test_serves_stale_value_while_recomputing(self):
+        cache.set(self.entry_key(), {"value": "stale", "delta": 1.0, "expires": time.time() - 1})
+        cache.add(f"{self.entry_key()}:lock", 1)
+        self.assertEqual(self.fragments.get_or_set("object", self.render), "stale")
+        self.assertEqual(self.fragments.stats()["stale"], 1)
+
+        cache.delete(f"{self.entry_key()}:lock")
+        self.assertEqual(self.fragments.get_or_set("object", self.render), "render 1")
+        self.assertEqual(self.fragments.get_or_set("object", self.render), "render 1")
+
+    def test_bump_invalidates_every_variant(self):
+        self.fragments.get_or_set("object", self.render, variant="after=abc")
+        self.fragments.bump("object")
+        self.assertEqual(self.fragments.get_or_set("object", self.render, variant="after=abc"), "render 2")
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.restaurant = create_restaurant()
+        for rating in (3, 4, 5):
+            self.restaurant.review_set.create(
+                user_name="Test User", rating=rating, review_text="Test Review", review_date=timezone.now()
+            )
+        Restaurant.objects.filter(pk=self.restaurant.pk).update(rating_sum=12, review_count=3)
+
+    def test_index(self):
+        for i in range(5):
+            create_restaurant()
+        self.assertViewQueryBudget(1, reverse("index"))
+        self.assertViewQueryBudget(0, reverse("index"))
+
+    def test_details(self):
+        response = self.assertViewQueryBudget(1, reverse("details", args=(self.restaurant.id,)))
+        self.assertContains(response, "4.0 (3  reviews)")
+        self.assertViewQueryBudget(0, reverse("details", args=(self.restaurant.id,)))
+
+        empty = create_restaurant()
+        self.assertViewQueryBudget(2, reverse("details", args=(empty.id,)))
+        self.assertViewQueryBudget(2, reverse("details", args=(empty.id + 1,)), status_code=404)
+
+    def test_writes(self):
+        self.assertViewQueryBudget(
+            5,
+            reverse("add_review", args=(self.restaurant.id,)),
+            method="post",
+            data={"user_name": "Test User", "rating": 5, "review_text": "Test Review"},
+            status_code=302,
+        )
+        self.assertViewQueryBudget(
+            1,
+            reverse("add_restaurant"),
+            method="post",
+            data={"restaurant_name": "New", "street_address": "1 Street", "description": "New"},
+            status_code=302,
+        )
+
+
+IMPORT_CSV = """restaurant_name,street_address,description,user_name,rating,review_text,review_date
+Imported Bistro,1 Import Street,Imported,Alice,4,Good,2024-05-01T12:00:00Z
+Imported Bistro,1 Import Street,Imported,Bob,2,"Slow, but
+friendly",
+Imported Cafe,2 Import Street,Coffee,,,,
+Imported Cafe,2 Import Street,Coffee,Carol,9,Too good,
+"""
+
+
+class ImportReviewsTestCase(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_import_csv_in_batches(self):
+        stats = import_records(read_records(io.StringIO(IMPORT_CSV), "csv"), batch_size=2)
+        self.assertEqual((stats.rows, stats.invalid, stats.restaurants, stats.reviews), (4, 1, 2, 2))
+        self.assertEqual(stats.errors[0][0], 4)
+        self.assertIn("less than or equal to 5", stats.errors[0][1])
+
+        bistro = Restaurant.objects.get(name="Imported Bistro")
+        self.assertEqual((bistro.rating_sum, bistro.review_count), (6, 2))
+        self.assertEqual(bistro.review_set.get(user_name="Bob").review_text, "Slow, but\nfriendly")
+        self.assertFalse(aggregates.inconsistent_restaurants().exists())
+
+    def test_import_ndjson_into_existing_restaurants(self):
+        restaurant = create_restaurant()
+        lines = [
+            json.dumps({"restaurant_id": restaurant.id, "user_name": f"User {i}", "rating": 5, "review_text": "Great"})
+            for i in range(50)
+        ] + ["not json", json.dumps({"restaurant_id": restaurant.id + 1, "user_name": "X", "rating": 1, "review_text": "?"})]
+        # the whole batch costs a constant number of queries, however many rows it has
+        with self.assertQueryBudget(6):
+            stats = import_records(read_records(lines, "ndjson"), batch_size=100)
+        self.assertEqual((stats.rows, stats.invalid, stats.reviews), (52, 2, 50))
+        restaurant.refresh_from_db()
+        self.assertEqual((restaurant.rating_sum, restaurant.review_count), (250, 50))
+
+    def test_import_reviews_command(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "reviews.csv")
+            with open(path, "w") as file:
+                file.write(IMPORT_CSV)
+            out, err = io.StringIO(), io.StringIO()
+            call_command("import_reviews", path, stdout=out, stderr=err)
+        self.assertIn("Imported 3 of 4 rows", out.getvalue())
+        self.assertIn("rows/s", out.getvalue())
+        self.assertIn("row 4:", err.getvalue())
+
+    def test_import_endpoint(self):
+        url = reverse("import_reviews")
+        user = User.objects.create_user(username="importer", password="secret-password")
+        self.client.login(username="importer", password="secret-password")
+        self.assertEqual(self.client.post(url, IMPORT_CSV, content_type="text/csv").status_code, 403)
+
+        user.user_permissions.add(*Permission.objects.filter(codename__in=["add_restaurant", "add_review"]))
+        self.assertEqual(self.client.post(url, IMPORT_CSV, content_type="text/plain").status_code, 415)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, IMPORT_CSV, content_type="text/csv")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["reviews"], 2)
+        self.assertContains(self.client.get(reverse("index")), "Imported Bistro")
+
+
+class LoadTestTestCase(LiveServerTestCase):
+    def test_load_test_reports_percentiles(self):
+        restaurant = create_restaurant()
+        urls = [self.live_server_url + reverse('index'), self.live_server_url + reverse('details', args=(restaurant.id,))]
+        result = benchmarks.load_test(urls, total_requests=20, concurrency=2, warmup=2)
+        self.assertEqual(result['errors'], 0)
+        self.assertLessEqual(result['p50_seconds'], result['p90_seconds'])
+        self.assertLessEqual(result['p90_seconds'], result['p99_seconds'])
+
+        result = benchmarks.load_test([self.live_server_url + '/missing/'], total_requests=3, concurrency=1, warmup=0)
+        self.assertEqual(result['errors'], 3)
+        self.assertIsNone(result['p99_seconds'])
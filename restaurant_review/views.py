@@ -1,27 +1,78 @@
-from django.db.models import Avg, Count
-from django.http import HttpResponseRedirect
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.core.paginator import InvalidPage
+from django.contrib.auth.decorators import permission_required
+from django.http import Http404, HttpResponseRedirect, JsonResponse
 from django.shortcuts import get_object_or_404, render
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 from django.urls import reverse
+from django.utils.http import urlencode
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.cache import cache_page
+from django.views.decorators.http import require_POST
 
+from restaurant_review.aggregates import add_rating
+from restaurant_review.caching import INDEX_VERSION_KEY, details_cache, index_cache
+from restaurant_review.importer import import_records, read_records
 from restaurant_review.models import Restaurant, Review
+from restaurant_review.pagination import KeysetPaginator
+
+RESTAURANTS_PER_PAGE = 50
+REVIEWS_PER_PAGE = 20
+PAGE_CURSORS = ('after', 'before')
+IMPORT_CONTENT_TYPES = {'text/csv': 'csv', 'application/x-ndjson': 'ndjson'}
 
 # Create your views here.
 
+def keyset_page(request, paginator):
+    # the page selected by the 'after'/'before' cursor in the query string
+    try:
+        return paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+    except InvalidPage:
+        raise Http404("Invalid page")
+
+def page_variant(request):
+    # the cache variant of a keyset page: only its cursor, so that other query parameters
+    # share the cached entry instead of each adding one
+    return urlencode([(name, request.GET[name]) for name in PAGE_CURSORS if name in request.GET])
+
 def index(request):
     print('Request for index page received')
-    restaurants = Restaurant.objects.annotate(avg_rating=Avg('review__rating')).annotate(review_count=Count('review'))
+
+    def render_index():
+        # ratings are read from the maintained aggregates instead of joining and grouping all reviews
+        restaurants = Restaurant.objects.only('name', 'rating_sum', 'review_count')
+        page = keyset_page(request, KeysetPaginator(restaurants, ['id'], RESTAURANTS_PER_PAGE))
+        return str(render_to_string('restaurant_review/index_content.html', {'restaurants': page}))
+
+    # the rendered list is cached until any restaurant or review is written
+    index_content = index_cache.get_or_set(INDEX_VERSION_KEY, render_index, variant=page_variant(request))
     lastViewedRestaurant = request.session.get("lastViewedRestaurant", False)
-    return render(request, 'restaurant_review/index.html', {'LastViewedRestaurant': lastViewedRestaurant, 'restaurants': restaurants})
+    return render(request, 'restaurant_review/index.html', {'LastViewedRestaurant': lastViewedRestaurant, 'index_content': mark_safe(index_content)})
+
+def cached_details(request, id):
+    # the rendered page body, cached per restaurant until add_review bumps its version
+
+    def render_details():
+        # one query: the page of reviews, newest first on the (restaurant, review_date, id) index,
+        # each joined with the restaurant and its rating aggregates
+        reviews = Review.objects.filter(restaurant_id=id).select_related('restaurant')
+        reviews = keyset_page(request, KeysetPaginator(reviews, ['-review_date', '-id'], REVIEWS_PER_PAGE))
+        # only a page without reviews needs the restaurant on its own
+        restaurant = reviews.object_list[0].restaurant if reviews.object_list else get_object_or_404(Restaurant, pk=id)
+        content = render_to_string('restaurant_review/details_content.html', {'restaurant': restaurant, 'reviews': reviews})
+        return {'name': restaurant.name, 'content': str(content)}
+
+    return details_cache.get_or_set(id, render_details, variant=page_variant(request))
 
-@cache_page(60)
 def details(request, id):
     print('Request for restaurant details page received')
-    restaurant = get_object_or_404(Restaurant, pk=id)
-    request.session["lastViewedRestaurant"] = restaurant.name
-    return render(request, 'restaurant_review/details.html', {'restaurant': restaurant})
+
+    # the session is updated on every request, hit or miss
+    details = cached_details(request, id)
+    request.session["lastViewedRestaurant"] = details['name']
+    return render(request, 'restaurant_review/details.html', {'details_content': mark_safe(details['content'])})
 
 
 def create_restaurant(request):
@@ -46,6 +97,8 @@ def add_restaurant(request):
         restaurant.street_address = street_address
         restaurant.description = description
         Restaurant.save(restaurant)
+        details_cache.bump_on_commit(restaurant.id)
+        index_cache.bump_on_commit(INDEX_VERSION_KEY)
 
         return HttpResponseRedirect(reverse('details', args=(restaurant.id,)))
 
@@ -54,21 +107,35 @@ def add_restaurant(request):
 def add_review(request, id):
     restaurant = get_object_or_404(Restaurant, pk=id)
     try:
-        user_name = request.POST['user_name']
-        rating = request.POST['rating']
-        review_text = request.POST['review_text']
-    except (KeyError):
-        # Redisplay the form.
-        return render(request, 'restaurant_review/add_review.html', {
-            'error_message': "Error adding review",
-        })
+        review = Review(restaurant=restaurant, review_date=timezone.now(), user_name=request.POST['user_name'],
+                        rating=int(request.POST['rating']), review_text=request.POST['review_text'])
+        # the rating goes straight into the restaurant's aggregates, so it is checked against the
+        # field's validators (1 to 5) first; the restaurant was just fetched
+        review.full_clean(exclude=['restaurant'])
+    except (KeyError, ValueError, ValidationError) as e:
+        # Redisplay the restaurant with its review form
+        message = "; ".join(e.messages) if isinstance(e, ValidationError) else "Error adding review"
+        return render(request, 'restaurant_review/details.html', {
+            'details_content': mark_safe(cached_details(request, id)['content']),
+            'error_message': message,
+        }, status=400)
     else:
-        review = Review()
-        review.restaurant = restaurant
-        review.review_date = timezone.now()
-        review.user_name = user_name
-        review.rating = rating
-        review.review_text = review_text
-        Review.save(review)
+        with transaction.atomic():
+            Review.save(review)
+            add_rating(restaurant.id, review.rating)
+            details_cache.bump_on_commit(restaurant.id)
+            index_cache.bump_on_commit(INDEX_VERSION_KEY)
 
     return HttpResponseRedirect(reverse('details', args=(id,)))
+
+
+@require_POST
+@permission_required(['restaurant_review.add_restaurant', 'restaurant_review.add_review'], raise_exception=True)
+def import_reviews(request):
+    # the body is CSV or NDJSON (see restaurant_review.importer), read line by line as it arrives
+    format = IMPORT_CONTENT_TYPES.get(request.content_type)
+    if format is None:
+        return JsonResponse({'error': f"Content-Type must be one of {', '.join(IMPORT_CONTENT_TYPES)}"}, status=415)
+    lines = (line.decode(request.encoding or 'utf-8') for line in request)
+    stats = import_records(read_records(lines, format))
+    return JsonResponse(stats.as_dict())
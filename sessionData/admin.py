@@ -1,8 +1,36 @@
 from django.contrib import admin
 
-from .models import UserSession, SessionData
+from .models import DeduplicationStats, ProcessingMetric, SessionSummary, UserSession, SessionData
+
+
+@admin.register(UserSession)
+class UserSessionAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'status', 'progress', 'uploaded_at', 'processed_at', 'processing_latency', 'reused_from')
+    list_filter = ('status', 'user')
+    raw_id_fields = ('reused_from',)
+
+
+@admin.register(DeduplicationStats)
+class DeduplicationStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'hits', 'bytes_saved')
+    readonly_fields = ('user', 'hits', 'bytes_saved')
+
+
+@admin.register(ProcessingMetric)
+class ProcessingMetricAdmin(admin.ModelAdmin):
+    list_display = ('stage', 'session', 'seconds', 'rows_in', 'rows_out', 'peak_memory', 'recorded_at')
+    list_filter = ('stage',)
+    raw_id_fields = ('session',)
+
+
+@admin.register(SessionSummary)
+class SessionSummaryAdmin(admin.ModelAdmin):
+    list_display = ('session', 'session_start', 'distance', 'duration', 'max_speed', 'best_500m', 'updated')
+    list_filter = ('user',)
+    raw_id_fields = ('session',)
+    date_hierarchy = 'session_start'
+
 
-admin.site.register(UserSession)
 admin.site.register(SessionData)
 
 
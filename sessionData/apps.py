@@ -3,4 +3,12 @@ from django.apps import AppConfig
 
 class SessionDataConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
-    name = "sessionData"
\ No newline at end of file
+    name = "sessionData"
+
+    def ready(self):
+        from django.db.models.signals import pre_delete
+
+        from .deduplication import promote_duplicate
+        from .models import UserSession
+
+        pre_delete.connect(promote_duplicate, sender=UserSession, dispatch_uid="sessionData.promote_duplicate")
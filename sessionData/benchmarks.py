@@ -0,0 +1,390 @@
+import io
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+
+TCX_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<TrainingCenterDatabase xmlns="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2">
+  <Activities>
+    <Activity Sport="Other">
+      <Id>{start}</Id>
+      <Lap StartTime="{start}">
+        <AverageHeartRateBpm><Value>120</Value></AverageHeartRateBpm>
+        <Track>
+"""
+
+TCX_TRACKPOINT = """          <Trackpoint>
+            <Time>{time}</Time>
+            <Position>
+              <LatitudeDegrees>{lat:.8f}</LatitudeDegrees>
+              <LongitudeDegrees>{lon:.8f}</LongitudeDegrees>
+            </Position>
+            <AltitudeMeters>{alt:.1f}</AltitudeMeters>
+            <HeartRateBpm><Value>{hr}</Value></HeartRateBpm>
+          </Trackpoint>
+"""
+
+TCX_FOOTER = """        </Track>
+      </Lap>
+    </Activity>
+  </Activities>
+</TrainingCenterDatabase>
+"""
+
+
+def synthetic_track(n_points, seed=0, start=None):
+    """Random-walk windsurf track sampled once per second, returned as column arrays."""
+    rng = np.random.default_rng(seed)
+    start = start or datetime(2024, 8, 1, 10, 0, tzinfo=timezone.utc)
+    heading = np.cumsum(rng.normal(0, 0.05, n_points))
+    speed = np.clip(8 + np.cumsum(rng.normal(0, 0.1, n_points)), 0, 25)  # m/s
+    lat = 54.5 + np.cumsum(speed * np.cos(heading)) / 111_320
+    lon = 11.1 + np.cumsum(speed * np.sin(heading)) / (111_320 * np.cos(np.radians(54.5)))
+    return {
+        'Time': [start + timedelta(seconds=i) for i in range(n_points)],
+        'Latitude': lat,
+        'Longitude': lon,
+        'Altitude': rng.normal(2, 0.5, n_points),
+        'Heart Rate': rng.integers(90, 170, n_points),
+    }
+
+
+def synthetic_frame(n_points, seed=0):
+    """The DataFrame read_tcx would return for a synthetic track, without going through XML."""
+    track = synthetic_track(n_points, seed)
+    data = pd.DataFrame(track)
+    data['Time'] = pd.to_datetime(data['Time'], utc=True).dt.as_unit('ns')
+    data['Heart Rate'] = data['Heart Rate'].astype(float)
+    data.index = data['Time']
+    return data
+
+
+def synthetic_processed_frame(n_points, seed=0):
+    from .data_processor import ProcessSessionData
+
+    processor = ProcessSessionData(data=synthetic_frame(n_points, seed))
+    processor.calculate_derivables()
+    return processor.data
+
+
+def write_synthetic_tcx(path, n_points, seed=0):
+    track = synthetic_track(n_points, seed)
+    with open(path, 'w') as file:
+        file.write(TCX_HEADER.format(start=track['Time'][0].strftime('%Y-%m-%dT%H:%M:%S.000Z')))
+        for i in range(n_points):
+            file.write(TCX_TRACKPOINT.format(
+                time=track['Time'][i].strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                lat=track['Latitude'][i],
+                lon=track['Longitude'][i],
+                alt=track['Altitude'][i],
+                hr=track['Heart Rate'][i],
+            ))
+        file.write(TCX_FOOTER)
+    return path
+
+
+def _max_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _read_tcx_in_child(path, engine, queue):
+    from .data_processor import ProcessSessionData
+
+    rss_before = _max_rss_mb()
+    start = time.perf_counter()
+    data = ProcessSessionData().read_tcx(path, engine=engine)
+    queue.put({
+        'rows': len(data),
+        'seconds': time.perf_counter() - start,
+        'peak_rss_mb': _max_rss_mb() - rss_before,
+    })
+
+
+def benchmark_read_tcx(sizes=(10_000, 100_000, 1_000_000), engines=('bs4', 'iterparse'), directory=None):
+    """Compare wall time and peak RSS growth of the TCX engines on synthetic files.
+
+    Every run happens in a fresh process so the peak RSS of one engine does not hide the other.
+    """
+    context = get_context('spawn')
+    results = []
+    with tempfile.TemporaryDirectory(dir=directory) as tmp_dir:
+        for size in sizes:
+            path = write_synthetic_tcx(os.path.join(tmp_dir, f'synthetic_{size}.tcx'), size)
+            file_mb = os.path.getsize(path) / 2**20
+            for engine in engines:
+                queue = context.Queue()
+                process = context.Process(target=_read_tcx_in_child, args=(path, engine, queue))
+                process.start()
+                process.join()
+                if process.exitcode != 0:
+                    results.append({'points': size, 'file_mb': file_mb, 'engine': engine, 'error': f'exit code {process.exitcode}'})
+                    continue
+                results.append({'points': size, 'file_mb': file_mb, 'engine': engine, **queue.get()})
+    return results
+
+
+def _timed(function, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def benchmark_storage(sizes=(10_000, 100_000, 1_000_000), columns=('Latitude', 'Longitude', 'Speed')):
+    """Compare the DataFrame.to_json payload with the columnar format (plain and compressed)."""
+    from . import columnar
+
+    results = []
+    for size in sizes:
+        data = synthetic_processed_frame(size)
+
+        encode_seconds, payload = _timed(data.to_json)
+        decode_seconds, _ = _timed(lambda: pd.read_json(io.StringIO(payload), convert_dates=['Time']))
+        results.append({'points': size, 'format': 'json', 'bytes': len(payload.encode()),
+                        'encode_seconds': encode_seconds, 'decode_seconds': decode_seconds,
+                        'decode_columns_seconds': decode_seconds})
+
+        for compress in (False, True):
+            encode_seconds, blob = _timed(lambda: columnar.encode_frame(data, compress=compress))
+            decode_seconds, _ = _timed(lambda: columnar.decode_frame(blob))
+            decode_columns_seconds, _ = _timed(lambda: columnar.decode_frame(blob, columns))
+            results.append({'points': size, 'format': 'columnar+zlib' if compress else 'columnar', 'bytes': len(blob),
+                            'encode_seconds': encode_seconds, 'decode_seconds': decode_seconds,
+                            'decode_columns_seconds': decode_columns_seconds})
+    return results
+
+
+def legacy_calculate_derivables(data):
+    """calculate_derivables before the array kernel: shifted columns and a bearing per point through np.vectorize."""
+    from .data_processor import ProcessSessionData
+
+    def calculate_bearing(lat1, lon1, lat2, lon2):
+        lat1, lon1, lat2, lon2 = np.radians([lat1, lon1, lat2, lon2])
+        dLon = lon2 - lon1
+        x = np.sin(dLon) * np.cos(lat2)
+        y = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dLon)
+        return (np.degrees(np.arctan2(x, y)) + 360) % 360
+
+    data['Time Delta'] = data['Time'].diff().dt.total_seconds()
+    data['Latitude_shift'] = data['Latitude'].shift(-1)
+    data['Longitude_shift'] = data['Longitude'].shift(-1)
+    data['Distance Delta'] = ProcessSessionData.haversine_vectorized(
+        data['Latitude'], data['Longitude'], data['Latitude_shift'], data['Longitude_shift'])
+    data = data[:-1].drop(columns=['Latitude_shift', 'Longitude_shift'])
+    data['Speed'] = data['Distance Delta'] / data['Time Delta']
+    data['Acceleration'] = data['Speed'].diff() / data['Time Delta']
+    lat_next = data['Latitude'].shift(-1)
+    lon_next = data['Longitude'].shift(-1)
+    data['Direction'] = np.vectorize(calculate_bearing)(data['Latitude'], data['Longitude'], lat_next, lon_next)
+    return data
+
+
+def benchmark_derivables(sizes=(100_000, 1_000_000)):
+    """Compare the legacy np.vectorize derivables with the array kernel of calculate_derivables."""
+    from .data_processor import ProcessSessionData
+    from .instrumentation import MetricsCollector
+
+    methods = {
+        'legacy': legacy_calculate_derivables,
+        'kernel': lambda data: ProcessSessionData(data, collector=MetricsCollector()).calculate_derivables(),
+    }
+    results = []
+    for size in sizes:
+        data = synthetic_frame(size)
+        for name, method in methods.items():
+            seconds, _ = _timed(lambda: method(data.copy()), repeat=1)
+            results.append({'points': size, 'method': name, 'seconds': seconds})
+    return results
+
+
+def legacy_filter_outliers(data):
+    """filter_outliers before the combined mask: quartiles per column, one filtered copy of the frame per column."""
+    for column in ('Heart Rate', 'Speed'):
+        q1 = data[column].quantile(0.25)
+        q3 = data[column].quantile(0.75)
+        iqr = q3 - q1
+        data = data[(data[column] >= q1 - 1.5 * iqr) & (data[column] <= q3 + 1.5 * iqr)]
+    return data
+
+
+def _peak_memory(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_outliers(sizes=(100_000, 1_000_000), window=61):
+    """Compare the legacy outlier filter with the combined IQR mask and the rolling filter (time and peak memory)."""
+    from .data_processor import ProcessSessionData
+    from .instrumentation import MetricsCollector
+
+    methods = {
+        'legacy': lambda data: legacy_filter_outliers(data),
+        'iqr': lambda data: ProcessSessionData(data, collector=MetricsCollector()).filter_outliers('iqr'),
+        'rolling': lambda data: ProcessSessionData(data, collector=MetricsCollector()).filter_outliers('rolling', window),
+    }
+    results = []
+    for size in sizes:
+        data = synthetic_processed_frame(size)
+        for name, method in methods.items():
+            seconds, filtered = _timed(lambda: method(data))
+            results.append({'points': size, 'method': name, 'seconds': seconds, 'kept': len(filtered),
+                            'peak_mb': _peak_memory(lambda: method(data)) / 2**20})
+    return results
+
+
+def benchmark_smoothing(sizes=(100_000, 1_000_000), time_delta=10, window=5):
+    """Compare the legacy resample().mean() with the smoothing engine, each method, and all resolution levels at once."""
+    from .resolutions import RESOLUTIONS
+    from .smoothing import SMOOTHING_METHODS, resample_frame, resolutions, smooth_frame
+
+    methods = {
+        'legacy': lambda data: data.resample(f'{time_delta}s').mean(),
+        'resample': lambda data: resample_frame(data, time_delta),
+        **{method: (lambda data, method=method: smooth_frame(resample_frame(data, time_delta), method, window))
+           for method in SMOOTHING_METHODS},
+        'levels': lambda data: resolutions(data, RESOLUTIONS),
+    }
+    results = []
+    for size in sizes:
+        data = synthetic_processed_frame(size)
+        for name, method in methods.items():
+            seconds, _ = _timed(lambda: method(data))
+            results.append({'points': size, 'method': name, 'seconds': seconds,
+                            'peak_mb': _peak_memory(lambda: method(data)) / 2**20})
+    return results
+
+
+def two_pointer_best_distance(seconds, distance, meters):
+    """Reference for segments.windows: the fastest `meters` with a sliding window in pure Python, O(n)."""
+    best = None
+    end = 0
+    for start in range(len(distance)):
+        end = max(end, start)
+        while end < len(distance) and distance[end] - distance[start] < meters:
+            end += 1
+        if end == len(distance):
+            break
+        if seconds[end] > seconds[start]:
+            speed = (distance[end] - distance[start]) / (seconds[end] - seconds[start])
+            best = speed if best is None else max(best, speed)
+    return best
+
+
+def naive_best_distance(seconds, distance, meters):
+    """The fastest `meters` by checking every later point of every start, O(n²)."""
+    best = None
+    for start in range(len(distance)):
+        reached = np.flatnonzero(distance[start + 1:] - distance[start] >= meters)
+        if len(reached):
+            end = start + 1 + reached[0]
+            speed = (distance[end] - distance[start]) / (seconds[end] - seconds[start])
+            best = speed if best is None else max(best, speed)
+    return best
+
+
+def benchmark_segments(sizes=(100_000, 1_000_000), meters=500, reference_limit=100_000, naive_limit=10_000):
+    """Time the best-effort search on synthetic tracks against a Python two-pointer loop and the naive search."""
+    from .segments import BEST_EFFORTS, best_efforts, track_arrays
+
+    results = []
+    for size in sizes:
+        data = synthetic_processed_frame(size)
+        seconds, arrays = _timed(lambda: track_arrays(data))
+        results.append({'points': size, 'method': 'track_arrays', 'seconds': seconds, 'speed': None})
+        seconds, efforts = _timed(lambda: best_efforts(*arrays))
+        results.append({'points': size, 'method': f'{len(BEST_EFFORTS)} efforts', 'seconds': seconds,
+                        'speed': efforts[f'{meters}m']['speed'] if efforts.get(f'{meters}m') else None})
+        if size <= reference_limit:
+            seconds, speed = _timed(lambda: two_pointer_best_distance(arrays[0], arrays[1], meters), repeat=1)
+            results.append({'points': size, 'method': 'two_pointer', 'seconds': seconds, 'speed': speed})
+        if size <= naive_limit:
+            seconds, speed = _timed(lambda: naive_best_distance(arrays[0], arrays[1], meters), repeat=1)
+            results.append({'points': size, 'method': 'naive', 'seconds': seconds, 'speed': speed})
+    return results
+
+
+class _Rollback(Exception):
+    pass
+
+
+def benchmark_nearby(count=100_000, users=10, radius=5000, queries=100, seed=0):
+    """Latency of "a user's sessions near a spot" over `count` synthetic session summaries.
+
+    Compares the geohash index lookup of summaries.sessions_near with scanning the centroids of all
+    the user's summaries. The rows are created in the configured database inside a transaction that
+    is rolled back at the end.
+    """
+    from django.contrib.auth.models import User
+    from django.db import transaction
+
+    from . import geo
+    from .models import SessionSummary, UserSession
+    from .summaries import nearby_candidates, sessions_near
+
+    rng = np.random.default_rng(seed)
+    # sessions scattered by ~2 km around 50 spots
+    spots = np.column_stack([rng.uniform(35, 60, 50), rng.uniform(-10, 30, 50)])
+    spot = rng.integers(0, len(spots), count)
+    latitude = spots[spot, 0] + rng.normal(0, 0.02, count)
+    longitude = spots[spot, 1] + rng.normal(0, 0.03, count)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    results = []
+    try:
+        with transaction.atomic():
+            owners = User.objects.bulk_create([User(username=f'benchmark-nearby-{i}') for i in range(users)])
+            owners = list(User.objects.filter(username__startswith='benchmark-nearby-').order_by('id'))
+            sessions = UserSession.objects.bulk_create([
+                UserSession(user=owners[i % users], session_start=start + timedelta(hours=i),
+                            session_stop=start + timedelta(hours=i, minutes=90), smartwatch_data_file_path='',
+                            status=UserSession.Status.DONE)
+                for i in range(count)
+            ], batch_size=5000)
+            if sessions[0].pk is None:  # databases that do not return primary keys from bulk inserts
+                sessions = list(UserSession.objects.filter(user__in=owners).order_by('id'))
+            SessionSummary.objects.bulk_create([
+                SessionSummary(session=session, user_id=session.user_id, session_start=session.session_start,
+                               distance=20_000, duration=5400, max_speed=15, avg_speed=5,
+                               centroid_latitude=lat, centroid_longitude=lon, geohash=geo.geohash(lat, lon))
+                for session, lat, lon in zip(sessions, latitude, longitude)
+            ], batch_size=5000)
+
+            def scan(user, lat, lon):
+                rows = np.array(SessionSummary.objects.filter(user=user)
+                                .values_list('session_id', 'centroid_latitude', 'centroid_longitude'))
+                meters = geo.haversine(lat, lon, rows[:, 1], rows[:, 2])
+                return rows[meters <= radius, 0]
+
+            methods = {'geohash index': lambda user, lat, lon: sessions_near(user, lat, lon, radius), 'scan': scan}
+            targets = [(owners[rng.integers(0, users)], *spots[rng.integers(0, len(spots))]) for _ in range(queries)]
+            for name, method in methods.items():
+                latencies = []
+                found = 0
+                for user, lat, lon in targets:
+                    began = time.perf_counter()
+                    found += len(method(user, lat, lon))
+                    latencies.append(time.perf_counter() - began)
+                results.append({'sessions': count, 'method': name, 'median_ms': np.percentile(latencies, 50) * 1000,
+                                'p95_ms': np.percentile(latencies, 95) * 1000, 'found': found / queries})
+
+            plan = nearby_candidates(owners[0], *spots[0], radius).explain()
+            results.append({'sessions': count, 'method': 'plan', 'plan': plan})
+            raise _Rollback
+    except _Rollback:
+        pass
+    return results
@@ -0,0 +1,114 @@
+import json
+import struct
+import zlib
+
+import numpy as np
+import pandas as pd
+
+
+# Layout: MAGIC | uint32 header length | JSON header | column blocks.
+# The header lists every column with its dtype and the byte range of its block, so a reader
+# can decode just the columns it needs.
+MAGIC = b'WSCF1'
+INDEX_COLUMN = '__index__'
+
+# Coordinates need float64: float32 rounds them to ~0.5 m, which is the same order as the
+# distance covered between two trackpoints. Everything else is stored as float32.
+FULL_PRECISION_COLUMNS = {'Latitude', 'Longitude'}
+
+
+def _encode_column(name, values):
+    values = pd.Series(values)
+    column = {'name': name}
+    if isinstance(values.dtype, pd.DatetimeTZDtype) or pd.api.types.is_datetime64_dtype(values.dtype):
+        column['kind'] = 'datetime'
+        column['tz'] = str(values.dt.tz) if values.dt.tz is not None else None
+        # nanoseconds since the epoch; NaT is the int64 minimum, which is how numpy represents it
+        array = np.asarray(values.dt.as_unit('ns').array.asi8, dtype='<i8')
+    elif pd.api.types.is_bool_dtype(values.dtype):
+        column['kind'] = 'bool'
+        array = values.to_numpy(dtype='u1')
+    elif pd.api.types.is_integer_dtype(values.dtype):
+        column['kind'] = 'int'
+        array = values.to_numpy(dtype='<i8')
+    elif pd.api.types.is_float_dtype(values.dtype):
+        column['kind'] = 'float'
+        array = values.to_numpy(dtype='<f8' if name in FULL_PRECISION_COLUMNS else '<f4')
+    else:
+        raise TypeError(f"Column '{name}' has unsupported dtype {values.dtype}")
+    column['dtype'] = array.dtype.str
+    return column, array.tobytes()
+
+
+def encode_frame(data, compress=True):
+    """Serialize a DataFrame (and its DatetimeIndex, if any) into the columnar binary format."""
+    columns = []
+    blocks = []
+    offset = 0
+
+    items = list(data.items())
+    if isinstance(data.index, pd.DatetimeIndex):
+        items.append((INDEX_COLUMN, data.index.to_series(index=range(len(data)))))
+
+    for name, values in items:
+        column, block = _encode_column(name, values)
+        if compress:
+            block = zlib.compress(block, 1)
+        column['compressed'] = compress
+        column['offset'] = offset
+        column['length'] = len(block)
+        if name == INDEX_COLUMN:
+            column['index_name'] = data.index.name
+        columns.append(column)
+        blocks.append(block)
+        offset += len(block)
+
+    header = json.dumps({'rows': len(data), 'columns': columns}).encode()
+    return b''.join([MAGIC, struct.pack('<I', len(header)), header, *blocks])
+
+
+def read_header(blob):
+    blob = memoryview(blob)
+    if bytes(blob[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Not a columnar session data payload")
+    (header_length,) = struct.unpack_from('<I', blob, len(MAGIC))
+    body_start = len(MAGIC) + 4 + header_length
+    header = json.loads(bytes(blob[len(MAGIC) + 4:body_start]))
+    return header, body_start
+
+
+def _decode_column(blob, body_start, column):
+    start = body_start + column['offset']
+    block = bytes(blob[start:start + column['length']])
+    if column['compressed']:
+        block = zlib.decompress(block)
+    array = np.frombuffer(block, dtype=column['dtype'])
+    if column['kind'] == 'datetime':
+        values = pd.to_datetime(array.astype('int64'), unit='ns', utc=column['tz'] is not None)
+        if column['tz'] not in (None, 'UTC'):
+            values = values.tz_convert(column['tz'])
+        return values
+    if column['kind'] == 'bool':
+        return array.astype(bool)
+    if column['kind'] == 'float':
+        return array.astype('float64')
+    return array.astype('int64')
+
+
+def decode_frame(blob, columns=None):
+    """Deserialize a columnar payload, decoding only `columns` if given (in their order)."""
+    blob = memoryview(blob)
+    header, body_start = read_header(blob)
+    stored = {column['name']: column for column in header['columns']}
+
+    names = [name for name in stored if name != INDEX_COLUMN] if columns is None else list(columns)
+    missing = [name for name in names if name not in stored]
+    if missing:
+        raise KeyError(f"Columns not in payload: {missing}")
+
+    if INDEX_COLUMN in stored:
+        index = pd.DatetimeIndex(_decode_column(blob, body_start, stored[INDEX_COLUMN]))
+        index = index.rename(stored[INDEX_COLUMN].get('index_name'))
+    else:
+        index = pd.RangeIndex(header['rows'])
+    return pd.DataFrame({name: _decode_column(blob, body_start, stored[name]) for name in names}, index=index)
@@ -1,49 +1,30 @@
 import numpy as np
 import pandas as pd
-from bs4 import BeautifulSoup as bs
-from geopy.distance import geodesic
 import logging
+from . import geo, outliers, segments, smoothing
+from .instrumentation import LoggingCollector, instrumented
 from .weather import Weather
+from .tcx_parser import TCX_COLUMNS, get_tcx_reader
 
 
 logger = logging.getLogger(__name__)
 
 class ProcessSessionData:
-    def __init__(self, data = None, openweathermap_api_key = None):
+    def __init__(self, data = None, openweathermap_api_key = None, collector = None):
         self.data = data
         self.openweathermap_api_key = openweathermap_api_key
+        # receives duration, rows in/out and peak memory of every stage (see instrumentation)
+        self.collector = collector or LoggingCollector()
 
-    def read_tcx(self, tcx_file_path):
+    @instrumented
+    def read_tcx(self, tcx_file_path, engine='iterparse'):
         # extract the time, latitude, longitude, altitude, and heart rate data
+        # engine: 'iterparse' streams the file into typed column buffers, 'bs4' builds the full soup tree
+        return self.load_columns(get_tcx_reader(engine).read(tcx_file_path))
 
-        # Read and parse the TCX file
-        with open(tcx_file_path, 'r') as file:
-            soup = bs(file, 'xml')
-
-        # Create lists to store the data
-        times = []
-        latitudes = []
-        longitudes = []
-        altitudes = []
-        heart_rates = []
-
-        # Extract data from each trackpoint
-        for trackpoint in soup.find_all('Trackpoint'):
-            times.append(trackpoint.Time.text if trackpoint.Time else None)
-            latitudes.append(trackpoint.Position.LatitudeDegrees.text if trackpoint.Position and trackpoint.Position.LatitudeDegrees else None)
-            longitudes.append(trackpoint.Position.LongitudeDegrees.text if trackpoint.Position and trackpoint.Position.LongitudeDegrees else None)
-            altitudes.append(trackpoint.AltitudeMeters.text if trackpoint.AltitudeMeters else None)
-            heart_rates.append(trackpoint.HeartRateBpm.Value.text if trackpoint.HeartRateBpm and trackpoint.HeartRateBpm.Value else None)
-
-        # Create a DataFrame
-        data = {
-            'Time': times,
-            'Latitude': latitudes,
-            'Longitude': longitudes,
-            'Altitude': altitudes,
-            'Heart Rate': heart_rates
-        }
-        data = pd.DataFrame(data)
+    def load_columns(self, columns):
+        # build the session frame from parsed TCX columns (see tcx_parser)
+        data = pd.DataFrame(columns, columns=TCX_COLUMNS)
 
         # convert the data to the correct data types
         data['Time'] = pd.to_datetime(data['Time'])
@@ -61,74 +42,48 @@ class ProcessSessionData:
 
         return data
     
+    @instrumented
     def calculate_derivables(self):
-        # calculate the time deltas
-        self.data['Time Delta'] = self.data['Time'].diff().dt.total_seconds()
+        # time delta, distance delta, speed, acceleration and direction
+        # (0 for north, 90 for east, 180 for south, 270 for west) in one pass over the arrays;
+        # the last point has no successor and is dropped
+        time_ns = pd.DatetimeIndex(self.data['Time']).as_unit('ns').asi8
+        derivables = geo.pairwise_kernel(time_ns, self.data['Latitude'].to_numpy(), self.data['Longitude'].to_numpy())
 
-        # calculate the distance deltas
-        self.data['Distance Delta'] = 0.0
-        
-        self.calc_distance()
-
-        # calculate the speed
-        self.data['Speed'] = self.data['Distance Delta'] / self.data['Time Delta'] 
-
-        # calculate the acceleration
-        self.data['Acceleration'] = self.data['Speed'].diff() / self.data['Time Delta']
-
-        # calculate the direction, 0 for south, 90 for west, 180 for north, 270 for east
-        self.data['Direction'] = 0
-        # Shift the lat and lon columns to align for pairwise calculation
-        lat_next = self.data['Latitude'].shift(-1)
-        lon_next = self.data['Longitude'].shift(-1)
-
-        # Calculate the bearing using vectorized operations
-        self.data['Direction'] = np.vectorize(self.calculate_bearing)(self.data['Latitude'], self.data['Longitude'], lat_next, lon_next)
+        self.data = self.data.iloc[:-1].copy()
+        for column, values in derivables.items():
+            self.data[column] = values
 
         return self.data
     
     @staticmethod
     def calculate_bearing(lat1, lon1, lat2, lon2):
-        # Function to calculate the bearing
-        # Convert degrees to radians
-        lat1, lon1, lat2, lon2 = np.radians([lat1, lon1, lat2, lon2])
-
-        dLon = lon2 - lon1
-        x = np.sin(dLon) * np.cos(lat2)
-        y = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dLon)
-        initial_bearing = np.arctan2(x, y)
-        initial_bearing = np.degrees(initial_bearing)
-        bearing = (initial_bearing + 360) % 360
-
-        return bearing
+        # bearing between two points (or two arrays of points)
+        return geo.bearing(lat1, lon1, lat2, lon2)
     
-    def filter_outliers(self):
-        #Points that are beyond 1.5 times the IQR are beyond the expected range of variation of the data. 
-
-        # Calculate the interquartile range
-        Q1 = self.data['Heart Rate'].quantile(0.25)
-        Q3 = self.data['Heart Rate'].quantile(0.75)
-        IQR = Q3 - Q1
-
-        # Filter out the outliers
-        filter = (self.data['Heart Rate'] >= Q1 - 1.5 * IQR) & (self.data['Heart Rate'] <= Q3 + 1.5 * IQR)
-        self.data = self.data[filter]
-
-        logger.info(f'Filtered out {len(self.data) - len(filter)} outliers for heart rate')
-
-        # Calculate the interquartile range
-        Q1 = self.data['Speed'].quantile(0.25)
-        Q3 = self.data['Speed'].quantile(0.75)
-        IQR = Q3 - Q1
-
-        # Filter out the outliers
-        filter = (self.data['Speed'] >= Q1 - 1.5 * IQR) & (self.data['Speed'] <= Q3 + 1.5 * IQR)
-        self.data = self.data[filter]
-
-        logger.info(f'Filtered out {len(self.data) - len(filter)} outliers for speed')
-
+    @instrumented
+    def filter_outliers(self, method='iqr', window=61, threshold=3.5, chunk_size=outliers.CHUNK_SIZE):
+        # method 'iqr': points beyond 1.5 times the IQR of the whole session are beyond the expected range of variation of the data
+        # method 'rolling': points beyond `threshold` robust deviations of the median of the `window` points around them,
+        #   which follows changes of the speed regime within a session (see outliers.rolling_mad_mask)
+        # the masks of all columns are combined into one, so the frame is copied once
+        keep = np.ones(len(self.data), dtype=bool)
+        for column, min_scale in outliers.OUTLIER_COLUMNS.items():
+            values = self.data[column].to_numpy()
+            kept = np.count_nonzero(keep)
+            if method == 'iqr':
+                # quartiles of the points the previous columns kept
+                keep[keep] = outliers.iqr_mask(values[keep])
+            elif method == 'rolling':
+                outliers.rolling_mad_mask(values, window, threshold, min_scale, chunk_size, out=keep)
+            else:
+                raise ValueError(f"Unknown outlier method {method!r}, expected 'iqr' or 'rolling'")
+            logger.info(f'Filtered out {kept - np.count_nonzero(keep)} outliers for {column.lower()}')
+
+        self.data = self.data[keep]
         return self.data
     
+    @instrumented
     def append_weather(self):
         # get the start and end times of the session
         start_time = self.data.index.min()
@@ -172,39 +127,35 @@ class ProcessSessionData:
 
         return self.data
 
-    def smooth_data(self, time_delta=10):
-        # time index
+    @instrumented
+    def smooth_data(self, time_delta=10, method=None, window=5):
+        # resample to buckets of time_delta seconds; bearings are averaged as circular means (see smoothing)
+        self.data = smoothing.resample_frame(self.data, time_delta)
+        # method: 'moving_average', 'exponential' or 'savitzky_golay' over `window` resampled points
+        if method is not None:
+            smoothing.smooth_frame(self.data, method, window)
+        return self.data
 
-        self.data = self.data.resample(f'{time_delta}S').mean()
-        # smooth the data
-        pass
+    @instrumented
+    def calc_best_efforts(self, efforts=segments.BEST_EFFORTS):
+        # fastest 2 s, 10 s, 500 m, nautical mile and alpha 500 (see segments) of the derivables frame;
+        # returns them by label and leaves the data as it is
+        seconds, distance, latitude, longitude = segments.track_arrays(self.data)
+        return segments.best_efforts(seconds, distance, latitude, longitude, efforts)
 
     @staticmethod
     def haversine_vectorized(lat1, lon1, lat2, lon2):
-        R = 6371000  # Radius of Earth in meters
-        phi1 = np.radians(lat1)
-        phi2 = np.radians(lat2)
-        delta_phi = np.radians(lat2 - lat1)
-        delta_lambda = np.radians(lon2 - lon1)
-        
-        a = np.sin(delta_phi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(delta_lambda / 2) ** 2
-        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
-        
-        return R * c
+        return geo.haversine(lat1, lon1, lat2, lon2)
     
+    @instrumented
     def calc_distance(self):
-        # Shift the latitude and longitude columns to calculate the distance between consecutive points
-        self.data['Latitude_shift'] = self.data['Latitude'].shift(-1)
-        self.data['Longitude_shift'] = self.data['Longitude'].shift(-1)
+        # distance from every point to the next one; the last point has no successor and is dropped
+        latitudes = self.data['Latitude'].to_numpy()
+        longitudes = self.data['Longitude'].to_numpy()
 
-        # Calculate distances
-        self.data['Distance Delta'] = self.haversine_vectorized(self.data['Latitude'], self.data['Longitude'], self.data['Latitude_shift'], self.data['Longitude_shift'])
+        distances = self.haversine_vectorized(latitudes[:-1], longitudes[:-1], latitudes[1:], longitudes[1:])
 
-        # Drop the last row which contains NaN after the shift
-        self.data = self.data[:-1]
+        self.data = self.data.iloc[:-1].copy()
+        self.data['Distance Delta'] = distances
 
-        # Drop the temporary shifted columns
-        self.data.drop(columns=['Latitude_shift', 'Longitude_shift'], inplace=True)
-
-
-        return self.data
\ No newline at end of file
+        return self.data
@@ -0,0 +1,58 @@
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from .models import DeduplicationStats, ProcessingMetric, SessionData, SessionSummary, UserSession
+
+
+def find_reusable_session(user, content_hash):
+    """The user's earliest processed session uploaded from an identical TCX document, if any."""
+    if not content_hash:
+        return None
+    return (UserSession.objects
+            .filter(user=user, content_hash=content_hash, reused_from__isnull=True, processed_at__isnull=False)
+            .order_by('id')
+            .first())
+
+
+def stored_result_bytes(session):
+    return SessionData.objects.filter(session=session).aggregate(total=Sum(Length('payload')))['total'] or 0
+
+
+def reuse_session(user, source, uploaded_file):
+    """Create a session for a duplicate upload that points at `source`'s results instead of recomputing them."""
+    with transaction.atomic():
+        session = UserSession.objects.create(
+            user=user,
+            session_start=source.session_start,
+            session_stop=source.session_stop,
+            smartwatch_data_file_path=source.smartwatch_data_file_path,
+            content_hash=uploaded_file.content_hash,
+            file_size=uploaded_file.size,
+            reused_from=source,
+            processed_at=timezone.now(),
+            status=UserSession.Status.DONE,
+            progress=100,
+        )
+        # the upload itself was not stored again when the document already existed
+        file_bytes_saved = 0 if uploaded_file.is_new else uploaded_file.size
+        DeduplicationStats.record_hit(user, file_bytes_saved + stored_result_bytes(source))
+    return session
+
+
+def promote_duplicate(sender, instance, **kwargs):
+    """pre_delete handler: make the earliest duplicate of a deleted session the owner of its results.
+
+    The duplicate becomes a session of its own and the other duplicates reuse it instead, so deleting
+    the original upload neither deletes the duplicates nor leaves them without results.
+    """
+    successor = instance.reused_by.order_by('id').first()
+    if successor is None:
+        return
+    with transaction.atomic():
+        # moved before the deletion collects them; ProcessingMetric rows too, they describe the same runs
+        for model in (SessionData, SessionSummary, ProcessingMetric):
+            model.objects.filter(session=instance).update(session=successor)
+        instance.reused_by.exclude(id=successor.id).update(reused_from=successor)
+        UserSession.objects.filter(id=successor.id).update(reused_from=None)
@@ -0,0 +1,157 @@
+import numpy as np
+
+
+EARTH_RADIUS = 6371000  # Radius of Earth in meters
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters between two (arrays of) points given in degrees."""
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    delta_phi = np.radians(lat2 - lat1)
+    delta_lambda = np.radians(lon2 - lon1)
+
+    a = np.sin(delta_phi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(delta_lambda / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    return EARTH_RADIUS * c
+
+
+def bearing(lat1, lon1, lat2, lon2):
+    """Initial bearing in degrees [0, 360) from point 1 to point 2, for scalars or arrays."""
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    delta_lambda = np.radians(np.subtract(lon2, lon1))
+
+    x = np.sin(delta_lambda) * np.cos(phi2)
+    y = np.cos(phi1) * np.sin(phi2) - np.sin(phi1) * np.cos(phi2) * np.cos(delta_lambda)
+
+    return (np.degrees(np.arctan2(x, y)) + 360) % 360
+
+
+def pairwise_kernel(time_ns, lat, lon):
+    """Derive the per-point motion columns of a track in one pass over its arrays.
+
+    Takes n timestamps (int64 nanoseconds) and coordinates in degrees and returns n - 1 values per
+    column, one for every point that has a successor:
+
+    - Time Delta: seconds since the previous point (NaN for the first point)
+    - Distance Delta: meters to the next point
+    - Speed: Distance Delta / Time Delta
+    - Acceleration: change in Speed since the previous point / Time Delta
+    - Direction: initial bearing towards the next point
+    """
+    time_ns = np.asarray(time_ns, dtype='int64')
+    lat = np.asarray(lat, dtype='float64')
+    lon = np.asarray(lon, dtype='float64')
+    n = len(lat) - 1
+    if n < 1:
+        empty = np.empty(0)
+        return {name: empty for name in ('Time Delta', 'Distance Delta', 'Speed', 'Acceleration', 'Direction')}
+
+    # trigonometry of every latitude is computed once and shared by distance and bearing
+    phi = np.radians(lat)
+    cos_phi = np.cos(phi)
+    sin_phi = np.sin(phi)
+    delta_phi = np.radians(lat[1:] - lat[:-1])
+    delta_lambda = np.radians(lon[1:] - lon[:-1])
+
+    a = np.sin(delta_phi / 2) ** 2 + cos_phi[:-1] * cos_phi[1:] * np.sin(delta_lambda / 2) ** 2
+    distance = EARTH_RADIUS * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    x = np.sin(delta_lambda) * cos_phi[1:]
+    y = cos_phi[:-1] * sin_phi[1:] - sin_phi[:-1] * cos_phi[1:] * np.cos(delta_lambda)
+    direction = (np.degrees(np.arctan2(x, y)) + 360) % 360
+
+    time_delta = np.empty(n)
+    time_delta[0] = np.nan
+    time_delta[1:] = np.diff(time_ns[:n]) / 1e9
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        speed = distance / time_delta
+        acceleration = np.empty(n)
+        acceleration[0] = np.nan
+        acceleration[1:] = np.diff(speed) / time_delta[1:]
+
+    return {
+        'Time Delta': time_delta,
+        'Distance Delta': distance,
+        'Speed': speed,
+        'Acceleration': acceleration,
+        'Direction': direction,
+    }
+
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 12  # characters; cells of a few centimeters
+
+
+def geohash(lat, lon, precision=GEOHASH_PRECISION):
+    """Geohash of a point: interleaved longitude/latitude bisections, 5 bits per character.
+
+    Points in the same cell share a prefix, so a B-tree on the hashes answers "points in this cell"
+    with a range scan.
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    characters = []
+    bits = 0
+    value = 0
+    even = True
+    while len(characters) < precision:
+        interval, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        if coordinate >= middle:
+            value = value * 2 + 1
+            interval[0] = middle
+        else:
+            value = value * 2
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            characters.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return ''.join(characters)
+
+
+def geohash_successor(prefix):
+    """The first geohash after every hash starting with `prefix`, or None if there is none ('zz...').
+
+    geohash >= prefix and geohash < geohash_successor(prefix) selects a cell with strings of the
+    alphabet only (lowercase letters and digits), which every database collation orders the same
+    way, unlike a bound such as prefix + '~'.
+    """
+    prefix = prefix.rstrip(GEOHASH_ALPHABET[-1])
+    if not prefix:
+        return None
+    return prefix[:-1] + GEOHASH_ALPHABET[GEOHASH_ALPHABET.index(prefix[-1]) + 1]
+
+
+def geohash_cell_size(precision):
+    """Height and width in degrees of the geohash cells of `precision` characters."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def geohash_cover(lat, lon, radius):
+    """Geohash prefixes whose cells together cover the circle of `radius` meters around a point.
+
+    The longest prefix whose cells are at least `radius` high and wide (at this latitude) is used, so
+    the circle lies within the cell of the centre and its eight neighbours.
+    """
+    precision = 1
+    for candidate in range(GEOHASH_PRECISION, 0, -1):
+        height, width = geohash_cell_size(candidate)
+        if height * 111_320 >= radius and width * 111_320 * np.cos(np.radians(min(abs(lat), 89.9))) >= radius:
+            precision = candidate
+            break
+    height, width = geohash_cell_size(precision)
+    cells = set()
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            cell_lat = min(max(lat + dy * height, -90.0), 90.0)
+            cell_lon = (lon + dx * width + 180.0) % 360.0 - 180.0
+            cells.add(geohash(cell_lat, cell_lon, precision))
+    return sorted(cells)
@@ -0,0 +1,87 @@
+import functools
+import logging
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StageMetrics:
+    stage: str
+    seconds: float
+    rows_in: int = None
+    rows_out: int = None
+    peak_memory: int = None  # bytes allocated at the stage's peak (tracemalloc), None if not tracked
+
+
+class MetricsCollector:
+    """Receives the metrics of every instrumented ProcessSessionData method.
+
+    Subclass it and override record() to send the metrics elsewhere. With track_memory the stages
+    run under tracemalloc, which slows down stages that allocate many small Python objects.
+    """
+    track_memory = False
+
+    def record(self, metrics):
+        pass
+
+
+class LoggingCollector(MetricsCollector):
+    """Logs every stage, with the metrics (and `context`, e.g. the session id) as structured fields."""
+    def __init__(self, track_memory=False, **context):
+        self.track_memory = track_memory
+        self.context = context
+
+    def record(self, metrics):
+        memory = f", peak {metrics.peak_memory / 2**20:.1f} MB" if metrics.peak_memory is not None else ""
+        logger.info(
+            f"Stage {metrics.stage}: {metrics.seconds:.3f}s, rows {metrics.rows_in} -> {metrics.rows_out}{memory}",
+            extra={'stage_metrics': {**self.context, **asdict(metrics)}},
+        )
+
+
+class RecordingCollector(LoggingCollector):
+    """Logs and keeps the metrics, so they can be stored with the session (see ProcessingMetric)."""
+    def __init__(self, track_memory=True, **context):
+        super().__init__(track_memory, **context)
+        self.metrics = []
+
+    def record(self, metrics):
+        super().record(metrics)
+        self.metrics.append(metrics)
+
+
+def _rows(data):
+    return len(data) if data is not None else None
+
+
+def instrumented(method):
+    """Report duration, rows of self.data before and after, and peak memory of a processor method."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        collector = self.collector
+        rows_in = _rows(self.data)
+        started_tracing = False
+        if collector.track_memory:
+            # a trace started by the caller is reused; its peak is reset for this stage
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+
+        start = time.perf_counter()
+        try:
+            result = method(self, *args, **kwargs)
+            seconds = time.perf_counter() - start
+            peak_memory = tracemalloc.get_traced_memory()[1] - baseline if collector.track_memory else None
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+
+        collector.record(StageMetrics(method.__name__, seconds, rows_in, _rows(self.data), peak_memory))
+        return result
+    return wrapper
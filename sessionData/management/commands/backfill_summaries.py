@@ -0,0 +1,33 @@
+import os
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from sessionData.reprocessing import backfill_summaries, select_sessions
+
+
+class Command(BaseCommand):
+    help = ("Compute the summaries of processed sessions in a pool of worker processes, skipping the "
+            "summaries that are up to date with their session's data")
+
+    def add_arguments(self, parser):
+        parser.add_argument('session_ids', type=int, nargs='*', help="Sessions to summarize (default: all)")
+        parser.add_argument('--user', dest='usernames', action='append', help="Only sessions of this user (repeatable)")
+        parser.add_argument('--since', type=date.fromisoformat, help="Only sessions starting on or after this date (YYYY-MM-DD)")
+        parser.add_argument('--until', type=date.fromisoformat, help="Only sessions starting before this date (YYYY-MM-DD)")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Worker processes (1 runs in this process)")
+        parser.add_argument('--batch-size', type=int, default=50, help="Sessions loaded and written together")
+        parser.add_argument('--force', action='store_true', help="Recompute every summary")
+
+    def handle(self, *args, **options):
+        sessions = select_sessions(options['session_ids'], options['usernames'], options['since'], options['until'])
+        stats = backfill_summaries(sessions, options['workers'], options['batch_size'], options['force'])
+
+        for session_id, error in stats.errors:
+            self.stderr.write(f"session {session_id}: {error}")
+
+        wall = stats.wall_seconds or float('nan')
+        self.stdout.write(self.style.SUCCESS(
+            f"Summarized {stats.sessions} sessions ({stats.skipped} up to date, {stats.failed} failed) "
+            f"in {stats.wall_seconds:.2f}s: {stats.sessions / wall:.1f} sessions/s"
+        ))
@@ -0,0 +1,96 @@
+from django.core.management.base import BaseCommand
+
+from sessionData import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Benchmark the session data pipeline on synthetic tracks"
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='target', required=True)
+
+        tcx = subparsers.add_parser('tcx', help="Compare the TCX reader engines (wall time and peak RSS)")
+        tcx.add_argument('--points', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+        tcx.add_argument('--engines', nargs='+', default=['bs4', 'iterparse'])
+
+        derivables = subparsers.add_parser('derivables', help="Compare the np.vectorize derivables with the array kernel")
+        derivables.add_argument('--points', type=int, nargs='+', default=[100_000, 1_000_000])
+
+        storage = subparsers.add_parser('storage', help="Compare SessionData payload encodings (size and speed)")
+        storage.add_argument('--points', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+
+        outliers = subparsers.add_parser('outliers', help="Compare the outlier filters (time and peak traced memory)")
+        outliers.add_argument('--points', type=int, nargs='+', default=[100_000, 1_000_000])
+        outliers.add_argument('--window', type=int, default=61)
+
+        smoothing = subparsers.add_parser('smoothing', help="Compare resampling and the smoothing methods (time and peak traced memory)")
+        smoothing.add_argument('--points', type=int, nargs='+', default=[100_000, 1_000_000])
+        smoothing.add_argument('--time-delta', type=int, default=10)
+        smoothing.add_argument('--window', type=int, default=5)
+
+        segments = subparsers.add_parser('segments', help="Time the best-effort search against a two-pointer loop and the naive search")
+        segments.add_argument('--points', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+        segments.add_argument('--meters', type=int, default=500)
+
+        nearby = subparsers.add_parser('nearby', help="Latency of the sessions-near-a-spot lookup (writes to the database, rolled back)")
+        nearby.add_argument('--sessions', type=int, default=100_000)
+        nearby.add_argument('--users', type=int, default=10)
+        nearby.add_argument('--radius', type=int, default=5000)
+        nearby.add_argument('--queries', type=int, default=100)
+
+    def handle(self, *args, **options):
+        getattr(self, f"handle_{options['target']}")(options)
+
+    def handle_tcx(self, options):
+        self.stdout.write(f"{'points':>10} {'file MB':>8} {'engine':>10} {'seconds':>8} {'peak RSS MB':>12}")
+        for result in benchmarks.benchmark_read_tcx(options['points'], options['engines']):
+            if 'error' in result:
+                self.stdout.write(f"{result['points']:>10} {result['file_mb']:>8.1f} {result['engine']:>10} {result['error']}")
+                continue
+            self.stdout.write(
+                f"{result['points']:>10} {result['file_mb']:>8.1f} {result['engine']:>10} "
+                f"{result['seconds']:>8.2f} {result['peak_rss_mb']:>12.1f}"
+            )
+
+    def handle_derivables(self, options):
+        self.stdout.write(f"{'points':>10} {'method':>10} {'seconds':>8}")
+        for result in benchmarks.benchmark_derivables(options['points']):
+            self.stdout.write(f"{result['points']:>10} {result['method']:>10} {result['seconds']:>8.3f}")
+
+    def handle_storage(self, options):
+        self.stdout.write(f"{'points':>10} {'format':>14} {'MB':>8} {'encode s':>9} {'decode s':>9} {'3 cols s':>9}")
+        for result in benchmarks.benchmark_storage(options['points']):
+            self.stdout.write(
+                f"{result['points']:>10} {result['format']:>14} {result['bytes'] / 2**20:>8.2f} "
+                f"{result['encode_seconds']:>9.3f} {result['decode_seconds']:>9.3f} {result['decode_columns_seconds']:>9.3f}"
+            )
+
+    def handle_outliers(self, options):
+        self.stdout.write(f"{'points':>10} {'method':>10} {'seconds':>8} {'peak MB':>8} {'kept':>10}")
+        for result in benchmarks.benchmark_outliers(options['points'], options['window']):
+            self.stdout.write(
+                f"{result['points']:>10} {result['method']:>10} {result['seconds']:>8.3f} "
+                f"{result['peak_mb']:>8.1f} {result['kept']:>10}"
+            )
+
+    def handle_smoothing(self, options):
+        self.stdout.write(f"{'points':>10} {'method':>15} {'seconds':>8} {'peak MB':>8}")
+        for result in benchmarks.benchmark_smoothing(options['points'], options['time_delta'], options['window']):
+            self.stdout.write(f"{result['points']:>10} {result['method']:>15} {result['seconds']:>8.3f} {result['peak_mb']:>8.1f}")
+
+    def handle_segments(self, options):
+        self.stdout.write(f"{'points':>10} {'method':>14} {'seconds':>9} {'best m/s':>9}")
+        for result in benchmarks.benchmark_segments(options['points'], options['meters']):
+            speed = f"{result['speed']:>9.3f}" if result['speed'] is not None else f"{'':>9}"
+            self.stdout.write(f"{result['points']:>10} {result['method']:>14} {result['seconds']:>9.3f} {speed}")
+
+    def handle_nearby(self, options):
+        self.stdout.write(f"{'sessions':>10} {'method':>14} {'median ms':>10} {'p95 ms':>8} {'found':>7}")
+        for result in benchmarks.benchmark_nearby(options['sessions'], options['users'], options['radius'], options['queries']):
+            if 'plan' in result:
+                self.stdout.write(f"query plan: {result['plan']}")
+                continue
+            self.stdout.write(
+                f"{result['sessions']:>10} {result['method']:>14} {result['median_ms']:>10.2f} "
+                f"{result['p95_ms']:>8.2f} {result['found']:>7.1f}"
+            )
@@ -0,0 +1,42 @@
+import os
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from sessionData.reprocessing import reprocess_sessions, select_sessions
+
+
+class Command(BaseCommand):
+    help = ("Reprocess sessions in a pool of worker processes, recomputing only the pipeline stages "
+            "whose checkpoints are out of date")
+
+    def add_arguments(self, parser):
+        parser.add_argument('session_ids', type=int, nargs='*', help="Sessions to reprocess (default: all)")
+        parser.add_argument('--user', dest='usernames', action='append', help="Only sessions of this user (repeatable)")
+        parser.add_argument('--since', type=date.fromisoformat, help="Only sessions starting on or after this date (YYYY-MM-DD)")
+        parser.add_argument('--until', type=date.fromisoformat, help="Only sessions starting before this date (YYYY-MM-DD)")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Worker processes (1 runs in this process)")
+        parser.add_argument('--batch-size', type=int, default=50, help="Sessions planned and written together")
+        parser.add_argument('--force', action='store_true', help="Recompute every stage, ignoring checkpoints")
+        parser.add_argument('--track-memory', action='store_true', help="Record the peak memory of every stage (slower)")
+
+    def handle(self, *args, **options):
+        sessions = select_sessions(options['session_ids'], options['usernames'], options['since'], options['until'])
+        stats = reprocess_sessions(sessions, options['workers'], options['batch_size'], options['force'],
+                                   track_memory=options['track_memory'])
+
+        for session_id, error in stats.errors:
+            self.stderr.write(f"session {session_id}: {error}")
+
+        wall = stats.wall_seconds or float('nan')
+        self.stdout.write(f"{'stage':>12} {'seconds':>9}")
+        for name, seconds in stats.stage_seconds.items():
+            self.stdout.write(f"{name:>12} {seconds:>9.2f}")
+        for name, seconds in stats.phase_seconds.items():
+            self.stdout.write(f"{'[' + name + ']':>12} {seconds:>9.2f}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Reprocessed {stats.sessions} sessions ({stats.skipped} up to date, {stats.failed} failed) "
+            f"in {stats.wall_seconds:.2f}s: {stats.sessions / wall:.1f} sessions/s, {stats.points / wall:.0f} points/s; "
+            f"{stats.seconds_saved:.2f}s saved by reusing checkpoints"
+        ))
@@ -0,0 +1,143 @@
+import hashlib
+import json
+
+import numpy as np
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import SessionData, UserSession
+
+
+# (Leaflet zoom level the level is meant for, Douglas-Peucker tolerance in meters, point budget)
+MAP_LEVELS = [
+    (12, 25.0, 500),
+    (15, 5.0, 2000),
+    (18, 1.0, 8000),
+]
+MAP_CACHE_TIMEOUT = 7 * 24 * 3600
+MAP_DATA_TYPE = 'map'
+
+
+def map_cache_key(session_id):
+    return f"sessionData:map:{session_id}"
+
+
+def _project(lat, lon):
+    # equirectangular projection in meters around the track's mean latitude; plenty for one session
+    scale = 111_320.0
+    return lon * scale * np.cos(np.radians(np.nanmean(lat))), lat * scale
+
+
+def douglas_peucker(x, y, tolerance):
+    """Indices of the points kept by Douglas-Peucker simplification of the polyline (x, y).
+
+    Iterative, and each segment's distances are computed as one array operation, so it scales to
+    long sessions without recursion limits.
+    """
+    n = len(x)
+    if n < 3:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        dx = x[end] - x[start]
+        dy = y[end] - y[start]
+        px = x[start + 1:end] - x[start]
+        py = y[start + 1:end] - y[start]
+        length = np.hypot(dx, dy)
+        if length == 0:
+            distances = np.hypot(px, py)
+        else:
+            distances = np.abs(dx * py - dy * px) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            index = start + 1 + farthest
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return np.flatnonzero(keep)
+
+
+def _fit_budget(indices, budget):
+    if len(indices) <= budget:
+        return indices
+    return indices[np.linspace(0, len(indices) - 1, budget).round().astype(int)]
+
+
+def build_map_payload(data, levels=MAP_LEVELS):
+    """Level-of-detail heat map payload for a processed session frame.
+
+    Every level stores its points as parallel arrays (lat, lng, intensity) instead of a list of
+    objects; intensity is the speed scaled to 0-50 as the map expects.
+    """
+    data = data[['Latitude', 'Longitude', 'Speed']].dropna()
+    lat = data['Latitude'].to_numpy()
+    lon = data['Longitude'].to_numpy()
+    speed = data['Speed'].to_numpy()
+    max_speed = speed.max() if len(speed) else 0
+    intensity = speed / max_speed * 50 if max_speed > 0 else np.zeros_like(speed)
+    x, y = _project(lat, lon) if len(lat) else (lat, lon)
+
+    payload = {'points': len(data), 'levels': []}
+    for zoom, tolerance, budget in levels:
+        indices = _fit_budget(douglas_peucker(x, y, tolerance), budget)
+        payload['levels'].append({
+            'zoom': zoom,
+            'lat': np.round(lat[indices], 6).tolist(),
+            'lng': np.round(lon[indices], 6).tolist(),
+            'intensity': np.round(intensity[indices], 1).tolist(),
+        })
+    return payload
+
+
+def store_map_payload(session, data):
+    """Build the payload for a processed frame, persist it and prime the cache."""
+    payload = build_map_payload(data)
+    SessionData.objects.filter(session=session, type=MAP_DATA_TYPE).delete()
+    row = SessionData.objects.create(session=session, type=MAP_DATA_TYPE, data=payload)
+    # sessions reusing this one's results cache the same payload under their own id
+    cache.delete_many([map_cache_key(session_id) for session_id in session.reused_by.values_list('id', flat=True)])
+    return _cache_entry(session.id, session.user_id, row.data, row.updated)
+
+
+def _cache_entry(session_id, user_id, payload, last_modified):
+    body = json.dumps(payload, separators=(',', ':')).encode()
+    entry = {
+        'user_id': user_id,
+        'body': body,
+        'etag': hashlib.sha1(body).hexdigest(),
+        'last_modified': last_modified or timezone.now(),
+    }
+    cache.set(map_cache_key(session_id), entry, MAP_CACHE_TIMEOUT)
+    return entry
+
+
+def get_map_payload(session_id):
+    """Cached map payload entry for a session, or None if the session has not been processed.
+
+    Sessions processed before map payloads existed get theirs built from the processed frame.
+    """
+    entry = cache.get(map_cache_key(session_id))
+    if entry is not None:
+        return entry
+
+    session = UserSession.objects.filter(id=session_id).first()
+    if session is None:
+        return None
+
+    # sessions reusing an identical upload read their results from the original session
+    row = SessionData.objects.filter(session__id=session.results_session_id, type=MAP_DATA_TYPE).first()
+    if row is not None:
+        return _cache_entry(session_id, session.user_id, row.data, row.updated)
+
+    processed = SessionData.objects.filter(session__id=session.results_session_id, type='processed').select_related('session').first()
+    if processed is None:
+        return None
+    entry = store_map_payload(processed.session, processed.get_frame(['Latitude', 'Longitude', 'Speed']))
+    if session.id != processed.session_id:
+        entry = _cache_entry(session_id, session.user_id, json.loads(entry['body']), entry['last_modified'])
+    return entry
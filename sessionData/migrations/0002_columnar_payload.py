@@ -0,0 +1,38 @@
+# Generated by Django 5.0.6 on 2026-10-18 05:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sessionData", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sessiondata",
+            name="encoding",
+            field=models.CharField(
+                choices=[
+                    ("json", "JSON (DataFrame.to_json)"),
+                    ("columnar", "Columnar binary"),
+                ],
+                default="json",
+                max_length=20,
+                verbose_name="Encoding",
+            ),
+        ),
+        migrations.AddField(
+            model_name="sessiondata",
+            name="payload",
+            field=models.BinaryField(
+                blank=True, null=True, verbose_name="Columnar Payload"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="sessiondata",
+            name="data",
+            field=models.JSONField(blank=True, null=True, verbose_name="Session Data"),
+        ),
+    ]
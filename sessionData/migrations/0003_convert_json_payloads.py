@@ -0,0 +1,37 @@
+import io
+
+import pandas as pd
+from django.db import migrations
+
+from sessionData import columnar
+
+
+def json_to_columnar(apps, schema_editor):
+    SessionData = apps.get_model("sessionData", "SessionData")
+    for row in SessionData.objects.filter(encoding="json").exclude(data=None).iterator(chunk_size=50):
+        frame = pd.read_json(io.StringIO(row.data), convert_dates=["Time"])
+        if "Time" in frame:
+            frame.index = frame["Time"]
+        row.payload = columnar.encode_frame(frame)
+        row.encoding = "columnar"
+        row.data = None
+        row.save(update_fields=["payload", "encoding", "data"])
+
+
+def columnar_to_json(apps, schema_editor):
+    SessionData = apps.get_model("sessionData", "SessionData")
+    for row in SessionData.objects.filter(encoding="columnar").exclude(payload=None).iterator(chunk_size=50):
+        row.data = columnar.decode_frame(row.payload).to_json()
+        row.encoding = "json"
+        row.payload = None
+        row.save(update_fields=["payload", "encoding", "data"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("sessionData", "0002_columnar_payload"),
+    ]
+
+    operations = [
+        migrations.RunPython(json_to_columnar, columnar_to_json),
+    ]
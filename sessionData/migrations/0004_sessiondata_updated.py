@@ -0,0 +1,20 @@
+# Generated by Django 5.0.6 on 2026-10-18 05:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sessionData", "0003_convert_json_payloads"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sessiondata",
+            name="updated",
+            field=models.DateTimeField(
+                auto_now=True, null=True, verbose_name="Updated"
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.6 on 2026-10-18 05:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sessionData", "0004_sessiondata_updated"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="usersession",
+            name="content_hash",
+            field=models.CharField(
+                blank=True, db_index=True, max_length=64, verbose_name="Content Hash"
+            ),
+        ),
+        migrations.AddField(
+            model_name="usersession",
+            name="processed_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Processed At"
+            ),
+        ),
+        migrations.AddField(
+            model_name="usersession",
+            name="uploaded_at",
+            field=models.DateTimeField(
+                auto_now_add=True, null=True, verbose_name="Uploaded At"
+            ),
+        ),
+    ]
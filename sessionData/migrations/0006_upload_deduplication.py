@@ -0,0 +1,68 @@
+# Generated by Django 5.0.6 on 2026-10-18 05:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sessionData", "0005_usersession_upload_tracking"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="usersession",
+            name="file_size",
+            field=models.BigIntegerField(default=0, verbose_name="File Size"),
+        ),
+        migrations.AddField(
+            model_name="usersession",
+            name="reused_from",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="reused_by",
+                to="sessionData.usersession",
+                verbose_name="Results Reused From",
+            ),
+        ),
+        migrations.CreateModel(
+            name="DeduplicationStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "hits",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Duplicate Uploads"
+                    ),
+                ),
+                (
+                    "bytes_saved",
+                    models.BigIntegerField(default=0, verbose_name="Bytes Saved"),
+                ),
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="User",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Deduplication stats",
+            },
+        ),
+    ]
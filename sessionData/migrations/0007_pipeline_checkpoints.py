@@ -0,0 +1,27 @@
+# Generated by Django 5.0.6 on 2026-10-18 05:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sessionData", "0006_upload_deduplication"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sessiondata",
+            name="compute_seconds",
+            field=models.FloatField(
+                blank=True, null=True, verbose_name="Compute Seconds"
+            ),
+        ),
+        migrations.AddField(
+            model_name="sessiondata",
+            name="fingerprint",
+            field=models.CharField(
+                blank=True, max_length=64, verbose_name="Fingerprint"
+            ),
+        ),
+    ]
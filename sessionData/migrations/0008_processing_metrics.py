@@ -0,0 +1,57 @@
+# Generated by Django 5.0.6 on 2026-10-18 05:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sessionData", "0007_pipeline_checkpoints"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProcessingMetric",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("stage", models.CharField(max_length=100, verbose_name="Stage")),
+                ("seconds", models.FloatField(verbose_name="Seconds")),
+                (
+                    "rows_in",
+                    models.IntegerField(blank=True, null=True, verbose_name="Rows In"),
+                ),
+                (
+                    "rows_out",
+                    models.IntegerField(blank=True, null=True, verbose_name="Rows Out"),
+                ),
+                (
+                    "peak_memory",
+                    models.BigIntegerField(
+                        blank=True, null=True, verbose_name="Peak Memory"
+                    ),
+                ),
+                (
+                    "recorded_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Recorded At"),
+                ),
+                (
+                    "session",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="processing_metrics",
+                        to="sessionData.usersession",
+                        verbose_name="User Session",
+                    ),
+                ),
+            ],
+        ),
+    ]
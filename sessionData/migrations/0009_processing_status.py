@@ -0,0 +1,47 @@
+# Generated by Django 5.0.6 on 2026-10-18 06:13
+
+from django.db import migrations, models
+
+
+def mark_processed_sessions_done(apps, schema_editor):
+    UserSession = apps.get_model("sessionData", "UserSession")
+    UserSession.objects.filter(processed_at__isnull=False).update(status="done", progress=100)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sessionData", "0008_processing_metrics"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="usersession",
+            name="progress",
+            field=models.PositiveSmallIntegerField(default=0, verbose_name="Progress"),
+        ),
+        migrations.AddField(
+            model_name="usersession",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("queued", "Queued"),
+                    ("parsing", "Parsing"),
+                    ("processing", "Processing"),
+                    ("done", "Done"),
+                    ("failed", "Failed"),
+                ],
+                default="queued",
+                max_length=20,
+                verbose_name="Status",
+            ),
+        ),
+        migrations.AddField(
+            model_name="usersession",
+            name="status_message",
+            field=models.CharField(
+                blank=True, max_length=255, verbose_name="Status Message"
+            ),
+        ),
+        migrations.RunPython(mark_processed_sessions_done, migrations.RunPython.noop),
+    ]
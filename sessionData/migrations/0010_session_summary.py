@@ -0,0 +1,123 @@
+# Generated by Django 5.0.6 on 2026-10-18 06:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sessionData", "0009_processing_status"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SessionSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("session_start", models.DateTimeField(verbose_name="Session Start")),
+                ("distance", models.FloatField(verbose_name="Distance")),
+                ("duration", models.FloatField(verbose_name="Duration")),
+                ("max_speed", models.FloatField(verbose_name="Max Speed")),
+                ("avg_speed", models.FloatField(verbose_name="Average Speed")),
+                (
+                    "best_2s",
+                    models.FloatField(blank=True, null=True, verbose_name="Best 2 s"),
+                ),
+                (
+                    "best_10s",
+                    models.FloatField(blank=True, null=True, verbose_name="Best 10 s"),
+                ),
+                (
+                    "best_500m",
+                    models.FloatField(blank=True, null=True, verbose_name="Best 500 m"),
+                ),
+                (
+                    "max_heart_rate",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="Max Heart Rate"
+                    ),
+                ),
+                (
+                    "avg_heart_rate",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="Average Heart Rate"
+                    ),
+                ),
+                (
+                    "heart_rate_zones",
+                    models.JSONField(default=list, verbose_name="Heart Rate Zones"),
+                ),
+                (
+                    "min_latitude",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="Min Latitude"
+                    ),
+                ),
+                (
+                    "max_latitude",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="Max Latitude"
+                    ),
+                ),
+                (
+                    "min_longitude",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="Min Longitude"
+                    ),
+                ),
+                (
+                    "max_longitude",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="Max Longitude"
+                    ),
+                ),
+                (
+                    "fingerprint",
+                    models.CharField(
+                        blank=True, max_length=64, verbose_name="Fingerprint"
+                    ),
+                ),
+                (
+                    "updated",
+                    models.DateTimeField(auto_now=True, verbose_name="Updated"),
+                ),
+                (
+                    "session",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="summary",
+                        to="sessionData.usersession",
+                        verbose_name="User Session",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="User",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Session summaries",
+                "indexes": [
+                    models.Index(
+                        fields=["user", "session_start"], name="summary_user_start_idx"
+                    ),
+                    models.Index(fields=["session_start"], name="summary_start_idx"),
+                ],
+            },
+        ),
+    ]
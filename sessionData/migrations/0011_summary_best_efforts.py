@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 06:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sessionData", "0010_session_summary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sessionsummary",
+            name="best_efforts",
+            field=models.JSONField(default=dict, verbose_name="Best Efforts"),
+        ),
+    ]
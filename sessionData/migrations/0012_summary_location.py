@@ -0,0 +1,40 @@
+# Generated by Django 5.0.6 on 2026-10-18 06:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sessionData", "0011_summary_best_efforts"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sessionsummary",
+            name="centroid_latitude",
+            field=models.FloatField(
+                blank=True, null=True, verbose_name="Centroid Latitude"
+            ),
+        ),
+        migrations.AddField(
+            model_name="sessionsummary",
+            name="centroid_longitude",
+            field=models.FloatField(
+                blank=True, null=True, verbose_name="Centroid Longitude"
+            ),
+        ),
+        migrations.AddField(
+            model_name="sessionsummary",
+            name="geohash",
+            field=models.CharField(blank=True, max_length=12, verbose_name="Geohash"),
+        ),
+        migrations.AddIndex(
+            model_name="sessionsummary",
+            index=models.Index(
+                fields=["user", "geohash"], name="summary_user_geohash_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.6 on 2026-10-18 07:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sessionData", "0012_summary_location"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="usersession",
+            name="reused_from",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="reused_by",
+                to="sessionData.usersession",
+                verbose_name="Results Reused From",
+            ),
+        ),
+    ]
@@ -1,16 +1,130 @@
+import io
+
+import pandas as pd
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
 
+from . import columnar
+
 class UserSession(models.Model):
+    class Status(models.TextChoices):
+        QUEUED = 'queued', _("Queued")
+        PARSING = 'parsing', _("Parsing")
+        PROCESSING = 'processing', _("Processing")
+        DONE = 'done', _("Done")
+        FAILED = 'failed', _("Failed")
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name=_("User"))
     session_start = models.DateTimeField(verbose_name=_("Session Start"))
     session_stop = models.DateTimeField(verbose_name=_("Session Stop"))
     smartwatch_data_file_path = models.CharField(max_length=255, verbose_name=_("Smartwatch Data File Path"))
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True, verbose_name=_("Content Hash")) # SHA-256 of the TCX document
+    uploaded_at = models.DateTimeField(auto_now_add=True, null=True, verbose_name=_("Uploaded At"))
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name=_("Processed At"))
+    file_size = models.BigIntegerField(default=0, verbose_name=_("File Size")) # bytes of the decompressed TCX document
+    # set when an identical file was uploaded before: this session then has no data of its own;
+    # deleting the source hands its results to one of its duplicates (see deduplication.promote_duplicate)
+    reused_from = models.ForeignKey("self", null=True, blank=True, on_delete=models.SET_NULL, related_name="reused_by", verbose_name=_("Results Reused From"))
+    # updated by process_session_data as the session moves through the pipeline
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.QUEUED, verbose_name=_("Status"))
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name=_("Progress")) # percent
+    status_message = models.CharField(max_length=255, blank=True, verbose_name=_("Status Message")) # why processing failed
     
     def __str__(self):
         return f"{self.user.username} Session {self.session_start.strftime('%Y-%m-%d %H:%M')}"
 
+    @property
+    def results_session_id(self):
+        # the session whose SessionData rows hold this session's results
+        return self.reused_from_id or self.id
+
+    @property
+    def processing_latency(self):
+        # seconds from the upload to the processed result
+        if self.uploaded_at and self.processed_at:
+            return (self.processed_at - self.uploaded_at).total_seconds()
+        return None
+
+class DeduplicationStats(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, verbose_name=_("User"))
+    hits = models.PositiveIntegerField(default=0, verbose_name=_("Duplicate Uploads"))
+    bytes_saved = models.BigIntegerField(default=0, verbose_name=_("Bytes Saved"))
+
+    class Meta:
+        verbose_name_plural = _("Deduplication stats")
+
+    def __str__(self):
+        return f"{self.user.username}: {self.hits} duplicate uploads, {self.bytes_saved} bytes saved"
+
+    @classmethod
+    def record_hit(cls, user, bytes_saved):
+        # race-safe increment of the user's counters
+        cls.objects.get_or_create(user=user)
+        cls.objects.filter(user=user).update(hits=models.F('hits') + 1, bytes_saved=models.F('bytes_saved') + bytes_saved)
+
+class ProcessingMetric(models.Model):
+    # one row per instrumented processing stage and run; kept across reprocessing to track regressions
+    session = models.ForeignKey(UserSession, on_delete=models.CASCADE, related_name="processing_metrics", verbose_name=_("User Session"))
+    stage = models.CharField(max_length=100, verbose_name=_("Stage"))
+    seconds = models.FloatField(verbose_name=_("Seconds"))
+    rows_in = models.IntegerField(null=True, blank=True, verbose_name=_("Rows In"))
+    rows_out = models.IntegerField(null=True, blank=True, verbose_name=_("Rows Out"))
+    peak_memory = models.BigIntegerField(null=True, blank=True, verbose_name=_("Peak Memory")) # bytes
+    recorded_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Recorded At"))
+
+    def __str__(self):
+        return f"{self.stage} for {self.session}: {self.seconds:.3f}s"
+
+    @classmethod
+    def from_metrics(cls, session, metrics):
+        # unsaved rows for the StageMetrics of a collector, to be saved with bulk_create
+        return [cls(session=session, stage=m.stage, seconds=m.seconds, rows_in=m.rows_in,
+                    rows_out=m.rows_out, peak_memory=m.peak_memory) for m in metrics]
+
+class SessionSummary(models.Model):
+    # per-session statistics, so dashboards and leaderboards never decode session data (see summaries);
+    # duplicate uploads reusing a session's results have none, so they are not counted twice
+    session = models.OneToOneField(UserSession, on_delete=models.CASCADE, related_name="summary", verbose_name=_("User Session"))
+    # copied from the session for the per-user and per-period indexes
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name=_("User"))
+    session_start = models.DateTimeField(verbose_name=_("Session Start"))
+    distance = models.FloatField(verbose_name=_("Distance")) # meters
+    duration = models.FloatField(verbose_name=_("Duration")) # seconds
+    max_speed = models.FloatField(verbose_name=_("Max Speed")) # m/s, like every speed below
+    avg_speed = models.FloatField(verbose_name=_("Average Speed"))
+    # best average speeds over 2 s, 10 s and 500 m; null when the session is shorter
+    best_2s = models.FloatField(null=True, blank=True, verbose_name=_("Best 2 s"))
+    best_10s = models.FloatField(null=True, blank=True, verbose_name=_("Best 10 s"))
+    best_500m = models.FloatField(null=True, blank=True, verbose_name=_("Best 500 m"))
+    # every effort of segments.BEST_EFFORTS by label: speed, distance, seconds, start and end
+    best_efforts = models.JSONField(default=dict, verbose_name=_("Best Efforts"))
+    max_heart_rate = models.FloatField(null=True, blank=True, verbose_name=_("Max Heart Rate"))
+    avg_heart_rate = models.FloatField(null=True, blank=True, verbose_name=_("Average Heart Rate"))
+    heart_rate_zones = models.JSONField(default=list, verbose_name=_("Heart Rate Zones")) # seconds per zone
+    min_latitude = models.FloatField(null=True, blank=True, verbose_name=_("Min Latitude"))
+    max_latitude = models.FloatField(null=True, blank=True, verbose_name=_("Max Latitude"))
+    min_longitude = models.FloatField(null=True, blank=True, verbose_name=_("Min Longitude"))
+    max_longitude = models.FloatField(null=True, blank=True, verbose_name=_("Max Longitude"))
+    centroid_latitude = models.FloatField(null=True, blank=True, verbose_name=_("Centroid Latitude"))
+    centroid_longitude = models.FloatField(null=True, blank=True, verbose_name=_("Centroid Longitude"))
+    # geohash of the centroid; nearby sessions share a prefix, found with range scans (see summaries.sessions_near)
+    geohash = models.CharField(max_length=12, blank=True, verbose_name=_("Geohash"))
+    # fingerprint of the checkpoint the summary was computed from, like SessionData.fingerprint
+    fingerprint = models.CharField(max_length=64, blank=True, verbose_name=_("Fingerprint"))
+    updated = models.DateTimeField(auto_now=True, verbose_name=_("Updated"))
+
+    class Meta:
+        verbose_name_plural = _("Session summaries")
+        indexes = [
+            models.Index(fields=['user', 'session_start'], name='summary_user_start_idx'),
+            models.Index(fields=['session_start'], name='summary_start_idx'),
+            models.Index(fields=['user', 'geohash'], name='summary_user_geohash_idx'),
+        ]
+
+    def __str__(self):
+        return f"Summary of {self.session}"
+
 class Equipment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name=_("User"))
     equipment_type = models.CharField(max_length=100, verbose_name=_("Equipment Type"))
@@ -20,9 +134,36 @@ class Equipment(models.Model):
         return f"{self.user.username}'s {self.equipment_type}"
     
 class SessionData(models.Model):
+    ENCODING_JSON = 'json'
+    ENCODING_COLUMNAR = 'columnar'
+    ENCODING_CHOICES = [
+        (ENCODING_JSON, _("JSON (DataFrame.to_json)")),
+        (ENCODING_COLUMNAR, _("Columnar binary")),
+    ]
+
     session = models.ForeignKey(UserSession, on_delete=models.CASCADE, verbose_name=_("User Session"))
-    data = models.JSONField(verbose_name=_("Session Data"))
-    type = models.CharField(max_length=100, verbose_name=_("Data Type")) # e.g., 'smartwatch_raw', 'weather', 'processed', etc. pandas dataframe as JSON
-    
+    data = models.JSONField(null=True, blank=True, verbose_name=_("Session Data"))
+    payload = models.BinaryField(null=True, blank=True, verbose_name=_("Columnar Payload"))
+    encoding = models.CharField(max_length=20, choices=ENCODING_CHOICES, default=ENCODING_JSON, verbose_name=_("Encoding"))
+    type = models.CharField(max_length=100, verbose_name=_("Data Type")) # e.g., 'smartwatch_raw', 'weather', 'processed', 'map', etc.
+    updated = models.DateTimeField(auto_now=True, null=True, verbose_name=_("Updated"))
+    # pipeline checkpoints: hash of (input, stage version, parameters) and the time the stage took
+    fingerprint = models.CharField(max_length=64, blank=True, verbose_name=_("Fingerprint"))
+    compute_seconds = models.FloatField(null=True, blank=True, verbose_name=_("Compute Seconds"))
+
     def __str__(self):
-        return f"Data for {self.session} ({self.type})"
\ No newline at end of file
+        return f"Data for {self.session} ({self.type})"
+
+    def set_frame(self, frame, compress=True):
+        self.payload = columnar.encode_frame(frame, compress=compress)
+        self.encoding = self.ENCODING_COLUMNAR
+        self.data = None
+
+    def get_frame(self, columns=None):
+        """Load the stored DataFrame; with the columnar encoding only `columns` are decoded."""
+        if self.encoding == self.ENCODING_COLUMNAR:
+            return columnar.decode_frame(self.payload, columns)
+        frame = pd.read_json(io.StringIO(self.data), convert_dates=['Time'])
+        if 'Time' in frame:
+            frame.index = frame['Time']
+        return frame if columns is None else frame[list(columns)]
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+
+MAD_TO_SIGMA = 1.4826  # scales the median absolute deviation to a standard deviation for normal data
+CHUNK_SIZE = 1_000_000  # points per chunk of the rolling filter, bounds the size of its temporaries
+# columns checked for outliers, with the smallest deviation (in their unit) the rolling filter treats as noise
+OUTLIER_COLUMNS = {'Heart Rate': 2.0, 'Speed': 0.5}
+
+
+def iqr_mask(values, k=1.5, out=None):
+    """Mask of the values within k interquartile ranges of the quartiles of all `values`.
+
+    NaN values are masked out. With `out`, the mask is and-ed into it in place.
+    """
+    q1, q3 = np.nanquantile(values, [0.25, 0.75]) if np.isfinite(values).any() else (np.nan, np.nan)
+    iqr = q3 - q1
+    mask = (values >= q1 - k * iqr) & (values <= q3 + k * iqr)
+    if out is None:
+        return mask
+    out &= mask
+    return out
+
+
+def rolling_mad_mask(values, window=61, threshold=3.5, min_scale=0.0, chunk_size=CHUNK_SIZE, out=None):
+    """Mask of the values within `threshold` robust deviations of their centred rolling median (Hampel filter).
+
+    The deviation is the rolling median of the absolute deviations from the rolling median, scaled to
+    a standard deviation and floored at `min_scale` so that flat stretches (e.g. a steady heart rate)
+    do not turn every small change into an outlier. Unlike quartiles of the whole session, the
+    statistics follow the session from one regime (e.g. planing, slogging) to the next.
+
+    Runs in one pass per rolling statistic over chunks of `chunk_size` points. The chunks overlap by
+    the two half-windows the statistics depend on, so the result does not depend on the chunk size.
+    NaN values are skipped by the statistics and masked out. With `out`, the mask is and-ed into it
+    in place.
+    """
+    values = np.asarray(values, dtype=float)
+    if out is None:
+        out = np.ones(len(values), dtype=bool)
+    overlap = 2 * (window // 2)
+    for start in range(0, len(values), chunk_size):
+        stop = min(start + chunk_size, len(values))
+        low, high = max(0, start - overlap), min(len(values), stop + overlap)
+        chunk = values[low:high]
+
+        median = pd.Series(chunk).rolling(window, center=True, min_periods=1).median().to_numpy()
+        deviation = np.subtract(chunk, median, out=median)  # the median is not needed any more
+        np.abs(deviation, out=deviation)
+        scale = pd.Series(deviation).rolling(window, center=True, min_periods=1).median().to_numpy()
+        np.multiply(scale, MAD_TO_SIGMA * threshold, out=scale)
+        np.maximum(scale, min_scale * threshold, out=scale)
+
+        keep = deviation[start - low:stop - low] <= scale[start - low:stop - low]  # False for NaN
+        out[start:stop] &= keep
+    return out
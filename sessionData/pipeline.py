@@ -0,0 +1,280 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import columnar
+from .data_processor import ProcessSessionData
+from .instrumentation import RecordingCollector
+from .models import ProcessingMetric, SessionData, UserSession
+from .progress import PARSING_PROGRESS, publish_status, set_status, stage_progress
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Stage:
+    """One step of the session pipeline.
+
+    The stage's output is checkpointed as the SessionData row of type `artifact`, together with a
+    fingerprint of (input fingerprint, name, version, params). Bump `version` whenever the code
+    behind the stage changes the output, so existing checkpoints of this and later stages are
+    recomputed; stages before it are reused.
+    """
+    name: str
+    artifact: str
+    version: int
+    run: callable
+    params: dict = field(default_factory=dict)
+
+    def fingerprint(self, input_fingerprint):
+        key = json.dumps([input_fingerprint, self.name, self.version, self.params], sort_keys=True)
+        return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _read(processor, path, params):
+    processor.read_tcx(path)
+
+
+def _derivables(processor, path, params):
+    processor.calculate_derivables()
+
+
+def _smooth(processor, path, params):
+    processor.smooth_data(**params)
+
+
+def _outliers(processor, path, params):
+    processor.filter_outliers(**params)
+
+
+READ_STAGE = Stage('read', 'smartwatch_raw', 1, _read)
+
+STAGES = [
+    READ_STAGE,
+    Stage('derivables', 'derivables', 1, _derivables),
+    Stage('smooth', 'smoothed', 2, _smooth, {'time_delta': 10}),
+    # 61 points of the 10 s grid: statistics of the 10 minutes around every point
+    Stage('outliers', 'processed', 1, _outliers, {'method': 'rolling', 'window': 61, 'threshold': 3.5}),
+]
+
+
+@dataclass
+class PipelineReport:
+    computed: list = field(default_factory=list)
+    reused: list = field(default_factory=list)
+    seconds: float = 0.0
+    seconds_saved: float = 0.0
+
+    @property
+    def changed(self):
+        return bool(self.computed)
+
+
+@dataclass
+class PipelinePlan:
+    """The stages a session has to compute, decided from its stored checkpoints alone.
+
+    source is the checkpoint the first stage to compute starts from (the last stage's checkpoint if
+    nothing has to be computed), or None to start from the TCX document.
+    """
+    session: object
+    stages: list
+    fingerprints: list
+    source: object
+    report: PipelineReport
+
+    def load_source(self):
+        """The frame the plan starts from; a deferred source checkpoint is fetched on demand."""
+        if self.source is None:
+            return None
+        if 'payload' in self.source.get_deferred_fields():
+            self.source.refresh_from_db(fields=['data', 'payload', 'encoding'])
+        return self.source.get_frame()
+
+
+@dataclass
+class StageOutput:
+    stage: Stage
+    payload: bytes
+    seconds: float
+    points: int
+    span: tuple  # first and last timestamp of the output
+
+
+def hash_file(path, chunk_size=2**20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while chunk := file.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def input_fingerprint(session):
+    """Fingerprint of the session's TCX document, computing its content hash for older sessions."""
+    if not session.content_hash and os.path.exists(session.smartwatch_data_file_path):
+        session.content_hash = hash_file(session.smartwatch_data_file_path)
+        session.save(update_fields=['content_hash'])
+    return session.content_hash or f'session:{session.id}'
+
+
+def read_fingerprint(content_hash):
+    """Fingerprint of the read stage's output for a document, for raw frames parsed during upload."""
+    return READ_STAGE.fingerprint(content_hash)
+
+
+def plan_pipeline(session, stages=STAGES, force=False, stored=None):
+    """Plan the stages for a session, reusing every checkpoint whose fingerprint is still valid.
+
+    stored maps artifact types to the session's SessionData rows (payloads may be deferred) and is
+    queried when not given, so a session whose checkpoints are all current costs a single query.
+    """
+    if stored is None:
+        stored = {row.type: row for row in SessionData.objects.filter(session=session).defer('data', 'payload')}
+    report = PipelineReport()
+    fingerprint = input_fingerprint(session)
+    source = None
+    for index, stage in enumerate(stages):
+        fingerprint = stage.fingerprint(fingerprint)
+        row = stored.get(stage.artifact)
+
+        # raw frames from before checkpointing are trusted when the document is gone
+        if stage.artifact == READ_STAGE.artifact and row is not None and not row.fingerprint \
+                and not os.path.exists(session.smartwatch_data_file_path):
+            row.fingerprint = fingerprint
+            row.save(update_fields=['fingerprint'])
+
+        if force or row is None or row.fingerprint != fingerprint:
+            # later fingerprints chain this one, so every checkpoint downstream of a changed stage is stale
+            fingerprints = [fingerprint]
+            for later in stages[index + 1:]:
+                fingerprints.append(later.fingerprint(fingerprints[-1]))
+            return PipelinePlan(session, stages[index:], fingerprints, source, report)
+
+        report.reused.append(stage.name)
+        report.seconds_saved += row.compute_seconds or 0.0
+        source = row
+    return PipelinePlan(session, [], [], source, report)
+
+
+def compute_stages(stages, path, data=None, processor=None, on_stage=None):
+    """Run `stages` in order on `data`, or on the TCX document at `path` when starting with the read stage.
+
+    Touches neither the database nor the session, so it can run in a worker process. Returns the
+    encoded output of every stage; processor.data is left holding the last one. `on_stage(done, total)`
+    is called after every stage.
+    """
+    processor = processor or ProcessSessionData()
+    processor.data = data
+    outputs = []
+    for stage in stages:
+        start = time.perf_counter()
+        stage.run(processor, path, stage.params)
+        seconds = time.perf_counter() - start
+        span = (processor.data.index[0], processor.data.index[-1]) if len(processor.data) else (None, None)
+        outputs.append(StageOutput(stage, columnar.encode_frame(processor.data), seconds, len(processor.data), span))
+        if on_stage is not None:
+            on_stage(len(outputs), len(stages))
+    return outputs
+
+
+def apply_outputs(plan, outputs):
+    """Record computed stages in the plan's report and session and build their checkpoint rows (unsaved)."""
+    rows = []
+    for output, fingerprint in zip(outputs, plan.fingerprints):
+        plan.report.computed.append(output.stage.name)
+        plan.report.seconds += output.seconds
+        if output.stage.artifact == READ_STAGE.artifact and output.span[0] is not None:
+            plan.session.session_start, plan.session.session_stop = output.span
+        rows.append(SessionData(
+            session=plan.session, type=output.stage.artifact, payload=output.payload,
+            encoding=SessionData.ENCODING_COLUMNAR, fingerprint=fingerprint, compute_seconds=output.seconds,
+        ))
+    return rows
+
+
+def replace_session_data(rows):
+    """Replace the sessions' SessionData rows of the same types with `rows`, in two queries."""
+    if not rows:
+        return
+    stale = Q()
+    for row in rows:
+        stale |= Q(session=row.session, type=row.type)
+    with transaction.atomic():
+        SessionData.objects.filter(stale).delete()
+        SessionData.objects.bulk_create(rows)
+
+
+def run_pipeline(session, processor=None, stages=STAGES, force=False, on_stage=None):
+    """Run the stages for a session in this process, reusing every checkpoint that is still valid.
+
+    Leaves the last stage's output in processor.data when anything was recomputed.
+    """
+    plan = plan_pipeline(session, stages, force)
+    if plan.stages:
+        outputs = compute_stages(plan.stages, session.smartwatch_data_file_path, plan.load_source(), processor, on_stage)
+        replace_session_data(apply_outputs(plan, outputs))
+    report = plan.report
+
+    logger.info(f"Pipeline for session {session.id}: computed {report.computed or 'nothing'}, "
+                f"reused {report.reused or 'nothing'} ({report.seconds:.2f}s, {report.seconds_saved:.2f}s saved)")
+    return report
+
+
+def process_session(session, processor=None, force=False):
+    """Bring a session's checkpoints, processed frame, map payload, resolution levels and summary up to date.
+
+    Metrics of the computed stages are stored with the session if the processor's collector keeps them.
+    The session's status and progress are published as it goes.
+    """
+    processor = processor or ProcessSessionData(collector=RecordingCollector(session_id=session.id))
+    set_status(session, UserSession.Status.PARSING, PARSING_PROGRESS)
+    report = run_pipeline(session, processor, force=force, on_stage=stage_progress(session))
+    ProcessingMetric.objects.bulk_create(ProcessingMetric.from_metrics(session, getattr(processor.collector, 'metrics', [])))
+    finish_session(session, processor.data if report.changed else None, report.changed)
+    return report
+
+
+def process_stage(session, index, processor=None, stages=STAGES):
+    """Bring the checkpoint of stages[index] up to date, reusing the valid checkpoints before it.
+
+    process_session in chunks, so that every stage can run as a task of its own; finish_session
+    completes the session after the last one.
+    """
+    processor = processor or ProcessSessionData(collector=RecordingCollector(session_id=session.id))
+    report = run_pipeline(session, processor, stages[:index + 1])
+    ProcessingMetric.objects.bulk_create(ProcessingMetric.from_metrics(session, getattr(processor.collector, 'metrics', [])))
+    if READ_STAGE.name in report.computed:
+        session.save(update_fields=['session_start', 'session_stop'])
+    stage_progress(session)(index + 1, len(stages))
+    return report
+
+
+def finish_session(session, data=None, changed=True):
+    """Store the map payload if the processed frame changed or has none yet, bring the session's
+    resolution levels and summary up to date, then mark the session done.
+
+    `data` is the processed frame when the caller has it at hand, otherwise it is loaded.
+    """
+    from .map_payload import MAP_DATA_TYPE, store_map_payload
+    from .resolutions import store_resolutions
+    from .summaries import store_summary
+
+    if changed or not SessionData.objects.filter(session=session, type=MAP_DATA_TYPE).exists():
+        if data is None:
+            data = SessionData.objects.get(session=session, type=STAGES[-1].artifact).get_frame()
+        store_map_payload(session, data)
+    store_resolutions(session)
+    store_summary(session)
+
+    session.processed_at = timezone.now()
+    session.status, session.progress, session.status_message = UserSession.Status.DONE, 100, ''
+    session.save()
+    publish_status(session)
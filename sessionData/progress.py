@@ -0,0 +1,111 @@
+import asyncio
+import json
+import time
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.urls import reverse
+
+from .models import UserSession
+
+
+STATUS_CACHE_TIMEOUT = 24 * 3600
+STATUS_POLL_INTERVAL = 0.5  # seconds between checks of the cached status while streaming
+STATUS_STREAM_SECONDS = 120  # a stream ends after this; EventSource reconnects on its own
+STATUS_HEARTBEAT_SECONDS = 15  # comment lines keep proxies from closing an idle stream
+STATUS_RETRY_MILLISECONDS = 2000
+TERMINAL_STATUSES = {UserSession.Status.DONE, UserSession.Status.FAILED}
+
+# progress reported while the pipeline runs: stages fill the range between parsing and done
+PARSING_PROGRESS = 5
+STAGES_PROGRESS = (10, 95)
+
+
+def status_cache_key(session_id):
+    return f"sessionData:status:{session_id}"
+
+
+def status_entry(session_id, status, progress, message=''):
+    return {
+        'session_id': session_id,
+        'status': status,
+        'progress': progress,
+        'message': message,
+        'results_url': reverse('session_results', args=(session_id,)) if status == UserSession.Status.DONE else None,
+    }
+
+
+def publish_status(session):
+    """Cache the session's current status for the event streams; call after saving it."""
+    entry = status_entry(session.id, session.status, session.progress, session.status_message)
+    cache.set(status_cache_key(session.id), entry, STATUS_CACHE_TIMEOUT)
+    return entry
+
+
+def set_status(session, status, progress, message=''):
+    """Save and publish a new processing status of a session, without touching its other fields."""
+    session.status, session.progress, session.status_message = status, progress, message[:255]
+    UserSession.objects.filter(pk=session.pk).update(status=status, progress=progress, status_message=session.status_message)
+    return publish_status(session)
+
+
+def stage_progress(session):
+    """Callback for run_pipeline that reports every finished stage of `session`."""
+    low, high = STAGES_PROGRESS
+
+    def on_stage(done, total):
+        set_status(session, UserSession.Status.PROCESSING, low + (high - low) * done // total)
+    return on_stage
+
+
+async def aget_status(session_id):
+    # the cache is filled by the worker; the database is only read after the entry expired or was evicted
+    entry = await cache.aget(status_cache_key(session_id))
+    if entry is None:
+        session = await UserSession.objects.filter(pk=session_id).values('status', 'progress', 'status_message').afirst()
+        if session is None:
+            return None
+        entry = status_entry(session_id, session['status'], session['progress'], session['status_message'])
+        await cache.aset(status_cache_key(session_id), entry, STATUS_CACHE_TIMEOUT)
+    return entry
+
+
+def _event(entry):
+    return f"event: status\ndata: {json.dumps(entry, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def status_snapshot(session_id):
+    """The session's current status as a complete Server-Sent Events response body.
+
+    For servers that cannot stream an async iterator (WSGI): the response ends at once and
+    EventSource reconnects after STATUS_RETRY_MILLISECONDS, so the client polls instead.
+    """
+    entry = await aget_status(session_id)
+    return f"retry: {STATUS_RETRY_MILLISECONDS}\n\n" + (_event(entry) if entry is not None else '')
+
+
+async def status_events(session_id):
+    """Server-Sent Events with every status change of a session, until it is done or failed.
+
+    Changes are picked up from the cache every STATUS_POLL_INTERVAL, so a waiting client costs
+    no database queries and no thread. Only for ASGI: Django's WSGI handler consumes an async
+    stream completely before sending any of it (see status_snapshot).
+    """
+    yield f"retry: {STATUS_RETRY_MILLISECONDS}\n\n"
+    start = last_sent = time.monotonic()
+    last = None
+    while True:
+        entry = await aget_status(session_id)
+        if entry is None:
+            return
+        if entry != last:
+            yield _event(entry)
+            last, last_sent = entry, time.monotonic()
+            if entry['status'] in TERMINAL_STATUSES:
+                return
+        elif time.monotonic() - last_sent >= STATUS_HEARTBEAT_SECONDS:
+            yield ": keep-alive\n\n"
+            last_sent = time.monotonic()
+        if time.monotonic() - start >= STATUS_STREAM_SECONDS:
+            return
+        await asyncio.sleep(STATUS_POLL_INTERVAL)
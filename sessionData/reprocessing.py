@@ -0,0 +1,244 @@
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import django
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import columnar
+from .data_processor import ProcessSessionData
+from .map_payload import MAP_DATA_TYPE, build_map_payload, map_cache_key
+from .instrumentation import RecordingCollector
+from .models import ProcessingMetric, SessionData, SessionSummary, UserSession
+from .pipeline import STAGES, apply_outputs, compute_stages, plan_pipeline, replace_session_data
+from .progress import status_cache_key
+from .resolutions import RESOLUTION_SOURCE, build_resolution_payloads, resolution_rows
+from .summaries import SUMMARY_SOURCE, build_summary, replace_summaries, summarize, summary_fingerprint
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ReprocessStats:
+    sessions: int = 0
+    skipped: int = 0
+    failed: int = 0
+    points: int = 0
+    seconds: float = 0.0
+    seconds_saved: float = 0.0
+    # wall time of planning, waiting for the workers and writing, and summed worker time per stage
+    phase_seconds: dict = field(default_factory=lambda: defaultdict(float))
+    stage_seconds: dict = field(default_factory=lambda: defaultdict(float))
+    errors: list = field(default_factory=list)
+
+    @property
+    def wall_seconds(self):
+        return sum(self.phase_seconds.values())
+
+
+def reprocess_worker(session_id, stages, path, source, track_memory=False):
+    """Compute a planned session in a worker process: its stage outputs, map payload, resolution levels,
+    summary fields and stage metrics.
+
+    source is the (fully loaded) checkpoint to start from, or None to read the document. The levels
+    (as encoded payloads by label) and the summary are only built when the derivables checkpoint
+    they are computed from was recomputed; otherwise they are None.
+    """
+    collector = RecordingCollector(track_memory, session_id=session_id)
+    processor = ProcessSessionData(source.get_frame() if source is not None else None, collector=collector)
+    outputs = compute_stages(stages, path, processor.data, processor)
+    points = outputs[0].points if outputs else len(processor.data)
+    # the levels and the summary are both computed from the derivables checkpoint
+    derivables = next((columnar.decode_frame(output.payload) for output in outputs
+                       if output.stage.artifact == RESOLUTION_SOURCE), None)
+    levels = build_resolution_payloads(derivables) if derivables is not None else None
+    summary = summarize(derivables) if derivables is not None else None
+    return outputs, build_map_payload(processor.data), levels, summary, points, collector.metrics
+
+
+def summary_worker(source):
+    """The summary fields of a session from its (fully loaded) derivables checkpoint, in a worker process."""
+    return summarize(source.get_frame())
+
+
+def select_sessions(session_ids=None, usernames=None, since=None, until=None):
+    """Sessions with results of their own (not reusing another upload), filtered by id, user and start date."""
+    sessions = UserSession.objects.filter(reused_from__isnull=True).order_by('id')
+    if session_ids:
+        sessions = sessions.filter(id__in=session_ids)
+    if usernames:
+        sessions = sessions.filter(user__username__in=usernames)
+    if since:
+        sessions = sessions.filter(session_start__date__gte=since)
+    if until:
+        sessions = sessions.filter(session_start__date__lt=until)
+    return sessions
+
+
+def _batches(queryset, batch_size):
+    batch = []
+    for item in queryset.iterator(chunk_size=batch_size):
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def reprocess_sessions(sessions, workers=1, batch_size=50, force=False, stages=STAGES, track_memory=False, stats=None):
+    """Bring the checkpoints and map payloads of many sessions up to date.
+
+    Sessions are planned in batches of batch_size with one query for their checkpoints; the stages
+    are computed in a pool of `workers` processes (in this process if workers is 1) and every
+    batch's results are written with a handful of bulk queries. A session that fails is counted
+    and skipped without affecting the rest of its batch. The metrics of every computed stage are
+    stored as ProcessingMetric rows; track_memory adds their peak memory at some cost in speed.
+    """
+    stats = stats or ReprocessStats()
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=django.setup) if workers > 1 else None
+    try:
+        for batch in _batches(sessions, batch_size):
+            _reprocess_batch(batch, executor, force, stages, track_memory, stats)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return stats
+
+
+def _reprocess_batch(batch, executor, force, stages, track_memory, stats):
+    start = time.perf_counter()
+    stored = defaultdict(dict)
+    for row in SessionData.objects.filter(session__in=batch).defer('data', 'payload'):
+        stored[row.session_id][row.type] = row
+
+    jobs = []
+    for session in batch:
+        plan = plan_pipeline(session, stages, force, stored[session.id])
+        if plan.stages or MAP_DATA_TYPE not in stored[session.id]:
+            jobs.append(plan)
+        else:
+            stats.skipped += 1
+            stats.seconds_saved += plan.report.seconds_saved
+
+    # source checkpoints are loaded in one query and shipped to the workers undecoded
+    sources = SessionData.objects.in_bulk([plan.source.id for plan in jobs if plan.source is not None])
+    stats.phase_seconds['plan'] += time.perf_counter() - start
+
+    start = time.perf_counter()
+    submit = executor.submit if executor is not None else _InlineFuture
+    futures = [
+        (plan, submit(reprocess_worker, plan.session.id, plan.stages, plan.session.smartwatch_data_file_path,
+                      sources.get(plan.source.id) if plan.source is not None else None, track_memory))
+        for plan in jobs
+    ]
+
+    rows = []
+    metrics = []
+    sessions = []
+    summaries = []
+    for plan, future in futures:
+        try:
+            outputs, payload, levels, summary, points, stage_metrics = future.result()
+        except Exception as e:
+            stats.failed += 1
+            stats.errors.append((plan.session.id, str(e)))
+            logger.error(f"Error reprocessing session {plan.session.id}: {e}")
+            continue
+        rows += apply_outputs(plan, outputs)
+        rows.append(SessionData(session=plan.session, type=MAP_DATA_TYPE, data=payload))
+        if levels is not None:
+            source = next(index for index, output in enumerate(outputs) if output.stage.artifact == RESOLUTION_SOURCE)
+            rows += resolution_rows(plan.session, levels, plan.fingerprints[source])
+            summaries.append(build_summary(plan.session, summary, plan.fingerprints[source]))
+        metrics += ProcessingMetric.from_metrics(plan.session, stage_metrics)
+        plan.session.processed_at = timezone.now()
+        plan.session.status, plan.session.progress, plan.session.status_message = UserSession.Status.DONE, 100, ''
+        sessions.append(plan.session)
+
+        stats.sessions += 1
+        stats.points += points
+        stats.seconds += plan.report.seconds
+        stats.seconds_saved += plan.report.seconds_saved
+        for output in outputs:
+            stats.stage_seconds[output.stage.name] += output.seconds
+    stats.phase_seconds['compute'] += time.perf_counter() - start
+
+    start = time.perf_counter()
+    replace_session_data(rows)
+    replace_summaries(summaries)
+    UserSession.objects.bulk_update(sessions, ['session_start', 'session_stop', 'processed_at', 'status', 'progress', 'status_message'])
+    ProcessingMetric.objects.bulk_create(metrics)
+    # sessions reusing these uploads cache the same payload under their own id
+    reusing = UserSession.objects.filter(reused_from__in=sessions).values_list('id', flat=True)
+    cache.delete_many([map_cache_key(session_id) for session_id in [session.id for session in sessions] + list(reusing)]
+                      + [status_cache_key(session.id) for session in sessions])
+    stats.phase_seconds['write'] += time.perf_counter() - start
+
+
+def backfill_summaries(sessions, workers=1, batch_size=50, force=False, stats=None):
+    """Compute the summaries of many sessions from their derivables checkpoints.
+
+    Like reprocess_sessions: batches of batch_size sessions are checked with two queries, the
+    summaries are computed in a pool of `workers` processes (in this process if workers is 1) and
+    written with two queries per batch. Summaries that are current are skipped unless force;
+    sessions without a derivables checkpoint (never processed) are counted as failed.
+    """
+    stats = stats or ReprocessStats()
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=django.setup) if workers > 1 else None
+    submit = executor.submit if executor is not None else _InlineFuture
+    try:
+        for batch in _batches(sessions, batch_size):
+            start = time.perf_counter()
+            sources = {row.session_id: row for row in SessionData.objects.filter(session__in=batch, type=SUMMARY_SOURCE)
+                       .defer('data', 'payload')}
+            current = dict(SessionSummary.objects.filter(session__in=batch).values_list('session_id', 'fingerprint'))
+            jobs = []
+            for session in batch:
+                source = sources.get(session.id)
+                if source is None:
+                    stats.failed += 1
+                    stats.errors.append((session.id, "not processed"))
+                elif not force and current.get(session.id) == summary_fingerprint(source.fingerprint):
+                    stats.skipped += 1
+                else:
+                    jobs.append((session, source))
+            loaded = SessionData.objects.in_bulk([source.id for session, source in jobs])
+            stats.phase_seconds['plan'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            futures = [(session, source, submit(summary_worker, loaded[source.id])) for session, source in jobs]
+            summaries = []
+            for session, source, future in futures:
+                try:
+                    fields = future.result()
+                except Exception as e:
+                    stats.failed += 1
+                    stats.errors.append((session.id, str(e)))
+                    logger.error(f"Error summarizing session {session.id}: {e}")
+                    continue
+                summaries.append(build_summary(session, fields, source.fingerprint))
+                stats.sessions += 1
+            stats.phase_seconds['compute'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            replace_summaries(summaries)
+            stats.phase_seconds['write'] += time.perf_counter() - start
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return stats
+
+
+class _InlineFuture:
+    """Runs the job in this process when result() is called, in place of a worker's future."""
+    def __init__(self, function, *args):
+        self.function = function
+        self.args = args
+
+    def result(self):
+        return self.function(*self.args)
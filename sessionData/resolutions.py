@@ -0,0 +1,81 @@
+import hashlib
+import json
+
+from . import columnar, smoothing
+from .models import SessionData
+
+
+# Levels of a session's time series kept ready for views, by label: bucket size in seconds.
+# They are resampled from the derivables checkpoint (every trackpoint, before smoothing and outlier
+# filtering), which is also served as the raw level.
+RESOLUTIONS = {'1s': 1, '10s': 10, '60s': 60}
+RAW_RESOLUTION = 'raw'
+RESOLUTION_SOURCE = 'derivables'
+# bump whenever the resampling changes its output, so stored levels are rebuilt
+RESOLUTION_VERSION = 1
+
+
+def resolution_type(label):
+    return f'resolution_{label}'
+
+
+def resolution_fingerprint(source_fingerprint):
+    key = json.dumps([source_fingerprint, 'resolutions', RESOLUTION_VERSION, RESOLUTIONS], sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def build_resolution_payloads(data):
+    """Encoded frames of every level in RESOLUTIONS for a derivables frame, by label."""
+    return {label: columnar.encode_frame(frame) for label, frame in smoothing.resolutions(data, RESOLUTIONS).items()}
+
+
+def resolution_rows(session, payloads, source_fingerprint):
+    """Unsaved SessionData rows for the encoded levels of a session."""
+    fingerprint = resolution_fingerprint(source_fingerprint)
+    return [
+        SessionData(session=session, type=resolution_type(label), payload=payload,
+                    encoding=SessionData.ENCODING_COLUMNAR, fingerprint=fingerprint)
+        for label, payload in payloads.items()
+    ]
+
+
+def store_resolutions(session, force=False):
+    """Rebuild the session's levels unless they are current with its derivables checkpoint.
+
+    Checking costs one query; returns the rows written (none if they were current or the session
+    has no derivables checkpoint).
+    """
+    from .pipeline import replace_session_data
+
+    types = [resolution_type(label) for label in RESOLUTIONS]
+    stored = {row.type: row for row in SessionData.objects.filter(session=session, type__in=[RESOLUTION_SOURCE, *types])
+              .defer('data', 'payload')}
+    source = stored.get(RESOLUTION_SOURCE)
+    if source is None:
+        return []
+    fingerprint = resolution_fingerprint(source.fingerprint)
+    if not force and all(type in stored and stored[type].fingerprint == fingerprint for type in types):
+        return []
+
+    source.refresh_from_db(fields=['data', 'payload', 'encoding'])
+    rows = resolution_rows(session, build_resolution_payloads(source.get_frame()), source.fingerprint)
+    replace_session_data(rows)
+    return rows
+
+
+def get_resolution(session, label, columns=None):
+    """A session's time series at level `label` (RAW_RESOLUTION or a key of RESOLUTIONS), or None.
+
+    Only `columns` are decoded if given. Levels of sessions processed before they existed, or stale
+    after a RESOLUTION_VERSION change, are built on first use.
+    """
+    if label != RAW_RESOLUTION and label not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution '{label}', expected {RAW_RESOLUTION} or one of {', '.join(RESOLUTIONS)}")
+    # sessions reusing an identical upload read their results from the original session
+    results = session.reused_from or session
+    if label == RAW_RESOLUTION:
+        row = SessionData.objects.filter(session=results, type=RESOLUTION_SOURCE).first()
+    else:
+        row = next((row for row in store_resolutions(results) if row.type == resolution_type(label)), None) \
+            or SessionData.objects.filter(session=results, type=resolution_type(label)).first()
+    return row.get_frame(columns) if row is not None else None
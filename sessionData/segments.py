@@ -0,0 +1,107 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from . import geo, outliers
+
+
+# GPS spikes are dropped with the rolling filter of the outliers stage, scaled to 1 s points
+OUTLIER_WINDOW = 61
+OUTLIER_THRESHOLD = 3.5
+
+
+@dataclass(frozen=True)
+class Effort:
+    """A best effort to search for: the fastest stretch of a session lasting `target` seconds
+    (kind 'duration') or covering `target` meters (kind 'distance').
+
+    Kind 'alpha' is a distance effort that has to end within `gate` meters of where it started,
+    i.e. a run out, a jibe and back, as in the alpha 500 of GPS speedsurfing.
+    """
+    label: str
+    kind: str
+    target: float
+    gate: float = 50.0
+
+
+BEST_EFFORTS = (
+    Effort('2s', 'duration', 2),
+    Effort('10s', 'duration', 10),
+    Effort('500m', 'distance', 500),
+    Effort('nautical_mile', 'distance', 1852),
+    Effort('alpha_500', 'alpha', 500),
+)
+
+
+def track_arrays(data):
+    """Elapsed seconds, cumulative distance (m), latitudes and longitudes of the plausible trackpoints.
+
+    Points without a position and points whose speed is an outlier are dropped, and the distance is
+    measured between the points that remain (with the haversine of calc_distance), so a GPS spike
+    neither adds the distance out and back nor shows up as a speed.
+    """
+    speed = data['Speed'].to_numpy()
+    latitude = data['Latitude'].to_numpy()
+    longitude = data['Longitude'].to_numpy()
+    keep = outliers.rolling_mad_mask(speed, OUTLIER_WINDOW, OUTLIER_THRESHOLD, outliers.OUTLIER_COLUMNS['Speed'])
+    keep[:1] = True  # the first point has no speed yet
+    keep &= np.isfinite(latitude) & np.isfinite(longitude)
+    latitude = latitude[keep]
+    longitude = longitude[keep]
+    nanoseconds = pd.DatetimeIndex(data.index).as_unit('ns').asi8[keep]
+    seconds = (nanoseconds - nanoseconds[0]) / 1e9 if len(nanoseconds) else np.empty(0)
+    steps = geo.haversine(latitude[:-1], longitude[:-1], latitude[1:], longitude[1:])
+    distance = np.concatenate(([0.0], np.cumsum(steps)))[:len(seconds)]
+    return seconds, distance, latitude, longitude
+
+
+def windows(values, target):
+    """Start and end indices of the shortest windows over which the non-decreasing `values` grow by
+    at least `target`: every start paired with the first point at or beyond values[start] + target.
+
+    The ends are the two pointers of the classic sliding-window search, found for all starts at once
+    with np.searchsorted; since the targets are sorted too, numpy narrows each search from the
+    previous result, so this is a single C pass instead of a Python loop. Starts without such an end
+    (too close to the end of the track) are left out.
+    """
+    ends = np.searchsorted(values, values + target)
+    starts = np.flatnonzero(ends < len(values))
+    return starts, ends[starts]
+
+
+def _fastest(starts, ends, seconds, distance):
+    elapsed = seconds[ends] - seconds[starts]
+    covered = distance[ends] - distance[starts]
+    valid = elapsed > 0  # repeated timestamps
+    if not valid.any():
+        return None
+    speeds = np.where(valid, covered, 0.0) / np.where(valid, elapsed, 1.0)
+    best = int(np.argmax(speeds))
+    start, end = int(starts[best]), int(ends[best])
+    return {'speed': float(speeds[best]), 'distance': float(covered[best]), 'seconds': float(elapsed[best]),
+            'start': float(seconds[start]), 'end': float(seconds[end])}
+
+
+def best_efforts(seconds, distance, latitude=None, longitude=None, efforts=BEST_EFFORTS):
+    """The fastest stretch of a track for every effort, by label (None if the track is too short).
+
+    Takes the arrays of track_arrays (the coordinates are only needed for alpha efforts). Every
+    result has the average speed (m/s), the distance and seconds it covered and its start and end
+    as elapsed seconds. Each target costs one pass over the arrays, and efforts sharing one (like
+    500m and alpha_500) share it.
+    """
+    searched = {}
+    results = {}
+    for effort in efforts:
+        if effort.kind not in ('duration', 'distance', 'alpha'):
+            raise ValueError(f"Unknown effort kind '{effort.kind}', expected 'duration', 'distance' or 'alpha'")
+        key = ('duration' if effort.kind == 'duration' else 'distance', effort.target)
+        if key not in searched:
+            searched[key] = windows(seconds if effort.kind == 'duration' else distance, effort.target)
+        starts, ends = searched[key]
+        if effort.kind == 'alpha':
+            gap = geo.haversine(latitude[starts], longitude[starts], latitude[ends], longitude[ends])
+            starts, ends = starts[gap <= effort.gate], ends[gap <= effort.gate]
+        results[effort.label] = _fastest(starts, ends, seconds, distance)
+    return results
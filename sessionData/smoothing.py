@@ -0,0 +1,173 @@
+import numpy as np
+import pandas as pd
+
+
+# bearings in degrees; averaged as unit vectors so that 359° and 1° average to 0° instead of 180°
+ANGULAR_COLUMNS = {'Direction'}
+SMOOTHING_METHODS = ('moving_average', 'exponential', 'savitzky_golay')
+
+
+def _datetime_nanoseconds(values):
+    return pd.DatetimeIndex(values).as_unit('ns').asi8
+
+
+def bucket_means(time, columns, seconds, angular=ANGULAR_COLUMNS):
+    """Means of `columns` over consecutive buckets of `seconds`, like DataFrame.resample().mean().
+
+    `time` is a DatetimeIndex (sorted) and `columns` maps names to arrays or Series of the same length;
+    datetime columns are averaged too. Buckets are aligned to multiples of `seconds` since the epoch
+    and every bucket between the first and the last point is returned, empty ones as NaN. Every
+    column costs a couple of np.bincount passes, whatever the number of buckets.
+
+    Returns the bucket start times (a DatetimeIndex in the time zone of `time`) and a dict of arrays.
+    """
+    step = int(seconds * 1_000_000_000)
+    nanoseconds = _datetime_nanoseconds(time)
+    if not len(nanoseconds):
+        return pd.DatetimeIndex([], tz=getattr(time, 'tz', None), name=getattr(time, 'name', None)), \
+            {name: np.asarray(values)[:0] for name, values in columns.items()}
+    buckets = nanoseconds // step
+    first = buckets[0]
+    buckets -= first
+    size = int(buckets.max()) + 1
+    counts = np.bincount(buckets, minlength=size)  # shared by the columns without NaN values
+
+    means = {}
+    for name, values in columns.items():
+        if isinstance(values.dtype, pd.DatetimeTZDtype) or pd.api.types.is_datetime64_dtype(values.dtype):
+            times = pd.DatetimeIndex(values)
+            # averaged as float offsets from the first point; the epoch in float64 would round to ~256 ns
+            offsets = (_datetime_nanoseconds(times) - nanoseconds[0]).astype(float)
+            offsets[times.isna()] = np.nan
+            mean = _bucket_mean(buckets, offsets, size, counts)
+            valid = ~np.isnan(mean)
+            result = np.full(size, np.iinfo(np.int64).min, dtype=np.int64)  # NaT
+            result[valid] = nanoseconds[0] + np.round(mean[valid]).astype(np.int64)
+            mean = pd.DatetimeIndex(result.view('datetime64[ns]'))
+            means[name] = (mean.tz_localize('UTC').tz_convert(times.tz) if times.tz is not None else mean).array
+        elif name in angular:
+            means[name] = _bucket_circular_mean(buckets, np.asarray(values, dtype=float), size, counts)
+        else:
+            means[name] = _bucket_mean(buckets, np.asarray(values, dtype=float), size, counts)
+
+    index = pd.DatetimeIndex(((first + np.arange(size)) * step).view('datetime64[ns]'), name=getattr(time, 'name', None))
+    if getattr(time, 'tz', None) is not None:
+        index = index.tz_localize('UTC').tz_convert(time.tz)
+    return index, means
+
+
+def _bucket_mean(buckets, values, size, counts):
+    valid = ~np.isnan(values)
+    if valid.all():
+        sums = np.bincount(buckets, weights=values, minlength=size)
+    else:
+        sums = np.bincount(buckets, weights=np.where(valid, values, 0.0), minlength=size)
+        counts = np.bincount(buckets, weights=valid, minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts
+
+
+def _bucket_circular_mean(buckets, degrees, size, counts):
+    valid = ~np.isnan(degrees)
+    radians = np.radians(degrees)
+    if not valid.all():
+        radians[~valid] = 0.0
+        counts = np.bincount(buckets, weights=valid, minlength=size)
+    # NaN bearings would add (0, 1) as (sin, cos); they are zeroed out of both sums instead
+    sines = np.bincount(buckets, weights=np.sin(radians) * valid, minlength=size)
+    cosines = np.bincount(buckets, weights=np.cos(radians) * valid, minlength=size)
+    mean = np.degrees(np.arctan2(sines, cosines)) % 360
+    mean[counts == 0] = np.nan
+    return mean
+
+
+def resample_frame(data, seconds, angular=ANGULAR_COLUMNS):
+    """`data` (with a DatetimeIndex) resampled to buckets of `seconds`, angular columns as circular means."""
+    index, means = bucket_means(data.index, {name: data[name] for name in data.columns}, seconds, angular)
+    return pd.DataFrame(means, index=index)  # columns= would copy datetime columns through objects
+
+
+def moving_average(values, window):
+    """Centred moving average over `window` points from one cumulative sum; NaN values are skipped."""
+    values = np.asarray(values, dtype=float)
+    valid = ~np.isnan(values)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+    positions = np.arange(len(values))
+    low = np.clip(positions - window // 2, 0, len(values))
+    high = np.clip(positions + window // 2 + 1, 0, len(values))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (sums[high] - sums[low]) / (counts[high] - counts[low])
+
+
+def exponential(values, span):
+    """Exponentially weighted moving average with the decay of a `span` point window; NaN values are skipped."""
+    return pd.Series(np.asarray(values, dtype=float)).ewm(span=span, ignore_na=True).mean().to_numpy()
+
+
+def savitzky_golay_coefficients(window, order):
+    """Convolution coefficients of the least-squares polynomial of `order` fitted to `window` points."""
+    half = window // 2
+    vandermonde = np.vander(np.arange(-half, half + 1), order + 1, increasing=True)
+    return np.linalg.pinv(vandermonde)[0]
+
+
+def savitzky_golay(values, window, order=2):
+    """Savitzky-Golay filter: every point is replaced by a local polynomial fit over `window` points.
+
+    Keeps peaks and turns better than a moving average of the same width. The edges are padded with
+    the first and last values and gaps are bridged linearly for the fit; NaN values stay NaN.
+    """
+    values = np.asarray(values, dtype=float)
+    window = window | 1  # the fit is centred, so the window is odd
+    valid = ~np.isnan(values)
+    if valid.sum() <= order or window <= order:
+        return values.copy()
+    positions = np.arange(len(values))
+    filled = np.interp(positions, positions[valid], values[valid]) if not valid.all() else values
+    half = window // 2
+    padded = np.pad(filled, half, mode='edge')
+    smoothed = np.convolve(padded, savitzky_golay_coefficients(window, order)[::-1], mode='valid')
+    smoothed[~valid] = np.nan
+    return smoothed
+
+
+def smooth(values, method, window, angular=False):
+    """Smooth an array with one of SMOOTHING_METHODS; angular values are smoothed as unit vectors.
+
+    NaN values (e.g. empty resampling buckets) stay NaN instead of being filled from their neighbours.
+    """
+    if method not in SMOOTHING_METHODS:
+        raise ValueError(f"Unknown smoothing method '{method}', expected one of {', '.join(SMOOTHING_METHODS)}")
+    kernel = {'moving_average': moving_average, 'exponential': exponential, 'savitzky_golay': savitzky_golay}[method]
+    values = np.asarray(values, dtype=float)
+    if angular:
+        radians = np.radians(values)
+        smoothed = np.degrees(np.arctan2(kernel(np.sin(radians), window), kernel(np.cos(radians), window))) % 360
+    else:
+        smoothed = kernel(values, window)
+    smoothed[np.isnan(values)] = np.nan
+    return smoothed
+
+
+def smooth_frame(data, method, window, angular=ANGULAR_COLUMNS):
+    """Smooth every float column of `data` in place."""
+    for name in data.columns:
+        if pd.api.types.is_float_dtype(data[name].dtype):
+            data[name] = smooth(data[name].to_numpy(), method, window, angular=name in angular)
+    return data
+
+
+def resolutions(data, levels, method=None, window=5, angular=ANGULAR_COLUMNS):
+    """`data` resampled to several resolutions at once, as a dict of frames by label.
+
+    `levels` maps labels to bucket sizes in seconds; a size of None keeps the points as they are.
+    With a `method`, every level is smoothed over `window` of its own points afterwards.
+    """
+    frames = {}
+    for label, seconds in levels.items():
+        frame = data.copy() if seconds is None else resample_frame(data, seconds, angular)
+        if method is not None:
+            smooth_frame(frame, method, window, angular)
+        frames[label] = frame
+    return frames
@@ -0,0 +1,149 @@
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+
+from . import geo, outliers, segments
+from .models import SessionData, SessionSummary
+
+
+# Summaries are computed from the derivables checkpoint: every trackpoint, so that 2 s windows exist.
+SUMMARY_SOURCE = 'derivables'
+# bump whenever summarize changes its output, so stored summaries are recomputed
+SUMMARY_VERSION = 3
+
+HEART_RATE_MAX = 190
+# lower bounds of the five zones as fractions of HEART_RATE_MAX
+HEART_RATE_ZONES = (0.5, 0.6, 0.7, 0.8, 0.9)
+# a point counts for the time to the next one, up to this; longer gaps are pauses in the recording
+HEART_RATE_GAP_SECONDS = 10
+
+
+def summary_fingerprint(source_fingerprint):
+    key = json.dumps([source_fingerprint, 'summary', SUMMARY_VERSION], sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def heart_rate_zones(data):
+    """Seconds spent in each of the HEART_RATE_ZONES, and the average and max of the plausible heart rates."""
+    heart_rate = data['Heart Rate'].to_numpy()
+    keep = outliers.rolling_mad_mask(heart_rate, segments.OUTLIER_WINDOW, segments.OUTLIER_THRESHOLD,
+                                     outliers.OUTLIER_COLUMNS['Heart Rate'])
+    if not keep.any():
+        return [0.0] * len(HEART_RATE_ZONES), None, None
+    nanoseconds = pd.DatetimeIndex(data.index).as_unit('ns').asi8
+    weights = np.minimum(np.diff(nanoseconds, append=nanoseconds[-1]) / 1e9, HEART_RATE_GAP_SECONDS)[keep]
+    heart_rate = heart_rate[keep]
+    zones = np.searchsorted(np.array(HEART_RATE_ZONES) * HEART_RATE_MAX, heart_rate, side='right') - 1
+    in_zone = zones >= 0
+    seconds = np.bincount(zones[in_zone], weights=weights[in_zone], minlength=len(HEART_RATE_ZONES))
+    return [round(float(value), 1) for value in seconds], float(heart_rate.mean()), float(heart_rate.max())
+
+
+def _speed(effort):
+    return effort['speed'] if effort is not None else None
+
+
+def summarize(data):
+    """The SessionSummary fields of a session from its derivables frame.
+
+    best_efforts holds every effort of segments.BEST_EFFORTS by label, its start and end as timestamps.
+    """
+    seconds, distance, latitude, longitude = segments.track_arrays(data)
+    efforts = segments.best_efforts(seconds, distance, latitude, longitude)
+    origin = data.index[0] if len(data) else None
+    for effort in efforts.values():
+        if effort is not None:
+            effort['start'] = (origin + pd.Timedelta(seconds=effort['start'])).isoformat()
+            effort['end'] = (origin + pd.Timedelta(seconds=effort['end'])).isoformat()
+    zones, avg_heart_rate, max_heart_rate = heart_rate_zones(data)
+    duration = float(seconds[-1]) if len(seconds) else 0.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        speeds = np.diff(distance) / np.diff(seconds)
+    speeds = speeds[np.isfinite(speeds)]
+    return {
+        'distance': float(distance[-1]),
+        'duration': duration,
+        'max_speed': float(speeds.max()) if len(speeds) else 0.0,
+        'avg_speed': float(distance[-1]) / duration if duration > 0 else 0.0,
+        'best_2s': _speed(efforts.get('2s')),
+        'best_10s': _speed(efforts.get('10s')),
+        'best_500m': _speed(efforts.get('500m')),
+        'best_efforts': efforts,
+        'max_heart_rate': max_heart_rate,
+        'avg_heart_rate': avg_heart_rate,
+        'heart_rate_zones': zones,
+        'min_latitude': float(latitude.min()) if len(latitude) else None,
+        'max_latitude': float(latitude.max()) if len(latitude) else None,
+        'min_longitude': float(longitude.min()) if len(longitude) else None,
+        'max_longitude': float(longitude.max()) if len(longitude) else None,
+        'centroid_latitude': float(latitude.mean()) if len(latitude) else None,
+        'centroid_longitude': float(longitude.mean()) if len(longitude) else None,
+        'geohash': geo.geohash(latitude.mean(), longitude.mean()) if len(latitude) else '',
+    }
+
+
+def build_summary(session, fields, source_fingerprint):
+    """Unsaved summary of a session from summarize's fields."""
+    return SessionSummary(session=session, user_id=session.user_id, session_start=session.session_start,
+                          fingerprint=summary_fingerprint(source_fingerprint), **fields)
+
+
+def replace_summaries(summaries):
+    """Replace the summaries of the summarized sessions, in two queries."""
+    if not summaries:
+        return
+    with transaction.atomic():
+        SessionSummary.objects.filter(session__in=[summary.session_id for summary in summaries]).delete()
+        SessionSummary.objects.bulk_create(summaries)
+
+
+def store_summary(session, force=False):
+    """Recompute the session's summary unless it is current with its derivables checkpoint.
+
+    Checking costs two queries; returns the summary, or None if the session has no checkpoint.
+    """
+    source = SessionData.objects.filter(session=session, type=SUMMARY_SOURCE).defer('data', 'payload').first()
+    if source is None:
+        return None
+    summary = SessionSummary.objects.filter(session=session).first()
+    if not force and summary is not None and summary.fingerprint == summary_fingerprint(source.fingerprint):
+        return summary
+
+    source.refresh_from_db(fields=['data', 'payload', 'encoding'])
+    summary = build_summary(session, summarize(source.get_frame()), source.fingerprint)
+    replace_summaries([summary])
+    return summary
+
+
+def nearby_candidates(user, latitude, longitude, radius):
+    """The user's summaries in the geohash cells covering a circle (geo.geohash_cover, at most nine).
+
+    A single UNION ALL query with one range scan of the (user, geohash) index per cell.
+    """
+    # ranges instead of LIKE 'prefix%', which only uses the index on some databases; and a union,
+    # since planners answer an OR of ranges by scanning every summary of the user
+    summaries = SessionSummary.objects.filter(user=user).defer('best_efforts', 'heart_rate_zones')
+    cells = []
+    for prefix in geo.geohash_cover(latitude, longitude, radius):
+        cell = summaries.filter(geohash__gte=prefix)
+        successor = geo.geohash_successor(prefix)
+        cells.append(cell.filter(geohash__lt=successor) if successor is not None else cell)
+    return cells[0].union(*cells[1:], all=True)
+
+
+def sessions_near(user, latitude, longitude, radius):
+    """The user's summaries with a centroid within `radius` meters of a point, nearest first.
+
+    The candidates of nearby_candidates have their exact distance checked here; no session data is
+    decoded. Returns (summary, meters) pairs.
+    """
+    candidates = list(nearby_candidates(user, latitude, longitude, radius))
+    if not candidates:
+        return []
+    distances = geo.haversine(latitude, longitude, np.array([summary.centroid_latitude for summary in candidates]),
+                              np.array([summary.centroid_longitude for summary in candidates]))
+    return sorted(((summary, float(meters)) for summary, meters in zip(candidates, distances) if meters <= radius),
+                  key=lambda pair: pair[1])
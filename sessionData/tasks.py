@@ -1,52 +1,134 @@
-from celery import shared_task
-from .models import UserSession, SessionData
+from celery import Task, chain, shared_task
+from celery.exceptions import TimeLimitExceeded, WorkerLostError
+from .models import SessionData, UserSession
 from django.conf import settings
 import logging
 from .data_processor import ProcessSessionData
-
-# wait function
-import time
+from .instrumentation import RecordingCollector
+from .pipeline import STAGES, finish_session, plan_pipeline, process_stage
+from .progress import PARSING_PROGRESS, set_status
+from .weather import Weather
 
 logger = logging.getLogger(__name__)
 
-@shared_task
-def process_session_data(session_id):
-    # wait for 2 seconds for the file to be saved
-    time.sleep(2)
+WEATHER_DATA_TYPE = 'weather'
+WEATHER_INTERVAL = 10  # minutes between weather samples of a session
+INTERRUPTED_MESSAGE = "Processing was interrupted: time limit exceeded or worker process lost."
+
+
+def _get_session(session_id):
     try:
-        session = UserSession.objects.get(id=session_id)
-        # Example of data refurbishing logic (to be expanded based on actual data structure)
-        API_KEY = settings.OPENWEATHERMAP_API_KEY
-        data_processor = ProcessSessionData(openweathermap_api_key=API_KEY)
-        data_processor.read_tcx(session.smartwatch_data_file_path)
-
-        raw_session_data = SessionData.objects.create(
-            session=session,
-            data=data_processor.data.to_json(),
-            type='smartwatch_raw'
-        )
-        raw_session_data.save()
-
-        session.session_start = data_processor.data.index[0]
-        session.session_stop = data_processor.data.index[-1]
-
-        data_processor.calculate_derivables()
-        data_processor.smooth_data()
-        data_processor.filter_outliers()
-        #data_processor.append_weather()
-        #data_processor.calculate_relative_surf_direction()
-
-        processed_session_data = SessionData.objects.create(
-            session=session,
-            data=data_processor.data.to_json(),
-            type='processed'
-        )
-        processed_session_data.save()
-
-
-        session.save()
-        logger.info(f"Session data processed for session {session_id}")
+        return UserSession.objects.get(id=session_id)
     except UserSession.DoesNotExist:
         logger.error(f"UserSession with id {session_id} does not exist.")
+        return None
+
+
+class SessionTask(Task):
+    """Base of the tasks processing a session, which take the session's id as their first argument.
+
+    An exception raised by the task (the soft time limit included) marks the session failed before
+    it stops the rest of the chain. This happens in __call__ rather than on_failure, which Celery
+    skips for eager tasks that propagate their errors. A hard time limit or a killed worker process
+    raises nothing inside the task, so every task is also sent with session_interrupted as an
+    errback, which the worker calls when it gives up on the task. (A task whose worker process was
+    lost is redelivered instead, see CELERY_TASK_REJECT_ON_WORKER_LOST.)
+    """
+    def __call__(self, *args, **kwargs):
+        try:
+            return super().__call__(*args, **kwargs)
+        except Exception as e:
+            session = _get_session(args[0] if args else kwargs['session_id'])
+            # eager chains raise through the task that sent them too; the first failure is kept
+            if session is not None and session.status != UserSession.Status.FAILED:
+                logger.error(f"Error processing session data for session {session.id}: {str(e)}", exc_info=True)
+                set_status(session, UserSession.Status.FAILED, session.progress, str(e))
+            raise
+
+    def apply_async(self, args=None, kwargs=None, link_error=None, **options):
+        session_id = args[0] if args else kwargs['session_id']
+        errbacks = list(link_error) if isinstance(link_error, (list, tuple)) else [link_error] if link_error else []
+        errbacks.append(session_interrupted.s(session_id))
+        return super().apply_async(args, kwargs, link_error=errbacks, **options)
+
+
+@shared_task
+def session_interrupted(request, exc, traceback, session_id):
+    # errback of every SessionTask, called by the worker itself (it takes the failed task's request,
+    # exception and traceback); exceptions raised inside the task are handled by SessionTask.__call__
+    if not isinstance(exc, (TimeLimitExceeded, WorkerLostError)):
+        return
+    session = _get_session(session_id)
+    if session is None or session.status in (UserSession.Status.DONE, UserSession.Status.FAILED):
+        return
+    logger.error(f"Processing of session {session_id} was interrupted: {exc!r}")
+    set_status(session, UserSession.Status.FAILED, session.progress, INTERRUPTED_MESSAGE)
+
+
+@shared_task(base=SessionTask)
+def process_session_data(session_id):
+    # enqueued with transaction.on_commit, so the session and its upload are already durable.
+    # Uploads are parsed while they are received and stored as the read checkpoint; the stages whose
+    # checkpoints are stale run as one task each on the cpu queue, so a stage redelivered after its
+    # worker was lost resumes from the last checkpoint instead of starting over.
+    session = _get_session(session_id)
+    if session is None:
+        return
+    set_status(session, UserSession.Status.PARSING, PARSING_PROGRESS)
+    plan = plan_pipeline(session, STAGES)
+
+    steps = [run_session_stage.si(session_id, STAGES.index(stage)) for stage in plan.stages]
+    steps.append(finish_session_processing.si(session_id, bool(plan.stages)))
+    # weather is looked up once the results are visible, on the io queue
+    steps.append(fetch_session_weather.si(session_id, bool(plan.stages)))
+    chain(*steps).delay()
+
+
+@shared_task(base=SessionTask)
+def run_session_stage(session_id, index):
+    session = _get_session(session_id)
+    if session is None:
+        return
+    processor = ProcessSessionData(collector=RecordingCollector(session_id=session_id))
+    process_stage(session, index, processor)
+
+
+@shared_task(base=SessionTask)
+def finish_session_processing(session_id, changed=True):
+    session = _get_session(session_id)
+    if session is None:
+        return
+    finish_session(session, changed=changed)
+
+    if session.processing_latency is not None:
+        logger.info(f"Session data processed for session {session_id}, {session.processing_latency:.1f}s after upload")
+    else:
+        logger.info(f"Session data processed for session {session_id}")
+
+
+@shared_task(soft_time_limit=120, time_limit=150)
+def fetch_session_weather(session_id, changed=True):
+    # I/O bound: the requests run concurrently inside Weather, and the io workers use a thread pool
+    api_key = settings.OPENWEATHERMAP_API_KEY
+    if not api_key:
+        return
+    if not changed and SessionData.objects.filter(session_id=session_id, type=WEATHER_DATA_TYPE).exists():
+        return
+    try:
+        processed = SessionData.objects.get(session_id=session_id, type=STAGES[-1].artifact)
+        frame = processed.get_frame(['Latitude', 'Longitude'])
+        weather = Weather(api_key)
+        try:
+            weather_data = weather.get_weather_data(frame['Latitude'].mean(), frame['Longitude'].mean(),
+                                                    frame.index.min(), frame.index.max(), WEATHER_INTERVAL)
+        finally:
+            weather.close()
     except Exception as e:
-        logger.error(f"Error processing session data for session {session_id}: {str(e)}", exc_info=True)
\ No newline at end of file
+        # the session's results do not depend on the weather, so it stays done
+        logger.error(f"Error fetching weather for session {session_id}: {str(e)}", exc_info=True)
+        return
+
+    row = SessionData(session_id=session_id, type=WEATHER_DATA_TYPE)
+    row.set_frame(weather_data.set_index('Timestamp'))
+    SessionData.objects.filter(session_id=session_id, type=WEATHER_DATA_TYPE).delete()
+    row.save()
@@ -0,0 +1,187 @@
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+
+TCX_COLUMNS = ['Time', 'Latitude', 'Longitude', 'Altitude', 'Heart Rate']
+
+
+def _to_float(text):
+    return float(text) if text and text.strip() else None
+
+
+def _local_name(tag):
+    # strip the '{namespace}' prefix ElementTree puts in front of every tag
+    return tag.rsplit('}', 1)[-1]
+
+
+class ColumnBuffer:
+    """Preallocated, growable float64 column.
+
+    Missing values are stored as NaN so the buffer never has to fall back to Python objects.
+    """
+    def __init__(self, capacity=4096):
+        self._values = np.full(capacity, np.nan)
+        self._size = 0
+
+    def append(self, value):
+        if self._size == len(self._values):
+            grown = np.full(len(self._values) * 2, np.nan)
+            grown[:self._size] = self._values
+            self._values = grown
+        if value is not None:
+            self._values[self._size] = value
+        self._size += 1
+
+    def to_array(self):
+        return self._values[:self._size]
+
+
+class TcxStreamParser:
+    """Incremental TCX parser: feed it bytes as they arrive, then close() it for the column arrays.
+
+    Trackpoints are cleared as soon as their values have been copied into the column buffers, so
+    memory stays proportional to the number of trackpoints rather than to the size of the XML tree.
+    """
+    def __init__(self, capacity=4096):
+        self._parser = ET.XMLPullParser(events=('end',))
+        self._local_names = {}
+        self.times = []
+        self.latitudes = ColumnBuffer(capacity)
+        self.longitudes = ColumnBuffer(capacity)
+        self.altitudes = ColumnBuffer(capacity)
+        self.heart_rates = ColumnBuffer(capacity)
+
+    @property
+    def trackpoints(self):
+        return len(self.times)
+
+    def feed(self, data):
+        self._parser.feed(data)
+        self._consume_events()
+
+    def close(self):
+        self._parser.close()
+        self._consume_events()
+        return {
+            'Time': np.array(self.times, dtype=object),
+            'Latitude': self.latitudes.to_array(),
+            'Longitude': self.longitudes.to_array(),
+            'Altitude': self.altitudes.to_array(),
+            'Heart Rate': self.heart_rates.to_array(),
+        }
+
+    def _consume_events(self):
+        local_names = self._local_names
+        read_trackpoint = self._read_trackpoint
+        for _, elem in self._parser.read_events():
+            tag = local_names.get(elem.tag)
+            if tag is None:
+                tag = local_names[elem.tag] = _local_name(elem.tag)
+
+            if tag == 'Trackpoint':
+                point = read_trackpoint(elem, local_names)
+                self.times.append(point.get('Time'))
+                self.latitudes.append(point.get('Latitude'))
+                self.longitudes.append(point.get('Longitude'))
+                self.altitudes.append(point.get('Altitude'))
+                self.heart_rates.append(point.get('Heart Rate'))
+                elem.clear()
+            elif tag == 'Track':
+                # drop the (already cleared) trackpoints still referenced by the track
+                elem.clear()
+
+    @staticmethod
+    def _read_trackpoint(trackpoint, local_names):
+        # children end before their trackpoint, so their tags are already in local_names;
+        # keep the first occurrence of every value, like BeautifulSoup's tag lookup does
+        point = {}
+        for child in trackpoint:
+            tag = local_names[child.tag]
+            if tag == 'Time':
+                point.setdefault('Time', child.text)
+            elif tag == 'AltitudeMeters':
+                point.setdefault('Altitude', _to_float(child.text))
+            elif tag == 'Position':
+                for coordinate in child:
+                    tag = local_names[coordinate.tag]
+                    if tag == 'LatitudeDegrees':
+                        point.setdefault('Latitude', _to_float(coordinate.text))
+                    elif tag == 'LongitudeDegrees':
+                        point.setdefault('Longitude', _to_float(coordinate.text))
+            elif tag == 'HeartRateBpm':
+                for value in child:
+                    if local_names[value.tag] == 'Value':
+                        point.setdefault('Heart Rate', _to_float(value.text))
+        return point
+
+
+class IterparseTcxReader:
+    """Streaming TCX reader feeding a file through TcxStreamParser chunk by chunk."""
+    chunk_size = 64 * 2**10
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+
+    def read(self, source):
+        """Parse a TCX file path or binary file object into a dict of column arrays."""
+        parser = TcxStreamParser(self.capacity)
+        if hasattr(source, 'read'):
+            self._feed(parser, source)
+        else:
+            with open(source, 'rb') as file:
+                self._feed(parser, file)
+        return parser.close()
+
+    def _feed(self, parser, file):
+        while chunk := file.read(self.chunk_size):
+            parser.feed(chunk)
+
+
+class Bs4TcxReader:
+    """Reference reader building the full BeautifulSoup tree (requires lxml)."""
+    def read(self, source):
+        from bs4 import BeautifulSoup as bs
+
+        # Read and parse the TCX file
+        if hasattr(source, 'read'):
+            soup = bs(source, 'xml')
+        else:
+            with open(source, 'r') as file:
+                soup = bs(file, 'xml')
+
+        # Create lists to store the data
+        times = []
+        latitudes = []
+        longitudes = []
+        altitudes = []
+        heart_rates = []
+
+        # Extract data from each trackpoint
+        for trackpoint in soup.find_all('Trackpoint'):
+            times.append(trackpoint.Time.text if trackpoint.Time else None)
+            latitudes.append(trackpoint.Position.LatitudeDegrees.text if trackpoint.Position and trackpoint.Position.LatitudeDegrees else None)
+            longitudes.append(trackpoint.Position.LongitudeDegrees.text if trackpoint.Position and trackpoint.Position.LongitudeDegrees else None)
+            altitudes.append(trackpoint.AltitudeMeters.text if trackpoint.AltitudeMeters else None)
+            heart_rates.append(trackpoint.HeartRateBpm.Value.text if trackpoint.HeartRateBpm and trackpoint.HeartRateBpm.Value else None)
+
+        return {
+            'Time': times,
+            'Latitude': latitudes,
+            'Longitude': longitudes,
+            'Altitude': altitudes,
+            'Heart Rate': heart_rates
+        }
+
+
+TCX_ENGINES = {
+    'iterparse': IterparseTcxReader,
+    'bs4': Bs4TcxReader,
+}
+
+
+def get_tcx_reader(engine):
+    try:
+        return TCX_ENGINES[engine]()
+    except KeyError:
+        raise ValueError(f"Unknown TCX engine '{engine}', expected one of {sorted(TCX_ENGINES)}")
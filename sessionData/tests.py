@@ -1,3 +1,1244 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+import tempfile
+import time
+import unittest
+from contextlib import contextmanager
+from dataclasses import replace
+from datetime import date, datetime, timezone as dt_timezone
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+import numpy as np
+
+import pandas as pd
+from asgiref.sync import sync_to_async
+from celery import Task
+from celery.app.task import Context
+from celery.contrib.testing.worker import start_worker
+from celery.exceptions import TimeLimitExceeded
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from azureproject.celery import app as celery_app
+from azureproject.testing import QueryBudgetMixin
+
+from . import (columnar, geo, map_payload, outliers, pipeline, progress, reprocessing, resolutions, segments, smoothing,
+               summaries, tasks)
+from .benchmarks import (benchmark_nearby, legacy_calculate_derivables, legacy_filter_outliers, naive_best_distance,
+                         synthetic_frame, synthetic_processed_frame, two_pointer_best_distance, write_synthetic_tcx)
+from .data_processor import ProcessSessionData
+from .instrumentation import MetricsCollector, RecordingCollector
+from .models import DeduplicationStats, ProcessingMetric, SessionData, SessionSummary, UserSession
+from .tasks import process_session_data
+from .upload_handlers import content_addressed_name
+from .weather import Weather
+
+try:
+    import lxml  # noqa: F401 -- BeautifulSoup's 'xml' parser
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+
+TCX_WITH_GAPS = b"""<?xml version="1.0" encoding="UTF-8"?>
+<TrainingCenterDatabase xmlns="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2">
+  <Activities><Activity Sport="Other"><Lap StartTime="2024-08-01T10:00:00Z">
+    <AverageHeartRateBpm><Value>99</Value></AverageHeartRateBpm>
+    <Track>
+      <Trackpoint>
+        <Time>2024-08-01T10:00:00Z</Time>
+        <Position><LatitudeDegrees>54.5</LatitudeDegrees><LongitudeDegrees>11.1</LongitudeDegrees></Position>
+        <AltitudeMeters>2.0</AltitudeMeters>
+        <HeartRateBpm><Value>120</Value></HeartRateBpm>
+      </Trackpoint>
+      <Trackpoint>
+        <Time>2024-08-01T10:00:01Z</Time>
+        <AltitudeMeters>2.0</AltitudeMeters>
+        <HeartRateBpm><Value>121</Value></HeartRateBpm>
+      </Trackpoint>
+      <Trackpoint>
+        <Time>2024-08-01T10:00:02Z</Time>
+        <Position><LatitudeDegrees>54.6</LatitudeDegrees><LongitudeDegrees>11.2</LongitudeDegrees></Position>
+        <AltitudeMeters>3.0</AltitudeMeters>
+        <HeartRateBpm><Value>122</Value></HeartRateBpm>
+      </Trackpoint>
+    </Track>
+  </Lap></Activity></Activities>
+</TrainingCenterDatabase>
+"""
+
+
+def write_synthetic_tcx_bytes(n_points):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with open(write_synthetic_tcx(os.path.join(tmp_dir, 'session.tcx'), n_points), 'rb') as file:
+            return file.read()
+
+
+class ReadTcxTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def test_iterparse_drops_incomplete_trackpoints(self):
+        data = ProcessSessionData().read_tcx(io.BytesIO(TCX_WITH_GAPS))
+        self.assertEqual(len(data), 2)
+        self.assertEqual(list(data.columns), ['Time', 'Latitude', 'Longitude', 'Altitude', 'Heart Rate'])
+        self.assertEqual(str(data['Time'].dtype), 'datetime64[ns, UTC]')
+        self.assertEqual(list(data['Heart Rate']), [120.0, 122.0])
+        self.assertEqual(data.index.name, 'Time')
+
+    @unittest.skipUnless(HAS_LXML, "the bs4 engine needs lxml")
+    def test_engines_produce_the_same_frame(self):
+        path = write_synthetic_tcx(os.path.join(self.tmp_dir.name, 'session.tcx'), 500)
+        iterparse = ProcessSessionData().read_tcx(path, engine='iterparse')
+        soup = ProcessSessionData().read_tcx(path, engine='bs4')
+        pd.testing.assert_frame_equal(iterparse, soup)
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            ProcessSessionData().read_tcx(io.BytesIO(TCX_WITH_GAPS), engine='sax')
+
+
+# points of the timing comparisons in the suite; benchmark_sessions runs them at full size
+BENCHMARK_POINTS = int(os.environ.get('BENCHMARK_POINTS', 20_000))
+
+
+class CalculateDerivablesTestCase(SimpleTestCase):
+    def assertMatchesLegacy(self, legacy, current):
+        self.assertEqual(list(current.columns), list(legacy.columns))
+        self.assertTrue(current.index.equals(legacy.index))
+        for column in ['Time Delta', 'Distance Delta', 'Speed', 'Acceleration']:
+            np.testing.assert_allclose(current[column], legacy[column], rtol=1e-9, equal_nan=True)
+        # bearings between near-identical points are ill-conditioned, and the kernel takes the
+        # longitude difference before converting to radians, so allow a thousandth of a degree
+        angle = (current['Direction'][:-1] - legacy['Direction'][:-1] + 180) % 360 - 180
+        np.testing.assert_allclose(angle, 0, atol=1e-3)
+        # the legacy code had no successor for the last remaining point and left its bearing NaN
+        self.assertTrue(np.isnan(legacy['Direction'].iloc[-1]))
+        self.assertFalse(np.isnan(current['Direction'].iloc[-1]))
+
+    def test_matches_legacy_implementation(self):
+        data = synthetic_frame(2_000)
+        legacy = legacy_calculate_derivables(data.copy())
+        current = ProcessSessionData(data=data.copy()).calculate_derivables()
+        self.assertMatchesLegacy(legacy, current)
+
+    def test_calculate_bearing_accepts_arrays(self):
+        bearings = ProcessSessionData.calculate_bearing(np.array([0.0, 0.0]), np.array([0.0, 0.0]),
+                                                        np.array([1.0, 0.0]), np.array([0.0, 1.0]))
+        np.testing.assert_allclose(bearings, [0.0, 90.0])
+
+    def test_benchmark_against_np_vectorize(self):
+        data = synthetic_frame(BENCHMARK_POINTS)
+
+        start = time.perf_counter()
+        legacy = legacy_calculate_derivables(data.copy())
+        legacy_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        current = ProcessSessionData(data=data.copy()).calculate_derivables()
+        current_seconds = time.perf_counter() - start
+
+        self.assertMatchesLegacy(legacy, current)
+        self.assertLess(current_seconds * 5, legacy_seconds)
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command('benchmark_sessions', 'derivables', '--points', '1000', stdout=out)
+        self.assertEqual([line.split()[1] for line in out.getvalue().splitlines()[1:]], ['legacy', 'kernel'])
+
+
+class InstrumentationTestCase(SimpleTestCase):
+    def test_stages_report_to_the_collector(self):
+        collector = RecordingCollector()
+        processor = ProcessSessionData(collector=collector)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            processor.read_tcx(write_synthetic_tcx(os.path.join(tmp_dir, 'session.tcx'), 500))
+        processor.calculate_derivables()
+        processor.smooth_data()
+        with self.assertLogs('sessionData.instrumentation', 'INFO') as logs:
+            processor.filter_outliers()
+
+        self.assertEqual([m.stage for m in collector.metrics], ['read_tcx', 'calculate_derivables', 'smooth_data', 'filter_outliers'])
+        read, derivables, smooth, outliers = collector.metrics
+        self.assertEqual((read.rows_in, read.rows_out), (None, 500))
+        self.assertEqual((derivables.rows_in, derivables.rows_out), (500, 499))
+        self.assertEqual(smooth.rows_out, 50)
+        self.assertEqual(outliers.rows_out, len(processor.data))
+        self.assertTrue(all(m.seconds >= 0 and m.peak_memory > 0 for m in collector.metrics))
+        self.assertEqual(logs.records[0].stage_metrics['stage'], 'filter_outliers')
+
+    def test_outlier_counts_are_logged(self):
+        data = synthetic_processed_frame(100)
+        data.iloc[:3, data.columns.get_loc('Heart Rate')] = 500
+        processor = ProcessSessionData(data, collector=MetricsCollector())
+        with self.assertLogs('sessionData.data_processor', 'INFO') as logs:
+            processor.filter_outliers()
+        self.assertIn('Filtered out 3 outliers for heart rate', logs.output[0])
+
+
+class FilterOutliersTestCase(SimpleTestCase):
+    def regime_change_frame(self):
+        # slogging at ~2 m/s, then planing at ~11 m/s, with GPS spikes in both
+        rng = np.random.default_rng(0)
+        speed = np.concatenate([rng.normal(2, 0.3, 700), rng.normal(11, 0.6, 120)])
+        speed[[100, 300, 760]] = 45.0
+        heart_rate = 120.0 + rng.integers(-3, 4, len(speed))
+        index = pd.date_range('2024-08-01 10:00', periods=len(speed), freq='10s', tz='UTC')
+        return pd.DataFrame({'Speed': speed, 'Heart Rate': heart_rate}, index=index)
+
+    def test_iqr_matches_legacy_implementation(self):
+        data = synthetic_processed_frame(5_000)
+        data.iloc[::97, data.columns.get_loc('Speed')] = 60.0
+        data.iloc[::89, data.columns.get_loc('Heart Rate')] = 250.0
+        filtered = ProcessSessionData(data.copy(), collector=MetricsCollector()).filter_outliers()
+        pd.testing.assert_frame_equal(filtered, legacy_filter_outliers(data))
+
+    def test_rolling_follows_speed_regimes(self):
+        data = self.regime_change_frame()
+        iqr = ProcessSessionData(data.copy(), collector=MetricsCollector()).filter_outliers('iqr')
+        self.assertLess(len(iqr), 700)  # the whole planing stretch is dropped as outliers
+
+        rolling = ProcessSessionData(data.copy(), collector=MetricsCollector()).filter_outliers('rolling', window=31)
+        self.assertFalse(rolling['Speed'].eq(45.0).any())
+        self.assertGreaterEqual(len(rolling), len(data) - 5)  # the spikes and at most the switch between regimes
+        self.assertGreaterEqual(rolling['Speed'].gt(8).sum(), 115)
+
+    def test_rolling_mask_does_not_depend_on_the_chunk_size(self):
+        values = synthetic_processed_frame(5_000)['Speed'].to_numpy().copy()
+        values[::50] = 60.0
+        values[7] = np.nan
+        whole = outliers.rolling_mad_mask(values, window=21, chunk_size=len(values))
+        self.assertFalse(whole[7])
+        self.assertFalse(whole[::50].any())
+        for chunk_size in (100, 997, 4_999):
+            np.testing.assert_array_equal(outliers.rolling_mad_mask(values, window=21, chunk_size=chunk_size), whole)
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            ProcessSessionData(synthetic_processed_frame(100), collector=MetricsCollector()).filter_outliers('zscore')
+
+
+class SmoothingTestCase(SimpleTestCase):
+    def test_resample_matches_pandas_except_bearings(self):
+        data = synthetic_processed_frame(2_000)
+        data.iloc[50:80] = np.nan
+        data = data.drop(data.index[300:400])
+        resampled = smoothing.resample_frame(data, 10)
+        expected = data.resample('10s').mean()
+        pd.testing.assert_frame_equal(resampled.drop(columns='Direction'), expected.drop(columns='Direction'), check_freq=False)
+        self.assertEqual(resampled['Direction'].isna().sum(), expected['Direction'].isna().sum())
+
+    def test_bearings_average_across_north(self):
+        index = pd.date_range('2024-08-01 10:00', periods=4, freq='5s', tz='UTC')
+        data = pd.DataFrame({'Direction': [350.0, 20.0, 170.0, 190.0], 'Speed': [1.0, 2.0, 3.0, 4.0]}, index=index)
+        resampled = smoothing.resample_frame(data, 10)
+        np.testing.assert_allclose(resampled['Direction'], [5.0, 180.0])
+        np.testing.assert_allclose(resampled['Speed'], [1.5, 3.5])
+
+        smoothed = smoothing.smooth(np.array([355.0, 5.0, 355.0, 5.0]), 'moving_average', 3, angular=True)
+        np.testing.assert_allclose((smoothed + 180) % 360 - 180, [0.0, -1.67, 1.67, 0.0], atol=0.01)
+
+    def test_methods(self):
+        x = np.arange(50, dtype=float)
+        quadratic = 0.1 * x ** 2 - x
+        # Savitzky-Golay fits quadratics exactly away from the padded edges; a moving average does not
+        np.testing.assert_allclose(smoothing.savitzky_golay(quadratic, 7)[3:-3], quadratic[3:-3], atol=1e-9)
+        self.assertGreater(np.abs(smoothing.moving_average(quadratic, 7) - quadratic)[3:-3].min(), 0.3)
+
+        for method in smoothing.SMOOTHING_METHODS:
+            values = np.full(20, 4.0)
+            values[5] = np.nan
+            smoothed = smoothing.smooth(values, method, 5)
+            self.assertTrue(np.isnan(smoothed[5]), method)
+            np.testing.assert_allclose(np.delete(smoothed, 5), 4.0, err_msg=method)
+
+        step = smoothing.exponential(np.r_[np.zeros(10), np.ones(10)], 5)
+        self.assertTrue(np.all(np.diff(step[10:]) > 0))
+        with self.assertRaises(ValueError):
+            smoothing.smooth(x, 'median', 5)
+
+    def test_smooth_data(self):
+        data = synthetic_processed_frame(600)
+        plain = ProcessSessionData(data.copy(), collector=MetricsCollector()).smooth_data(10)
+        smoothed = ProcessSessionData(data.copy(), collector=MetricsCollector()).smooth_data(10, 'savitzky_golay', 5)
+        self.assertEqual(len(plain), 60)
+        pd.testing.assert_index_equal(smoothed.index, plain.index)
+        self.assertLess(smoothed['Speed'].diff().abs().sum(), plain['Speed'].diff().abs().sum())
+        self.assertTrue(smoothed['Direction'].between(0, 360).all())
+
+    def test_resolutions(self):
+        data = synthetic_processed_frame(600)
+        levels = smoothing.resolutions(data, {'raw': None, '1s': 1, '60s': 60})
+        self.assertEqual({label: len(frame) for label, frame in levels.items()}, {'raw': len(data), '1s': len(data), '60s': 10})
+        pd.testing.assert_frame_equal(levels['raw'], data)
+
+
+class SegmentsTestCase(SimpleTestCase):
+    def test_duration_and_distance_efforts(self):
+        seconds = np.arange(0.0, 100.0)
+        speed = np.full(100, 4.0)
+        speed[40:45] = 10.0
+        distance = np.concatenate(([0.0], np.cumsum(speed[:-1])))
+        efforts = segments.best_efforts(seconds, distance, efforts=[
+            segments.Effort('2s', 'duration', 2), segments.Effort('10s', 'duration', 10),
+            segments.Effort('50m', 'distance', 50), segments.Effort('1km', 'distance', 1000),
+        ])
+        self.assertEqual(efforts['2s'], {'speed': 10.0, 'distance': 20.0, 'seconds': 2.0, 'start': 40.0, 'end': 42.0})
+        self.assertEqual(efforts['10s']['speed'], 7.0)
+        self.assertEqual((efforts['50m']['speed'], efforts['50m']['start']), (10.0, 40.0))
+        self.assertIsNone(efforts['1km'])
+        with self.assertRaises(ValueError):
+            segments.best_efforts(seconds, distance, efforts=[segments.Effort('lap', 'laps', 1)])
+
+    def test_alpha_needs_to_come_back(self):
+        # 300 m out at 5 m/s, a jibe, and back at 8 m/s along the same line
+        out = 52.0 + np.arange(61) * 5.0 / 111_195.0
+        back = out[-1] - np.arange(1, 39) * 8.0 / 111_195.0
+        latitude = np.concatenate([out, back])
+        longitude = np.full(len(latitude), 4.0)
+        seconds = np.arange(len(latitude), dtype=float)
+        distance = np.concatenate(([0.0], np.cumsum(geo.haversine(latitude[:-1], longitude[:-1], latitude[1:], longitude[1:]))))
+        efforts = segments.best_efforts(seconds, distance, latitude, longitude, efforts=[
+            segments.Effort('500m', 'distance', 500), segments.Effort('alpha', 'alpha', 500, gate=50),
+        ])
+        self.assertGreater(efforts['500m']['speed'], efforts['alpha']['speed'])
+        self.assertLessEqual(abs(efforts['alpha']['start'] + efforts['alpha']['end'] - 2 * 60), 14)  # around the jibe
+
+    def test_matches_reference_searches(self):
+        seconds, distance, latitude, longitude = segments.track_arrays(synthetic_processed_frame(3_000))
+        best = segments.best_efforts(seconds, distance, latitude, longitude)['500m']['speed']
+        self.assertAlmostEqual(best, two_pointer_best_distance(seconds, distance, 500))
+        self.assertAlmostEqual(best, naive_best_distance(seconds, distance, 500))
+
+    def test_trackpoints_without_position(self):
+        data = synthetic_processed_frame(2_000)
+        data.iloc[1_000, data.columns.get_loc('Latitude')] = np.nan
+        seconds, distance, latitude, longitude = segments.track_arrays(data)
+        self.assertTrue(np.isfinite(latitude).all() and np.isfinite(distance).all())
+        self.assertEqual(latitude[0], data['Latitude'].iloc[0])  # the first point is kept without a speed
+        # the efforts are stored in a JSONField, which writes NaN as a bare token Postgres rejects
+        efforts = segments.best_efforts(seconds, distance, latitude, longitude)
+        json.dumps(efforts, allow_nan=False)
+        self.assertGreater(efforts['500m']['speed'], 0)
+
+    def test_processor_method(self):
+        collector = RecordingCollector()
+        data = synthetic_processed_frame(2_000)
+        efforts = ProcessSessionData(data, collector=collector).calc_best_efforts()
+        self.assertEqual(set(efforts), {effort.label for effort in segments.BEST_EFFORTS})
+        self.assertGreater(efforts['2s']['speed'], efforts['nautical_mile']['speed'])
+        self.assertEqual([metric.stage for metric in collector.metrics], ['calc_best_efforts'])
+
+
+def create_user_session(username="rider"):
+    user = User.objects.create_user(username=username, password="secret-password")
+    now = timezone.now()
+    return UserSession.objects.create(
+        user=user, session_start=now, session_stop=now, smartwatch_data_file_path="session.tcx"
+    )
+
+
+@contextmanager
+def eager_tasks():
+    # task chains run in place instead of being sent to the broker; errors stop them and propagate
+    celery_app.conf.update(task_always_eager=True, task_eager_propagates=True)
+    try:
+        yield
+    finally:
+        celery_app.conf.update(task_always_eager=False, task_eager_propagates=False)
+
+
+class ColumnarStorageTestCase(SimpleTestCase):
+    def test_round_trip(self):
+        data = synthetic_processed_frame(200)
+        for compress in (False, True):
+            decoded = columnar.decode_frame(columnar.encode_frame(data, compress=compress))
+            pd.testing.assert_frame_equal(decoded, data, check_exact=False, rtol=1e-6, check_freq=False)
+            # coordinates are kept at full precision
+            pd.testing.assert_series_equal(decoded['Latitude'], data['Latitude'], check_freq=False)
+
+    def test_decode_selected_columns(self):
+        data = synthetic_processed_frame(50)
+        decoded = columnar.decode_frame(columnar.encode_frame(data), ['Speed', 'Latitude'])
+        self.assertEqual(list(decoded.columns), ['Speed', 'Latitude'])
+        self.assertTrue(decoded.index.equals(data.index))
+        with self.assertRaises(KeyError):
+            columnar.decode_frame(columnar.encode_frame(data), ['Wind Speed'])
+
+
+class SessionDataStorageTestCase(TestCase):
+    def test_columnar_and_legacy_json_rows(self):
+        session = create_user_session()
+        data = synthetic_processed_frame(100)
+
+        stored = SessionData(session=session, type='processed')
+        stored.set_frame(data)
+        stored.save()
+        legacy = SessionData.objects.create(session=session, type='smartwatch_raw', data=data.to_json())
+
+        stored.refresh_from_db()
+        self.assertEqual(stored.encoding, SessionData.ENCODING_COLUMNAR)
+        self.assertIsNone(stored.data)
+        for row in (stored, legacy):
+            frame = row.get_frame(['Latitude', 'Speed'])
+            self.assertEqual(list(frame.columns), ['Latitude', 'Speed'])
+            self.assertAlmostEqual(frame['Speed'].sum(), data['Speed'].sum(), places=2)
+
+
+class TimemachineStub(BaseHTTPRequestHandler):
+    """Stands in for the OpenWeather timemachine endpoint; fails the first `failures` requests with 429."""
+    requests = []
+    failures = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        with self.lock:
+            type(self).requests.append(query)
+            fail = len(type(self).requests) <= type(self).failures
+        if fail:
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            self.end_headers()
+            return
+        dt = int(query['dt'][0])
+        body = json.dumps({'data': [{'dt': dt, 'wind_speed': 5 + (dt // 600) % 3, 'wind_deg': 270}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WeatherTestCase(SimpleTestCase):
+    def setUp(self):
+        TimemachineStub.requests = []
+        TimemachineStub.failures = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), TimemachineStub)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.cache = LocMemCache('weather-tests', {})
+        self.cache.clear()
+        self.start = datetime(2024, 8, 1, 10, 0, tzinfo=dt_timezone.utc)
+        self.end = datetime(2024, 8, 1, 11, 0, tzinfo=dt_timezone.utc)
+
+    def weather(self, **kwargs):
+        weather = Weather('test-key', base_url=f'http://127.0.0.1:{self.server.server_port}/timemachine',
+                          cache=self.cache, backoff_factor=0, **kwargs)
+        self.addCleanup(weather.close)
+        return weather
+
+    def test_concurrent_matches_sequential(self):
+        sequential = self.weather().get_weather_data(54.5, 11.1, self.start, self.end, 10, concurrent=False)
+        concurrent = self.weather().get_weather_data(54.5, 11.1, self.start, self.end, 10)
+        self.assertEqual(len(concurrent), 8)
+        pd.testing.assert_frame_equal(concurrent, sequential)
+
+    def test_overlapping_sessions_hit_the_cache(self):
+        self.weather().get_weather_data(54.5012, 11.1034, self.start, self.end, 10)
+        self.assertEqual(len(TimemachineStub.requests), 8)
+        self.assertEqual(TimemachineStub.requests[0]['lat'], ['54.5'])
+
+        # same spot, a few seconds and meters apart, half an hour later
+        later = datetime(2024, 8, 1, 10, 30, 7, tzinfo=dt_timezone.utc)
+        self.weather().get_weather_data(54.4988, 11.1019, later, later.replace(hour=11, minute=30), 10)
+        self.assertEqual(len(TimemachineStub.requests), 8 + 3)
+
+    def test_retries_rate_limited_requests(self):
+        TimemachineStub.failures = 2
+        weather_data = self.weather(max_workers=1).get_weather_data(54.5, 11.1, self.start, self.start, 10)
+        self.assertEqual(len(weather_data), 2)
+        self.assertEqual(len(TimemachineStub.requests), 4)
+
+    def test_gives_up_after_retries(self):
+        TimemachineStub.failures = 100
+        with self.assertRaises(Exception):
+            self.weather(retries=1).fetch_weather(54.5, 11.1, 1722506400)
+        self.assertEqual(len(TimemachineStub.requests), 2)
+
+
+class MapPayloadTestCase(SimpleTestCase):
+    def test_douglas_peucker_keeps_corners_only(self):
+        x = np.array([0.0, 1.0, 2.0, 3.0, 3.0, 3.0])
+        y = np.array([0.0, 0.0, 0.0, 0.0, 1.0, 2.0])
+        np.testing.assert_array_equal(map_payload.douglas_peucker(x, y, 0.1), [0, 3, 5])
+
+    def test_levels_respect_their_budgets(self):
+        data = synthetic_processed_frame(20_000)
+        payload = map_payload.build_map_payload(data)
+        self.assertEqual(payload['points'], len(data.dropna(subset=['Speed'])))
+        for level, (zoom, _, budget) in zip(payload['levels'], map_payload.MAP_LEVELS):
+            self.assertEqual(level['zoom'], zoom)
+            self.assertLessEqual(len(level['lat']), budget)
+            self.assertEqual(len(level['lat']), len(level['lng']))
+            self.assertLessEqual(max(level['intensity']), 50)
+        self.assertLess(len(payload['levels'][0]['lat']), len(payload['levels'][-1]['lat']))
+
+
+class SessionMapDataViewTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.session = create_user_session()
+        processed = SessionData(session=self.session, type='processed')
+        processed.set_frame(synthetic_processed_frame(2_000))
+        processed.save()
+        self.client.login(username='rider', password='secret-password')
+
+    def test_results_page_does_not_inline_points(self):
+        response = self.client.get(reverse('session_results', args=(self.session.id,)))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, reverse('session_map_data', args=(self.session.id,)))
+        self.assertNotContains(response, '"intensity":')
+
+    def test_payload_is_built_once_and_revalidated(self):
+        url = reverse('session_map_data', args=(self.session.id,))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['levels']), len(map_payload.MAP_LEVELS))
+        self.assertTrue(SessionData.objects.filter(session=self.session, type='map').exists())
+
+        with self.assertNumQueries(1):  # the user lookup of login_required only
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_other_users_cannot_read_the_payload(self):
+        url = reverse('session_map_data', args=(self.session.id,))
+        etag = self.client.get(url)['ETag']
+        User.objects.create_user(username='other', password='secret-password')
+        self.client.login(username='other', password='secret-password')
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+    def test_storing_a_payload_refreshes_reusing_sessions(self):
+        reuse = UserSession.objects.create(
+            user=self.session.user, session_start=self.session.session_start, session_stop=self.session.session_stop,
+            smartwatch_data_file_path="copy.tcx", reused_from=self.session,
+        )
+        url = reverse('session_map_data', args=(reuse.id,))
+        etag = self.client.get(url)['ETag']
+
+        map_payload.store_map_payload(self.session, synthetic_processed_frame(500))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], self.client.get(reverse('session_map_data', args=(self.session.id,)))['ETag'])
+
+
+class AsyncSessionViewsTestCase(TestCase):
+    def setUp(self):
+        self.session = create_user_session()
+
+    async def test_results_require_login(self):
+        url = reverse('session_results', args=(self.session.id,))
+        response = await self.async_client.get(url)
+        self.assertRedirects(response, f"{reverse('login')}?next={url}", fetch_redirect_response=False)
+
+        await self.async_client.aforce_login(await User.objects.aget(username='rider'))
+        self.assertEqual((await self.async_client.get(url)).status_code, 404)
+
+        processed = SessionData(session=self.session, type='processed')
+        processed.set_frame(synthetic_processed_frame(100))
+        await processed.asave()
+        response = await self.async_client.get(url)
+        self.assertContains(response, reverse('session_map_data', args=(self.session.id,)))
+
+    async def test_status(self):
+        url = reverse('session_status', args=(self.session.id,))
+        await self.async_client.aforce_login(await User.objects.aget(username='rider'))
+        status = (await self.async_client.get(url)).json()
+        self.assertEqual((status['processed'], status['processed_at'], status['results_url']), (False, None, None))
+        self.assertEqual((status['status'], status['progress']), ('queued', 0))
+
+        self.session.processed_at = timezone.now()
+        await self.session.asave()
+        reuse = await UserSession.objects.acreate(
+            user=self.session.user, session_start=self.session.session_start, session_stop=self.session.session_stop,
+            smartwatch_data_file_path="copy.tcx", reused_from=self.session, status=UserSession.Status.DONE, progress=100,
+        )
+        status = (await self.async_client.get(reverse('session_status', args=(reuse.id,)))).json()
+        self.assertTrue(status['processed'])
+        self.assertEqual(status['results_url'], reverse('session_results', args=(reuse.id,)))
+
+        other = await sync_to_async(create_user_session)('other')
+        self.assertEqual((await self.async_client.get(reverse('session_status', args=(other.id,)))).status_code, 404)
+
+
+class ProcessingStatusTestCase(TestCase):
+    def setUp(self):
+        self.session = create_user_session()
+        cache.delete(progress.status_cache_key(self.session.id))
+
+    async def status_events(self, response, steps=()):
+        # statuses pushed by the stream; every received event advances the session to the next step
+        steps, events = list(steps), []
+        async for chunk in response.streaming_content:
+            chunk = chunk.decode()
+            if chunk.startswith('event: status'):
+                events.append(json.loads(chunk.split('data: ', 1)[1]))
+                if steps:
+                    await sync_to_async(progress.set_status)(self.session, *steps.pop(0))
+        return events
+
+    @mock.patch.object(progress, 'STATUS_POLL_INTERVAL', 0.01)
+    async def test_events_push_every_change_until_done(self):
+        await self.async_client.aforce_login(await User.objects.aget(username='rider'))
+        response = await self.async_client.get(reverse('session_events', args=(self.session.id,)))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        Status = UserSession.Status
+        events = await self.status_events(response, [(Status.PARSING, 5), (Status.PROCESSING, 50), (Status.DONE, 100)])
+        self.assertEqual([(event['status'], event['progress']) for event in events],
+                         [('queued', 0), ('parsing', 5), ('processing', 50), ('done', 100)])
+        self.assertEqual(events[-1]['results_url'], reverse('session_results', args=(self.session.id,)))
+
+        # a finished session sends its final status and ends the stream at once
+        events = await self.status_events(await self.async_client.get(reverse('session_events', args=(self.session.id,))))
+        self.assertEqual([event['status'] for event in events], ['done'])
+
+    def test_events_are_polled_under_wsgi(self):
+        self.client.login(username='rider', password='secret-password')
+        response = self.client.get(reverse('session_events', args=(self.session.id,)))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertFalse(response.streaming)
+        body = response.content.decode()
+        self.assertTrue(body.startswith(f'retry: {progress.STATUS_RETRY_MILLISECONDS}'))
+        self.assertEqual(json.loads(body.split('data: ', 1)[1])['status'], 'queued')
+
+    async def test_events_of_other_users_sessions_are_not_found(self):
+        other = await sync_to_async(create_user_session)('other')
+        await self.async_client.aforce_login(await User.objects.aget(username='rider'))
+        self.assertEqual((await self.async_client.get(reverse('session_events', args=(other.id,)))).status_code, 404)
+
+    def test_task_reports_progress_and_failures(self):
+        SessionData.objects.create(session=self.session, type='smartwatch_raw')  # a stale read checkpoint
+        with mock.patch('sessionData.tasks.process_stage', side_effect=ValueError("Corrupt upload")), eager_tasks():
+            with self.assertLogs('sessionData.tasks', 'ERROR'), self.assertRaises(ValueError):
+                process_session_data(self.session.id)
+        self.session.refresh_from_db()
+        self.assertEqual((self.session.status, self.session.status_message), (UserSession.Status.FAILED, "Corrupt upload"))
+        self.assertEqual(cache.get(progress.status_cache_key(self.session.id))['message'], "Corrupt upload")
+
+        on_stage = progress.stage_progress(self.session)
+        on_stage(1, 3)
+        self.assertEqual((self.session.status, self.session.progress), (UserSession.Status.PROCESSING, 38))
+        self.assertEqual(cache.get(progress.status_cache_key(self.session.id))['progress'], 38)
+
+    def test_upload_success_page_follows_the_session(self):
+        url = reverse('session_upload_success', args=(self.session.id,))
+        self.client.login(username='rider', password='secret-password')
+        self.assertContains(self.client.get(url), reverse('session_events', args=(self.session.id,)))
+
+        other = create_user_session('other')
+        self.assertEqual(self.client.get(reverse('session_upload_success', args=(other.id,))).status_code, 404)
+
+
+class UploadSessionDataTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user(username='rider', password='secret-password')
+        self.client.login(username='rider', password='secret-password')
+
+    def upload(self, name, content):
+        with mock.patch('sessionData.views.process_session_data') as task:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('session_upload'), {'file': SimpleUploadedFile(name, content)})
+        return response, task
+
+    def test_upload_is_parsed_while_streaming(self):
+        response, task = self.upload('session.tcx', TCX_WITH_GAPS)
+        session = UserSession.objects.get()
+        self.assertRedirects(response, reverse('session_upload_success', args=(session.id,)))
+        self.assertEqual((session.status, session.progress), (UserSession.Status.QUEUED, 0))
+        task.delay.assert_called_once_with(session.id)
+        self.assertEqual(session.content_hash, hashlib.sha256(TCX_WITH_GAPS).hexdigest())
+        self.assertEqual(session.session_start.isoformat(), '2024-08-01T10:00:00+00:00')
+        self.assertEqual(session.session_stop.isoformat(), '2024-08-01T10:00:02+00:00')
+        with open(session.smartwatch_data_file_path, 'rb') as file:
+            self.assertEqual(file.read(), TCX_WITH_GAPS)
+        self.assertTrue(session.smartwatch_data_file_path.endswith(f'{session.content_hash}.tcx'))
+        raw = SessionData.objects.get(session=session, type='smartwatch_raw')
+        self.assertEqual(len(raw.get_frame()), 2)
+
+    def test_gzip_upload_is_stored_decompressed(self):
+        self.upload('session.tcx.gz', gzip.compress(TCX_WITH_GAPS))
+        session = UserSession.objects.get()
+        with open(session.smartwatch_data_file_path, 'rb') as file:
+            self.assertEqual(file.read(), TCX_WITH_GAPS)
+        self.assertEqual(session.content_hash, hashlib.sha256(TCX_WITH_GAPS).hexdigest())
+
+    def test_oversized_upload_is_rejected(self):
+        bomb = gzip.compress(TCX_WITH_GAPS[:-100] + b' ' * 10 * 2**20 + TCX_WITH_GAPS[-100:])  # ~10 kB
+        with override_settings(TCX_MAX_DECOMPRESSED_SIZE=2**20):
+            response, task = self.upload('session.tcx.gz', bomb)
+        self.assertContains(response, 'larger than 1.0\xa0MB')
+        task.delay.assert_not_called()
+        self.assertFalse(UserSession.objects.exists())
+        self.assertEqual(os.listdir(self.media_root.name), [])
+
+        with override_settings(TCX_MAX_DECOMPRESSED_SIZE=len(TCX_WITH_GAPS) - 1):
+            self.assertContains(self.upload('session.tcx', TCX_WITH_GAPS)[0], 'larger than')
+
+    def test_invalid_upload_is_rejected_and_removed(self):
+        response, task = self.upload('session.tcx', b'<TrainingCenterDatabase><Trackpoint>')
+        self.assertContains(response, 'Invalid TCX file')
+        task.delay.assert_not_called()
+        self.assertFalse(UserSession.objects.exists())
+        self.assertEqual(os.listdir(self.media_root.name), [])
+
+    def test_failed_upload_keeps_a_copy_stored_concurrently(self):
+        stored_path = os.path.join(self.media_root.name, content_addressed_name(hashlib.sha256(TCX_WITH_GAPS).hexdigest()))
+        makedirs = os.makedirs
+
+        def store_concurrently(name, **kwargs):
+            makedirs(name, **kwargs)
+            if name == os.path.dirname(stored_path):
+                # another upload of the same document stores it first
+                with open(stored_path, 'wb') as file:
+                    file.write(TCX_WITH_GAPS)
+
+        with mock.patch('sessionData.upload_handlers.os.makedirs', side_effect=store_concurrently), \
+                mock.patch('sessionData.views.find_reusable_session', side_effect=DatabaseError("connection lost")):
+            response, task = self.upload('session.tcx', TCX_WITH_GAPS)
+        self.assertContains(response, 'connection lost')
+        self.assertFalse(UserSession.objects.exists())
+        self.assertEqual(os.listdir(self.media_root.name), ['tcx'])
+        with open(stored_path, 'rb') as file:
+            self.assertEqual(file.read(), TCX_WITH_GAPS)
+
+    def test_task_processes_the_parsed_upload(self):
+        self.upload('session.tcx', write_synthetic_tcx_bytes(300))
+        session = UserSession.objects.get()
+        os.remove(session.smartwatch_data_file_path)  # the task starts from the stored raw frame
+
+        with eager_tasks():
+            process_session_data(session.id)
+
+        session.refresh_from_db()
+        self.assertIsNotNone(session.processing_latency)
+        self.assertEqual((session.status, session.progress), (UserSession.Status.DONE, 100))
+        self.assertTrue(SessionData.objects.filter(session=session, type='processed').exists())
+        self.assertEqual(SessionData.objects.filter(session=session, type='smartwatch_raw').count(), 1)
+        self.assertEqual(
+            list(session.processing_metrics.values_list('stage', flat=True)),
+            ['calculate_derivables', 'smooth_data', 'filter_outliers'],
+        )
+
+    def test_duplicate_upload_reuses_results(self):
+        content = write_synthetic_tcx_bytes(300)
+        self.upload('session.tcx', content)
+        original = UserSession.objects.get()
+        with eager_tasks():
+            process_session_data(original.id)
+
+        response, task = self.upload('same-session.tcx.gz', gzip.compress(content))
+        task.delay.assert_not_called()
+
+        duplicate = UserSession.objects.exclude(id=original.id).get()
+        self.assertRedirects(response, reverse('session_upload_success', args=(duplicate.id,)))
+        self.assertEqual(duplicate.reused_from, original)
+        self.assertEqual(duplicate.status, UserSession.Status.DONE)
+        self.assertEqual(duplicate.smartwatch_data_file_path, original.smartwatch_data_file_path)
+        self.assertFalse(SessionData.objects.filter(session=duplicate).exists())
+        self.assertEqual(len(os.listdir(os.path.dirname(original.smartwatch_data_file_path))), 1)
+
+        stats = DeduplicationStats.objects.get(user=self.user)
+        self.assertEqual(stats.hits, 1)
+        self.assertGreater(stats.bytes_saved, len(content))
+
+        self.assertEqual(self.client.get(reverse('session_results', args=(duplicate.id,))).status_code, 200)
+        response = self.client.get(reverse('session_map_data', args=(duplicate.id,)))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['levels']), len(map_payload.MAP_LEVELS))
+
+    def test_deleting_the_original_promotes_a_duplicate(self):
+        content = write_synthetic_tcx_bytes(300)
+        self.upload('session.tcx', content)
+        original = UserSession.objects.get()
+        with eager_tasks():
+            process_session_data(original.id)
+        self.upload('copy.tcx', content)
+        self.upload('another-copy.tcx', content)
+        first, second = UserSession.objects.exclude(id=original.id).order_by('id')
+        results = set(SessionData.objects.filter(session=original).values_list('id', flat=True))
+
+        original.delete()
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertIsNone(first.reused_from)
+        self.assertEqual(second.reused_from, first)
+        self.assertEqual(set(SessionData.objects.filter(session=first).values_list('id', flat=True)), results)
+        self.assertTrue(SessionSummary.objects.filter(session=first).exists())
+        self.assertEqual(self.client.get(reverse('session_results', args=(second.id,))).status_code, 200)
+
+        self.user.delete()
+        self.assertFalse(UserSession.objects.exists())
+        self.assertFalse(SessionData.objects.exists())
+
+    def test_identical_file_of_another_user_is_processed(self):
+        content = write_synthetic_tcx_bytes(100)
+        self.upload('session.tcx', content)
+        with eager_tasks():
+            process_session_data(UserSession.objects.get().id)
+
+        User.objects.create_user(username='other', password='secret-password')
+        self.client.login(username='other', password='secret-password')
+        response, task = self.upload('session.tcx', content)
+        task.delay.assert_called_once()
+        self.assertIsNone(UserSession.objects.get(user__username='other').reused_from)
+
+
+class CeleryTasksTestCase(TransactionTestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.session = create_user_session()
+        self.session.smartwatch_data_file_path = write_synthetic_tcx(os.path.join(tmp_dir.name, 'session.tcx'), 300)
+        self.session.save()
+
+    def test_tasks_are_routed_by_workload(self):
+        router = celery_app.amqp.router
+        queues = {task.name: router.route({}, task.name)['queue'].name
+                  for task in (process_session_data, tasks.run_session_stage, tasks.finish_session_processing,
+                               tasks.fetch_session_weather)}
+        self.assertEqual(list(queues.values()), ['default', 'cpu', 'cpu', 'io'])
+        self.assertEqual(celery_app.conf.worker_prefetch_multiplier, 1)
+        self.assertTrue(celery_app.conf.task_acks_late)
+        self.assertTrue(celery_app.conf.task_reject_on_worker_lost)
+
+    def test_hard_time_limit_marks_the_session_failed(self):
+        with mock.patch.object(Task, 'apply_async') as apply_async:
+            tasks.run_session_stage.apply_async((self.session.id, 1))
+        errbacks = apply_async.call_args.kwargs['link_error']
+
+        def give_up(exc):
+            # what the worker does when it gives up on a task that raised nothing (Request.on_timeout)
+            celery_app.backend.mark_as_failure('task-id', exc, request=Context(id='task-id', errbacks=errbacks))
+
+        give_up(ValueError("Raised in the task"))  # left to the task itself
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, UserSession.Status.QUEUED)
+
+        with self.assertLogs('sessionData.tasks', 'ERROR'):
+            give_up(TimeLimitExceeded(360))
+        self.session.refresh_from_db()
+        self.assertEqual((self.session.status, self.session.status_message),
+                         (UserSession.Status.FAILED, tasks.INTERRUPTED_MESSAGE))
+        self.assertEqual(cache.get(progress.status_cache_key(self.session.id))['status'], UserSession.Status.FAILED)
+
+    def test_worker_runs_one_task_per_stage(self):
+        with start_worker(celery_app, perform_ping_check=False, queues=['default', 'cpu', 'io']):
+            process_session_data.delay(self.session.id)
+            deadline = time.monotonic() + 30
+            while time.monotonic() < deadline:
+                self.session.refresh_from_db()
+                if self.session.status in (UserSession.Status.DONE, UserSession.Status.FAILED):
+                    break
+                time.sleep(0.05)
+
+        self.assertEqual((self.session.status, self.session.progress), (UserSession.Status.DONE, 100))
+        self.assertEqual(set(SessionData.objects.filter(session=self.session).values_list('type', flat=True)),
+                         {'smartwatch_raw', 'derivables', 'smoothed', 'processed', map_payload.MAP_DATA_TYPE,
+                          *map(resolutions.resolution_type, resolutions.RESOLUTIONS)})
+
+    @override_settings(OPENWEATHERMAP_API_KEY='test-key')
+    def test_weather_is_stored_with_the_session(self):
+        TimemachineStub.requests, TimemachineStub.failures = [], 0
+        server = ThreadingHTTPServer(('127.0.0.1', 0), TimemachineStub)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        stub = partial(Weather, base_url=f'http://127.0.0.1:{server.server_port}/timemachine', cache=LocMemCache('celery-tests', {}))
+
+        with eager_tasks(), mock.patch('sessionData.tasks.Weather', stub):
+            process_session_data(self.session.id)
+            weather = SessionData.objects.get(session=self.session, type=tasks.WEATHER_DATA_TYPE).get_frame()
+            self.assertEqual(list(weather.columns), ['Wind Speed', 'Wind Gust', 'Wind Direction'])
+
+            # unchanged sessions keep their weather
+            requests = len(TimemachineStub.requests)
+            process_session_data(self.session.id)
+            self.assertEqual(len(TimemachineStub.requests), requests)
+
+
+class PipelineTestCase(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.session = create_user_session()
+        self.session.smartwatch_data_file_path = write_synthetic_tcx(os.path.join(tmp_dir.name, 'session.tcx'), 300)
+        self.session.save()
+
+    def test_valid_checkpoints_are_reused(self):
+        first = pipeline.run_pipeline(self.session)
+        self.assertEqual(first.computed, ['read', 'derivables', 'smooth', 'outliers'])
+        processed = SessionData.objects.get(session=self.session, type='processed').get_frame()
+
+        with self.assertNumQueries(1):
+            second = pipeline.run_pipeline(self.session)
+        self.assertEqual(second.computed, [])
+        self.assertEqual(second.reused, first.computed)
+        self.assertAlmostEqual(second.seconds_saved, first.seconds)
+        pd.testing.assert_frame_equal(SessionData.objects.get(session=self.session, type='processed').get_frame(), processed)
+
+    def test_changed_stage_recomputes_only_downstream(self):
+        pipeline.run_pipeline(self.session)
+        stages = [replace(stage, version=stage.version + 1) if stage.name == 'smooth' else stage for stage in pipeline.STAGES]
+
+        report = pipeline.run_pipeline(self.session, stages=stages)
+        self.assertEqual(report.reused, ['read', 'derivables'])
+        self.assertEqual(report.computed, ['smooth', 'outliers'])
+
+        stages[2] = replace(stages[2], params={'time_delta': 30})
+        report = pipeline.run_pipeline(self.session, stages=stages)
+        self.assertEqual(report.computed, ['smooth', 'outliers'])
+
+    def test_changed_document_recomputes_everything(self):
+        pipeline.run_pipeline(self.session)
+        write_synthetic_tcx(self.session.smartwatch_data_file_path, 200)
+        self.session.content_hash = pipeline.hash_file(self.session.smartwatch_data_file_path)
+        self.session.save()
+
+        report = pipeline.run_pipeline(self.session)
+        self.assertEqual(report.reused, [])
+
+    def test_reprocess_sessions_command(self):
+        out = io.StringIO()
+        call_command('reprocess_sessions', '--workers', '1', stdout=out)
+        self.assertIn('Reprocessed 1 sessions (0 up to date, 0 failed)', out.getvalue())
+        self.assertIn('derivables', out.getvalue())
+        self.assertEqual(SessionData.objects.filter(session=self.session).count(),
+                         len(pipeline.STAGES) + 1 + len(resolutions.RESOLUTIONS))
+        self.session.refresh_from_db()
+        self.assertIsNotNone(self.session.processed_at)
+
+        out = io.StringIO()
+        call_command('reprocess_sessions', str(self.session.id), '--workers', '1', stdout=out)
+        self.assertIn('Reprocessed 0 sessions (1 up to date, 0 failed)', out.getvalue())
+
+
+class ReprocessSessionsTestCase(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.sessions = []
+        for username in ('rider', 'other'):
+            session = create_user_session(username)
+            session.smartwatch_data_file_path = write_synthetic_tcx(os.path.join(tmp_dir.name, f'{username}.tcx'), 200)
+            session.save()
+            self.sessions.append(session)
+
+    def test_worker_pool_with_bulk_writes(self):
+        stats = reprocessing.reprocess_sessions(reprocessing.select_sessions(), workers=2, batch_size=1)
+        self.assertEqual((stats.sessions, stats.failed), (2, 0))
+        self.assertEqual(stats.points, 2 * 200)
+        self.assertEqual(set(stats.stage_seconds), {stage.name for stage in pipeline.STAGES})
+        self.assertEqual(ProcessingMetric.objects.filter(stage='read_tcx', rows_out=200).count(), 2)
+        for session in self.sessions:
+            session.refresh_from_db()
+            self.assertEqual(session.session_start.isoformat(), '2024-08-01T10:00:00+00:00')
+            self.assertIsNotNone(session.processed_at)
+            self.assertEqual(pipeline.run_pipeline(session).computed, [])
+
+        # the batch writes leave exactly the same checkpoints as processing one session in place
+        rows = SessionData.objects.filter(session=self.sessions[0]).exclude(type=map_payload.MAP_DATA_TYPE)
+        stored = {row.type: row.get_frame() for row in rows}
+        pipeline.run_pipeline(self.sessions[0], force=True)
+        for row in rows.all():
+            pd.testing.assert_frame_equal(row.get_frame(), stored[row.type])
+
+    def test_selection_and_failures(self):
+        selected = reprocessing.select_sessions(usernames=['other'], until=date(2024, 1, 1))
+        self.assertEqual(list(selected), [])  # create_user_session starts sessions now
+        self.assertEqual(list(reprocessing.select_sessions(usernames=['other'])), [self.sessions[1]])
+
+        os.remove(self.sessions[0].smartwatch_data_file_path)
+        stats = reprocessing.reprocess_sessions(reprocessing.select_sessions(), batch_size=10)
+        self.assertEqual((stats.sessions, stats.failed), (1, 1))
+        self.assertEqual(stats.errors[0][0], self.sessions[0].id)
+        self.assertFalse(SessionData.objects.filter(session=self.sessions[0]).exists())
+
+
+class ResolutionsTestCase(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.session = create_user_session()
+        self.session.smartwatch_data_file_path = write_synthetic_tcx(os.path.join(tmp_dir.name, 'session.tcx'), 300)
+        self.session.save()
+        self.client.login(username='rider', password='secret-password')
+
+    def test_levels_are_stored_with_the_session(self):
+        pipeline.process_session(self.session)
+        derivables = SessionData.objects.get(session=self.session, type=resolutions.RESOLUTION_SOURCE).get_frame()
+        for label, seconds in resolutions.RESOLUTIONS.items():
+            row = SessionData.objects.get(session=self.session, type=resolutions.resolution_type(label))
+            pd.testing.assert_frame_equal(row.get_frame(), smoothing.resample_frame(derivables, seconds), check_dtype=False)
+        pd.testing.assert_frame_equal(resolutions.get_resolution(self.session, 'raw'), derivables)
+
+        # current levels are not rebuilt, missing ones are built on first use
+        self.assertEqual(resolutions.store_resolutions(self.session), [])
+        SessionData.objects.filter(session=self.session, type=resolutions.resolution_type('60s')).delete()
+        self.assertEqual(len(resolutions.get_resolution(self.session, '60s', ['Speed'])), 5)
+        self.assertTrue(SessionData.objects.filter(session=self.session, type=resolutions.resolution_type('60s')).exists())
+        with self.assertRaises(ValueError):
+            resolutions.get_resolution(self.session, '5s')
+
+    def test_reprocessing_rebuilds_levels(self):
+        pipeline.process_session(self.session)
+        SessionData.objects.filter(session=self.session, type__startswith='resolution_').delete()
+        reprocessing.reprocess_sessions(reprocessing.select_sessions(), force=True)
+        stored = SessionData.objects.filter(session=self.session, type__startswith='resolution_')
+        self.assertEqual(stored.count(), len(resolutions.RESOLUTIONS))
+        self.assertEqual(resolutions.store_resolutions(self.session), [])
+
+    def test_series_view(self):
+        url = reverse('session_series', args=(self.session.id,))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        pipeline.process_session(self.session)
+
+        response = self.client.get(url, {'resolution': '60s', 'columns': 'Speed,Heart Rate'})
+        self.assertEqual(response.status_code, 200)
+        series = response.json()
+        self.assertEqual(series['resolution'], '60s')
+        self.assertEqual(set(series['columns']), {'Speed', 'Heart Rate'})
+        self.assertEqual(len(series['time']), 5)
+        self.assertEqual(series['time'][1] - series['time'][0], 60_000)
+        self.assertEqual(len(self.client.get(url, {'resolution': 'raw'}).json()['time']), 299)  # the last point has no distance
+
+        self.assertEqual(self.client.get(url, {'resolution': '5s'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'columns': 'Wind'}).status_code, 400)
+        User.objects.create_user(username='other', password='secret-password')
+        self.client.login(username='other', password='secret-password')
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+def straight_track(seconds=600, speed=5.0, heart_rate=150.0, spike=None):
+    # derivables of a track heading north at a constant speed, one point per second,
+    # with a GPS spike 2 km off the track at point `spike`
+    index = pd.date_range('2024-08-01 10:00', periods=seconds, freq='1s', tz='UTC', name='Time')
+    latitude = 52.0 + np.arange(seconds) * speed / 111_195.0
+    if spike is not None:
+        latitude[spike] += 0.02
+    data = pd.DataFrame({'Time': index, 'Latitude': latitude, 'Longitude': 4.0, 'Altitude': 0.0,
+                         'Heart Rate': heart_rate}, index=index)
+    return ProcessSessionData(data, collector=MetricsCollector()).calculate_derivables()
+
+
+class SessionSummaryTestCase(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.session = create_user_session()
+        self.session.smartwatch_data_file_path = write_synthetic_tcx(os.path.join(tmp_dir.name, 'session.tcx'), 300)
+        self.session.save()
+
+    def test_summarize_constant_speed(self):
+        fields = summaries.summarize(straight_track(spike=300))
+        self.assertAlmostEqual(fields['distance'], 5.0 * 598, delta=10)  # not 4 km more out to the spike and back
+        self.assertAlmostEqual(fields['duration'], 598)
+        for name in ('max_speed', 'avg_speed', 'best_2s', 'best_10s', 'best_500m'):
+            self.assertAlmostEqual(fields[name], 5.0, delta=0.1, msg=name)
+        self.assertEqual(fields['heart_rate_zones'], [0.0, 0.0, 598.0, 0.0, 0.0])  # 150 bpm is 79% of the max
+        self.assertEqual((fields['avg_heart_rate'], fields['max_heart_rate']), (150.0, 150.0))
+        self.assertLess(fields['max_latitude'], 52.0 + 600 * 5.0 / 111_195.0)
+        self.assertEqual((fields['min_longitude'], fields['max_longitude']), (4.0, 4.0))
+
+        self.assertEqual(set(fields['best_efforts']), {effort.label for effort in segments.BEST_EFFORTS})
+        self.assertIsNone(fields['best_efforts']['alpha_500'])  # it never turns back
+        self.assertTrue(fields['best_efforts']['500m']['start'].startswith('2024-08-01T10:0'))
+
+        short = summaries.summarize(straight_track(seconds=60))
+        self.assertIsNone(short['best_500m'])
+        self.assertIsNotNone(short['best_10s'])
+
+    def test_trackpoint_without_position(self):
+        data = straight_track()
+        data.iloc[300, data.columns.get_loc('Latitude')] = np.nan
+        data.iloc[301, data.columns.get_loc('Longitude')] = np.nan
+        fields = summaries.summarize(data)
+        self.assertAlmostEqual(fields['distance'], 5.0 * 598, delta=10)
+        for name in ('avg_speed', 'max_speed', 'best_2s', 'best_500m', 'min_latitude', 'max_latitude',
+                     'centroid_latitude', 'centroid_longitude'):
+            self.assertTrue(np.isfinite(fields[name]), name)
+        self.assertEqual(len(fields['geohash']), geo.GEOHASH_PRECISION)
+
+        summary = summaries.build_summary(self.session, fields, 'fingerprint')
+        summaries.replace_summaries([summary])
+        self.assertAlmostEqual(SessionSummary.objects.aggregate(total=Sum('distance'))['total'], fields['distance'])
+
+    def test_stored_with_the_session(self):
+        pipeline.process_session(self.session)
+        summary = SessionSummary.objects.get(session=self.session)
+        self.assertEqual((summary.user_id, summary.session_start), (self.session.user_id, self.session.session_start))
+        self.assertGreater(summary.distance, 0)
+        with self.assertNumQueries(2):
+            self.assertEqual(summaries.store_summary(self.session).pk, summary.pk)
+
+        # reprocessing a changed derivables stage replaces the summary
+        reprocessing.reprocess_sessions(reprocessing.select_sessions(), force=True)
+        self.assertNotEqual(SessionSummary.objects.get(session=self.session).pk, summary.pk)
+
+    def test_backfill_command(self):
+        pipeline.process_session(self.session)
+        SessionSummary.objects.all().delete()
+        create_user_session('other')  # never processed
+
+        out = io.StringIO()
+        call_command('backfill_summaries', '--workers', '1', stdout=out, stderr=io.StringIO())
+        self.assertIn('Summarized 1 sessions (0 up to date, 1 failed)', out.getvalue())
+        self.assertTrue(SessionSummary.objects.filter(session=self.session).exists())
+
+        out = io.StringIO()
+        call_command('backfill_summaries', '--workers', '2', stdout=out, stderr=io.StringIO())
+        self.assertIn('Summarized 0 sessions (1 up to date, 1 failed)', out.getvalue())
+        stats = reprocessing.backfill_summaries(reprocessing.select_sessions(usernames=['rider']), workers=2, force=True)
+        self.assertEqual((stats.sessions, stats.failed), (1, 0))
+
+    def test_dashboard(self):
+        pipeline.process_session(self.session)
+        other = create_user_session('other')
+        SessionSummary.objects.create(session=other, user=other.user, session_start=other.session_start,
+                                      distance=99_000, duration=3600, max_speed=20, avg_speed=10)
+
+        self.client.login(username='rider', password='secret-password')
+        summary = SessionSummary.objects.get(session=self.session)
+        with self.assertNumQueries(4):  # the user and the three summary queries
+            response = self.client.get(reverse('session_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['totals']['sessions'], 1)
+        self.assertAlmostEqual(response.context['totals']['distance'], summary.distance / 1000)
+        self.assertAlmostEqual(response.context['recent'][0]['max_speed'], summary.max_speed * 1.943844)
+        self.assertEqual(len(response.context['months']), 1)
+        self.assertContains(response, reverse('session_results', args=(self.session.id,)))
+
+        SessionSummary.objects.filter(session=self.session).delete()
+        self.assertContains(self.client.get(reverse('session_dashboard')), 'No processed sessions yet')
+
+
+class SessionsNearbyTestCase(TestCase):
+    def summarize_at(self, session, latitude, longitude):
+        return SessionSummary.objects.create(
+            session=session, user=session.user, session_start=session.session_start, distance=10_000, duration=3600,
+            max_speed=10, avg_speed=5, centroid_latitude=latitude, centroid_longitude=longitude,
+            geohash=geo.geohash(latitude, longitude))
+
+    def setUp(self):
+        self.session = create_user_session()
+        self.user = self.session.user
+
+    def another_session(self):
+        return UserSession.objects.create(user=self.user, session_start=self.session.session_start,
+                                          session_stop=self.session.session_stop, smartwatch_data_file_path='')
+
+    def test_geohash(self):
+        self.assertEqual(geo.geohash(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertEqual(len(geo.geohash(0, 0)), geo.GEOHASH_PRECISION)
+        for latitude, longitude, radius in ((52.0, 4.0, 5000), (52.0, 179.99, 5000), (-33.9, 18.4, 100), (70.0, 0.0, 50_000)):
+            cover = geo.geohash_cover(latitude, longitude, radius)
+            self.assertLessEqual(len(cover), 9)
+            self.assertTrue(any(geo.geohash(latitude, longitude).startswith(prefix) for prefix in cover))
+        self.assertEqual(geo.geohash_successor('u4pr'), 'u4ps')
+        self.assertEqual(geo.geohash_successor('u4pz'), 'u4q')  # carries at the last character of the alphabet
+        self.assertEqual(geo.geohash_successor('9'), 'b')
+        self.assertIsNone(geo.geohash_successor('zz'))
+        # a tighter radius gives longer prefixes
+        self.assertGreater(len(geo.geohash_cover(52.0, 4.0, 100)[0]), len(geo.geohash_cover(52.0, 4.0, 5000)[0]))
+
+    def test_summarize_sets_the_location(self):
+        fields = summaries.summarize(straight_track())
+        self.assertAlmostEqual(fields['centroid_latitude'], (fields['min_latitude'] + fields['max_latitude']) / 2, places=4)
+        self.assertEqual(fields['geohash'], geo.geohash(fields['centroid_latitude'], fields['centroid_longitude']))
+
+    def test_sessions_near(self):
+        near = self.summarize_at(self.session, 52.0, 3.8675)
+        farther = self.summarize_at(self.another_session(), 52.001, 3.8675)
+        self.summarize_at(self.another_session(), 52.2, 3.8675)  # 22 km
+        # just across a geohash cell boundary from the spot, which the neighbouring cells cover
+        across = self.summarize_at(self.another_session(), 52.0003, 3.8665)
+        self.assertNotEqual(across.geohash[:4], near.geohash[:4])
+        self.summarize_at(create_user_session('other'), 52.0, 3.8675)
+
+        with self.assertNumQueries(1):
+            found = summaries.sessions_near(self.user, 52.0003, 3.8675, 5000)
+        self.assertEqual([summary.pk for summary, _ in found], [near.pk, across.pk, farther.pk])
+        self.assertAlmostEqual(found[0][1], 33.4, delta=0.5)
+        self.assertEqual(summaries.sessions_near(self.user, -33.9, 18.4, 5000), [])
+
+    def test_view(self):
+        self.summarize_at(self.session, 52.0, 4.0)
+        self.client.login(username='rider', password='secret-password')
+        url = reverse('sessions_nearby')
+        for params in ({}, {'lat': 52}, {'lat': 'x', 'lon': 4}, {'lat': 91, 'lon': 4}, {'lat': 52, 'lon': 4, 'radius': 0},
+                       {'lat': 52, 'lon': 4, 'radius': 10 ** 6}, {'lat': 'nan', 'lon': 4}):
+            self.assertEqual(self.client.get(url, params).status_code, 400, params)
+
+        response = self.client.get(url, {'lat': 52.01, 'lon': 4.0})
+        self.assertEqual(response.status_code, 200)
+        sessions = response.json()['sessions']
+        self.assertEqual([row['session_id'] for row in sessions], [self.session.id])
+        self.assertEqual(sessions[0]['meters_away'], 1112)
+        self.assertEqual(sessions[0]['results_url'], reverse('session_results', args=(self.session.id,)))
+        self.assertEqual(self.client.get(url, {'lat': 52.01, 'lon': 4.0, 'radius': 1000}).json(), {'sessions': []})
+
+    def test_benchmark(self):
+        results = benchmark_nearby(count=200, users=2, queries=3)
+        self.assertEqual([row['method'] for row in results], ['geohash index', 'scan', 'plan'])
+        self.assertEqual(results[0]['found'], results[1]['found'])
+        self.assertIn('summary_user_geohash_idx', results[2]['plan'])
+        self.assertFalse(SessionSummary.objects.filter(user__username__startswith='benchmark-nearby-').exists())
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        User.objects.create_user(username='rider', password='secret-password')
+        self.client.login(username='rider', password='secret-password')
+
+    def test_upload(self):
+        self.assertViewQueryBudget(1, reverse('session_upload'))
+        with mock.patch('sessionData.views.process_session_data'):
+            self.assertViewQueryBudget(
+                6, reverse('session_upload'), method='post',
+                data={'file': SimpleUploadedFile('session.tcx', TCX_WITH_GAPS)}, status_code=302,
+            )
+
+    def test_results_and_map(self):
+        with mock.patch('sessionData.views.process_session_data'):
+            self.client.post(reverse('session_upload'), {'file': SimpleUploadedFile('session.tcx', write_synthetic_tcx_bytes(100))})
+        session = UserSession.objects.get()
+        with eager_tasks():
+            process_session_data(session.id)
+        cache.delete(map_payload.map_cache_key(session.id))
+
+        self.assertViewQueryBudget(2, reverse('session_results', args=(session.id,)))
+        self.assertViewQueryBudget(2, reverse('session_status', args=(session.id,)))
+        self.assertViewQueryBudget(3, reverse('session_map_data', args=(session.id,)))
+        self.assertViewQueryBudget(1, reverse('session_map_data', args=(session.id,)))
@@ -0,0 +1,164 @@
+import hashlib
+import os
+import xml.etree.ElementTree as ET
+import zlib
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+from django.template.defaultfilters import filesizeformat
+
+from .tcx_parser import TcxStreamParser
+
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def content_addressed_name(content_hash):
+    return os.path.join('tcx', content_hash[:2], f'{content_hash}.tcx')
+
+
+class ParsedTcxUpload(UploadedFile):
+    """A TCX upload that was written straight to MEDIA_ROOT and parsed while it was received.
+
+    content_hash is the SHA-256 of the (decompressed) TCX document, columns the parsed trackpoints
+    (see TcxStreamParser.close) and error a message if the upload is not a readable TCX file.
+    Valid uploads are stored content-addressed; is_new is False if an identical document was
+    already stored, in which case path points at that shared copy.
+    """
+    def __init__(self, path, name, size, content_hash, columns, error=None, is_new=True):
+        super().__init__(open(path, 'rb'), name=name, content_type='application/vnd.garmin.tcx+xml', size=size)
+        self.path = path
+        self.content_hash = content_hash
+        self.columns = columns
+        self.error = error
+        self.is_new = is_new
+
+    def temporary_file_path(self):
+        return self.path
+
+    def discard(self):
+        self.close()
+        # never remove a stored document other sessions may point at
+        if self.is_new and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class TcxUploadHandler(FileUploadHandler):
+    """Stream an uploaded TCX file (optionally gzip-compressed) to storage, hashing and parsing each chunk.
+
+    The decompressed document is written once and then renamed to its content-addressed name
+    (see content_addressed_name), so the view never has to copy it, identical documents are only
+    stored once and the Celery task can start from the already parsed trackpoints. Documents larger
+    than settings.TCX_MAX_DECOMPRESSED_SIZE are rejected as soon as they reach it; gzip data is
+    decompressed a chunk at a time, so a small file inflating to gigabytes is stopped there too.
+    """
+    chunk_size = 64 * 2**10
+
+    def __init__(self, request=None, field_name='file', storage=None):
+        super().__init__(request)
+        self.upload_field_name = field_name
+        self.storage = storage or FileSystemStorage()
+        self.max_size = settings.TCX_MAX_DECOMPRESSED_SIZE
+        self.activated = False
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.activated = field_name == self.upload_field_name
+        if not self.activated:
+            return
+
+        name = file_name[:-3] if file_name.lower().endswith('.gz') else file_name
+        os.makedirs(self.storage.location, exist_ok=True)
+        while True:
+            self.stored_name = self.storage.get_available_name(name)
+            try:
+                self.file = open(self.storage.path(self.stored_name), 'xb')
+                break
+            except FileExistsError:
+                continue  # another upload claimed the name in the meantime
+
+        self.hash = hashlib.sha256()
+        self.parser = TcxStreamParser()
+        self.decompressor = None
+        self.error = None
+        self.size = 0
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.activated:
+            return raw_data
+        if start == 0 and raw_data[:2] == GZIP_MAGIC:
+            self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self.error is None:
+            try:
+                if self.decompressor:
+                    self._decompress(raw_data)
+                else:
+                    self._consume(raw_data)
+            except zlib.error as e:
+                self.error = f"Invalid gzip data: {e}"
+        return None
+
+    def file_complete(self, file_size):
+        if not self.activated:
+            return None
+
+        columns = None
+        try:
+            if self.error is None and self.decompressor is not None:
+                self._consume(self.decompressor.flush())
+            if self.error is None:
+                columns = self.parser.close()
+                if not len(columns['Time']):
+                    self.error = "The file does not contain any trackpoints."
+        except zlib.error as e:
+            self.error = f"Invalid gzip data: {e}"
+        except ET.ParseError as e:
+            self.error = f"Invalid TCX file: {e}"
+        finally:
+            self.file.close()
+
+        content_hash = self.hash.hexdigest()
+        path = self.storage.path(self.stored_name)
+        is_new = True
+        if self.error is None:
+            path, is_new = self._store_content_addressed(path, content_hash)
+        return ParsedTcxUpload(path, self.stored_name, self.size, content_hash, columns, self.error, is_new)
+
+    def _store_content_addressed(self, path, content_hash):
+        stored_path = self.storage.path(content_addressed_name(content_hash))
+        os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+        try:
+            # created exclusively: of concurrent uploads of a new document only one owns the stored copy
+            # and may remove it again (see ParsedTcxUpload.discard)
+            os.link(path, stored_path)
+        except FileExistsError:
+            return stored_path, False
+        finally:
+            os.remove(path)
+        return stored_path, True
+
+    def upload_interrupted(self):
+        if self.activated:
+            self.file.close()
+            os.remove(self.storage.path(self.stored_name))
+
+    def _decompress(self, data):
+        # at most chunk_size bytes of output per step, so the size limit applies before the output is in memory
+        while data and self.error is None:
+            self._consume(self.decompressor.decompress(data, self.chunk_size))
+            data = self.decompressor.unconsumed_tail
+
+    def _consume(self, data):
+        self.size += len(data)
+        if self.size > self.max_size:
+            self.error = f"The file is larger than {filesizeformat(self.max_size)} (uncompressed)."
+            return
+        self.hash.update(data)
+        self.file.write(data)
+        try:
+            self.parser.feed(data)
+        except ET.ParseError as e:
+            self.error = f"Invalid TCX file: {e}"
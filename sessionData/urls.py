@@ -21,8 +21,14 @@ from django.conf import settings
 
 urlpatterns = [
     path('upload/', session_views.upload_session_data, name='session_upload'),
-    path('upload/success/', session_views.upload_success, name='session_upload_success'),
+    path('upload/success/<int:session_id>/', session_views.upload_success, name='session_upload_success'),
     path('session/results/<int:session_id>/', session_views.session_results, name='session_results'),
+    path('session/map/<int:session_id>/', session_views.session_map_data, name='session_map_data'),
+    path('session/series/<int:session_id>/', session_views.session_series, name='session_series'),
+    path('dashboard/', session_views.dashboard, name='session_dashboard'),
+    path('sessions/nearby/', session_views.sessions_nearby, name='sessions_nearby'),
+    path('session/status/<int:session_id>/', session_views.session_status, name='session_status'),
+    path('session/events/<int:session_id>/', session_views.session_events, name='session_events'),
 ]
 
 # only in development
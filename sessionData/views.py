@@ -1,79 +1,266 @@
 import os
-from django.http import HttpResponseRedirect, HttpResponse
-from django.shortcuts import render
+from functools import wraps
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponseRedirect, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render
 from django.urls import reverse
 from .forms import UploadFileForm
-from .models import UserSession, SessionData
+from .models import SessionSummary, UserSession, SessionData
 from django.contrib.auth.decorators import login_required
-from django.core.files.storage import FileSystemStorage
+from django.contrib.auth.views import redirect_to_login
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import condition
 import logging
-from datetime import datetime
+from .data_processor import ProcessSessionData
+from .deduplication import find_reusable_session, reuse_session
+from .pipeline import read_fingerprint
+from .progress import status_entry, status_events, status_snapshot
 from .tasks import process_session_data
-import pandas as pd
+from .upload_handlers import TcxUploadHandler
+from .map_payload import get_map_payload
+from .resolutions import get_resolution
+from .summaries import sessions_near
 
 logger = logging.getLogger(__name__)
 
 project_path = os.path.dirname(os.path.abspath(__file__))
 
+@csrf_exempt
 @login_required
 def upload_session_data(request):
+    # the upload handler has to be installed before anything reads request.POST/FILES,
+    # so CSRF protection is applied to the inner view instead
+    request.upload_handlers.insert(0, TcxUploadHandler(request))
+    return _upload_session_data(request)
+
+
+@csrf_protect
+def _upload_session_data(request):
     if request.method == 'POST':
         form = UploadFileForm(request.POST, request.FILES)
         if form.is_valid():
+            # The file was streamed to storage, hashed and parsed by TcxUploadHandler while it was received
+            uploaded_file = request.FILES['file']
+            if uploaded_file.error:
+                uploaded_file.discard()
+                logger.error("Rejected upload %s: %s", uploaded_file.name, uploaded_file.error)
+                return render(request, 'sessionData/upload_error.html', {'error': uploaded_file.error})
+            uploaded_file.close()
             try:
-                # Process the uploaded file
-                uploaded_file = request.FILES['file']
-                fs = FileSystemStorage()
-                file_name = fs.save(uploaded_file.name, uploaded_file)
-                file_path = fs.path(file_name) # fs.url(file_name)
+                file_path = uploaded_file.path
                 logger.info(f'File path: {file_path}')
-                
-                # For demonstration, setting the session start and stop times to the current time
-                # In a real scenario, these would be determined based on the uploaded data
-                session_start = datetime.now()
-                session_stop = datetime.now()
-                
-                # Assuming user is logged in, create a new UserSession instance
-                user_session = UserSession.objects.create(
-                    user=request.user,
-                    session_start=session_start,
-                    session_stop=session_stop,
-                    smartwatch_data_file_path=file_path
-                )
-                logger.info(f"File {file_name} uploaded successfully.")
-                
-                # Trigger the Celery task for processing the uploaded session data
-                process_session_data.delay(user_session.id)
-                
-                return HttpResponseRedirect(reverse('session_upload_success'))  # Redirect to a new URL
+
+                # An identical file for this user was processed before: link to its results
+                source_session = find_reusable_session(request.user, uploaded_file.content_hash)
+                if source_session is not None:
+                    user_session = reuse_session(request.user, source_session, uploaded_file)
+                    logger.info(f"File {uploaded_file.name} is a duplicate, session {user_session.id} reuses session {source_session.id}.")
+                    return HttpResponseRedirect(reverse('session_upload_success', args=(user_session.id,)))
+
+                data = ProcessSessionData().load_columns(uploaded_file.columns)
+                if data.empty:
+                    raise ValueError("The file does not contain any complete trackpoints.")
+
+                with transaction.atomic():
+                    user_session = UserSession.objects.create(
+                        user=request.user,
+                        session_start=data.index[0],
+                        session_stop=data.index[-1],
+                        smartwatch_data_file_path=file_path,
+                        content_hash=uploaded_file.content_hash,
+                        file_size=uploaded_file.size,
+                    )
+                    raw_session_data = SessionData(session=user_session, type='smartwatch_raw',
+                                                   fingerprint=read_fingerprint(uploaded_file.content_hash))
+                    raw_session_data.set_frame(data)
+                    raw_session_data.save()
+
+                    # Trigger the Celery task only once the session is committed and visible to the worker
+                    transaction.on_commit(lambda: process_session_data.delay(user_session.id))
+                logger.info(f"File {uploaded_file.name} uploaded successfully.")
+
+                return HttpResponseRedirect(reverse('session_upload_success', args=(user_session.id,)))  # Redirect to a new URL
             except Exception as e:
+                uploaded_file.discard()
                 logger.error("Error uploading file: %s", e, exc_info=True)
                 return render(request, 'sessionData/upload_error.html', {'error': str(e)})
+        elif 'file' in request.FILES:
+            request.FILES['file'].discard()
     else:
         form = UploadFileForm()
     return render(request, 'sessionData/upload.html', {'form': form})
 
-def upload_success(request):
-    return render(request, 'sessionData/upload_success.html')
+@login_required
+def upload_success(request, session_id):
+    # follows the processing of the upload through session_events
+    session = get_object_or_404(UserSession, pk=session_id, user=request.user)
+    return render(request, 'sessionData/upload_success.html', {'session': session})
+
+def async_login_required(view):
+    # login_required for async views (Django 5.0's decorator only wraps sync views)
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        # resolved once here, so templates and helpers reading request.user do not query in the event loop
+        request.user = user
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@async_login_required
+async def session_results(request, session_id):
+    results = Q(session__id=session_id) | Q(session__reused_by__id=session_id)
+    if not await SessionData.objects.filter(results, type='processed').aexists():
+        logger.error("Session data not found for session_id {}".format(session_id))
+        return HttpResponse("Session data not found.", status=404)
+
+    # the map points are fetched from session_map_data instead of being inlined into the page
+    return render(request, 'sessionData/session_results.html', {'session_id': session_id})
+
+
+@async_login_required
+async def session_status(request, session_id):
+    # processing state of one of the user's sessions; session_events pushes its changes instead
+    session = await (UserSession.objects.filter(pk=session_id, user=request.user)
+                     .values('status', 'progress', 'status_message', 'uploaded_at', 'processed_at',
+                             'reused_from_id', 'reused_from__processed_at').afirst())
+    if session is None:
+        return JsonResponse({'error': "Session not found."}, status=404)
+    processed_at = session['reused_from__processed_at'] if session['reused_from_id'] else session['processed_at']
+    return JsonResponse({
+        **status_entry(session_id, session['status'], session['progress'], session['status_message']),
+        'processed': processed_at is not None,
+        'uploaded_at': session['uploaded_at'],
+        'processed_at': processed_at,
+    })
+
+
+@async_login_required
+async def session_events(request, session_id):
+    # Server-Sent Events with the session's status until it is done or failed, in place of polling.
+    # Only ASGI servers (SERVER_MODE=asgi) stream them; under WSGI, Django would collect the whole
+    # stream before sending it and hold a worker thread meanwhile, so the current status is sent
+    # on its own and EventSource polls by reconnecting (see progress.status_snapshot)
+    if not await UserSession.objects.filter(pk=session_id, user=request.user).aexists():
+        return HttpResponse("Session not found.", status=404)
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(status_events(session_id), content_type='text/event-stream')
+    else:
+        response = HttpResponse(await status_snapshot(session_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # let reverse proxies pass every event on at once
+    return response
+
+
+def _owned_map_payload(request, session_id):
+    # looked up once per request and shared by the ETag/Last-Modified checks and the view
+    if not hasattr(request, '_map_payload'):
+        entry = get_map_payload(session_id)
+        request._map_payload = entry if entry and entry['user_id'] == request.user.id else None
+    return request._map_payload
+
+
+def _map_payload_etag(request, session_id):
+    entry = _owned_map_payload(request, session_id)
+    return entry['etag'] if entry else None
+
+
+def _map_payload_last_modified(request, session_id):
+    entry = _owned_map_payload(request, session_id)
+    return entry['last_modified'] if entry else None
+
+
+@login_required
+@condition(etag_func=_map_payload_etag, last_modified_func=_map_payload_last_modified)
+def session_map_data(request, session_id):
+    # level-of-detail map points, precomputed by process_session_data and served from the cache
+    entry = _owned_map_payload(request, session_id)
+    if entry is None:
+        return HttpResponse("Session data not found.", status=404)
+    response = HttpResponse(entry['body'], content_type='application/json')
+    response['Cache-Control'] = 'private, max-age=0, must-revalidate'
+    return response
+
 
 @login_required
-def session_results(request, session_id):
+def session_series(request, session_id):
+    # the session's time series at a stored resolution (?resolution=raw, 1s, 10s or 60s), optionally
+    # limited to some columns (?columns=Speed,Heart Rate); nothing is resampled per request
+    session = get_object_or_404(UserSession.objects.select_related('reused_from'), pk=session_id, user=request.user)
+    label = request.GET.get('resolution', '10s')
+    columns = [name for name in request.GET.get('columns', '').split(',') if name] or None
     try:
-        session_data = SessionData.objects.get(session__id=session_id, type='processed')
-        
-        data = pd.read_json(session_data.data, convert_dates=['Time'])
-        data.index = data['Time']
-        data = data.dropna()
-        # Columns: Time, Latitude, Longitude, Altitude, Speed, Direction, Heart Rate, Distance Delta, Acceleration
-        #print(data)
-        # Assuming sessionData is an array of {lat, lng, intensity} objects
-
-        data_for_map = data[['Latitude', 'Longitude', 'Speed']]
-        data_for_map = data_for_map.rename(columns={'Latitude': 'lat', 'Longitude': 'lng', 'Speed': 'intensity'})
-        data_for_map['intensity'] = data_for_map['intensity'] / data_for_map['intensity'].max() * 50
-        data_for_map = data_for_map.to_dict(orient='records')
-
-        return render(request, 'sessionData/session_results.html', {'session_data': data_for_map})
-    except SessionData.DoesNotExist as e:
-        logger.error("Session data not found for session_id {}: {}".format(session_id, e), exc_info=True)
-        return HttpResponse("Session data not found.", status=404)
\ No newline at end of file
+        frame = get_resolution(session, label, columns)
+    except (ValueError, KeyError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if frame is None:
+        return HttpResponse("Session data not found.", status=404)
+
+    frame = frame.drop(columns='Time', errors='ignore')
+    return JsonResponse({
+        'resolution': label,
+        'time': (frame.index.as_unit('ms').asi8).tolist(),  # milliseconds since the epoch
+        'columns': {name: [None if value != value else value for value in frame[name].tolist()] for name in frame.columns},
+    })
+
+
+KNOTS = 1.943844  # per m/s
+
+
+def _dashboard_row(row):
+    # summary values in the units riders use: km, hours and knots
+    scales = {'distance': 1 / 1000, 'duration': 1 / 3600, 'max_speed': KNOTS, 'avg_speed': KNOTS,
+              'best_2s': KNOTS, 'best_10s': KNOTS, 'best_500m': KNOTS}
+    return {name: value * scales[name] if name in scales and value is not None else value for name, value in row.items()}
+
+
+@login_required
+def dashboard(request):
+    # the user's totals, months and records from SessionSummary alone, in three indexed queries;
+    # no session data is decoded
+    summaries = SessionSummary.objects.filter(user=request.user)
+    records = {'distance': Sum('distance'), 'duration': Sum('duration'), 'max_speed': Max('max_speed'),
+               'best_2s': Max('best_2s'), 'best_10s': Max('best_10s'), 'best_500m': Max('best_500m')}
+    totals = summaries.aggregate(sessions=Count('pk'), **records)
+    months = (summaries.annotate(month=TruncMonth('session_start')).values('month')
+              .annotate(sessions=Count('pk'), **records).order_by('-month')[:12])
+    recent = summaries.order_by('-session_start').values(
+        'session_id', 'session_start', 'distance', 'duration', 'max_speed', 'avg_speed', 'best_500m')[:10]
+    return render(request, 'sessionData/dashboard.html', {
+        'totals': _dashboard_row(totals),
+        'months': [_dashboard_row(month) for month in months],
+        'recent': [_dashboard_row(session) for session in recent],
+    })
+
+
+NEARBY_MAX_RADIUS = 100_000  # meters
+
+
+@login_required
+def sessions_nearby(request):
+    # the user's sessions around a spot (?lat=..&lon=..&radius=meters, default 5 km), nearest first,
+    # looked up through the geohash index of their summaries
+    try:
+        latitude = float(request.GET['lat'])
+        longitude = float(request.GET['lon'])
+        radius = float(request.GET.get('radius', 5000))
+    except (KeyError, ValueError):
+        return JsonResponse({'error': "lat and lon are required, radius is optional, all as numbers."}, status=400)
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180 and 0 < radius <= NEARBY_MAX_RADIUS):
+        return JsonResponse({'error': f"lat, lon or radius out of range (radius up to {NEARBY_MAX_RADIUS} m)."}, status=400)
+
+    return JsonResponse({'sessions': [{
+        'session_id': summary.session_id,
+        'session_start': summary.session_start,
+        'meters_away': round(meters),
+        'latitude': summary.centroid_latitude,
+        'longitude': summary.centroid_longitude,
+        'distance': summary.distance,
+        'max_speed': summary.max_speed,
+        'results_url': reverse('session_results', args=(summary.session_id,)),
+    } for summary, meters in sessions_near(request.user, latitude, longitude, radius)]})
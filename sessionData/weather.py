@@ -1,22 +1,81 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 import pandas as pd
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 
+logger = logging.getLogger(__name__)
+
+OPENWEATHER_TIMEMACHINE_URL = "https://api.openweathermap.org/data/3.0/onecall/timemachine"
 
 
 class Weather:
-    def __init__(self, api_key):
+    def __init__(self, api_key, base_url=OPENWEATHER_TIMEMACHINE_URL, max_workers=8, retries=3, backoff_factor=0.5,
+                 timeout=10, cache=None, cache_timeout=30 * 24 * 3600, coordinate_precision=2, time_resolution=600):
+        """
+        max_workers: parallel requests in concurrent mode, also the size of the connection pool
+        retries, backoff_factor: retry policy for 429 and 5xx responses (honours Retry-After)
+        cache: Django cache to store responses in, defaults to the 'default' cache; historic
+            weather never changes, so entries live for cache_timeout seconds
+        coordinate_precision: decimals lat/lon are rounded to (2 ~ 1 km) before fetching and caching
+        time_resolution: seconds timestamps are rounded to, so overlapping sessions share entries
+        """
         self._api_key = api_key
+        self.base_url = base_url
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.cache_timeout = cache_timeout
+        self.coordinate_precision = coordinate_precision
+        self.time_resolution = time_resolution
+        self._cache = cache
+
+        retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=('GET',), respect_retry_after_header=True, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=retry)
+        self._session = requests.Session()
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            from django.core.cache import cache
+            self._cache = cache
+        return self._cache
+
+    def close(self):
+        self._session.close()
+
+    def cache_key(self, lat, lon, timestamp):
+        return f"weather:{lat:.{self.coordinate_precision}f}:{lon:.{self.coordinate_precision}f}:{timestamp}"
+
+    def round_request(self, lat, lon, timestamp):
+        timestamp = int(round(timestamp / self.time_resolution) * self.time_resolution)
+        return round(lat, self.coordinate_precision), round(lon, self.coordinate_precision), timestamp
 
     def fetch_weather(self, lat, lon, timestamp):
         """Fetch weather data for a specific timestamp and location using OpenWeather API."""
-        url = f"https://api.openweathermap.org/data/3.0/onecall/timemachine?lat={lat}&lon={lon}&dt={timestamp}&appid={self._api_key}"
-        response = requests.get(url)
+        params = {'lat': lat, 'lon': lon, 'dt': timestamp, 'appid': self._api_key}
+        response = self._session.get(self.base_url, params=params, timeout=self.timeout)
         if response.status_code == 200:
             return response.json()
         else:
             raise Exception(f"Failed to fetch weather data: {response.status_code} {response.text}")
-        
+
+    def fetch_weather_cached(self, lat, lon, timestamp):
+        """Like fetch_weather, but on the rounded location/time and served from the cache when possible."""
+        lat, lon, timestamp = self.round_request(lat, lon, timestamp)
+        key = self.cache_key(lat, lon, timestamp)
+        api_response = self.cache.get(key)
+        if api_response is None:
+            api_response = self.fetch_weather(lat, lon, timestamp)
+            self.cache.set(key, api_response, self.cache_timeout)
+        return api_response
+
     def extract_weather_data(self, api_response):
         """Extract wind speed, wind gust, and wind direction from the API response."""
         data = api_response['data'][0]
@@ -26,21 +85,25 @@ class Weather:
             'Wind Gust': data.get('wind_gust', 0),  # Some responses may not have wind gust
             'Wind Direction': data['wind_deg']
         }
-    
-    def get_weather_data(self, lat, lon, start_time, end_time, interval):
+
+    def get_weather_data(self, lat, lon, start_time, end_time, interval, concurrent=True):
         """Fetch weather data for a range of timestamps and locations.
         interval in minutes
+        concurrent: fetch through the cache with up to max_workers parallel requests,
+            otherwise one uncached request after the other
         """
         start_timestamp = int(start_time.timestamp())
         # + intervall
         end_timestamp = int(end_time.timestamp()) + interval * 60
-        current_timestamp = start_timestamp
-        weather_data = []
-        while current_timestamp <= end_timestamp:
-            api_response = self.fetch_weather(lat, lon, current_timestamp)
-            weather_data.append(self.extract_weather_data(api_response))
-            current_timestamp += interval * 60
-        weather_data = pd.DataFrame(weather_data)
+        timestamps = range(start_timestamp, end_timestamp + 1, interval * 60)
+
+        if concurrent:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                api_responses = list(executor.map(lambda timestamp: self.fetch_weather_cached(lat, lon, timestamp), timestamps))
+        else:
+            api_responses = [self.fetch_weather(lat, lon, timestamp) for timestamp in timestamps]
+
+        weather_data = pd.DataFrame([self.extract_weather_data(api_response) for api_response in api_responses])
         weather_data['Timestamp'] = pd.to_datetime(weather_data['Timestamp']).dt.tz_localize('UTC')
 
         return weather_data
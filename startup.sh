@@ -1,5 +1,13 @@
 # startup.sh is used by infra/resources.bicep to automate database migrations and isn't used by the sample application
 python manage.py migrate
-gunicorn --workers 2 --threads 4 --timeout 60 --access-logfile \
-    '-' --error-logfile '-' --bind=0.0.0.0:8000 \
-     --chdir=/home/site/wwwroot azureproject.wsgi
\ No newline at end of file
+if [ "$SERVER_MODE" = "asgi" ]; then
+    # Async mode: one event loop per worker serves the async views without holding a thread per request.
+    # Persistent connections are not reused across requests under ASGI, so they are closed after every request.
+    DB_CONN_MAX_AGE=0 uvicorn azureproject.asgi:application --workers 2 --timeout-keep-alive 60 \
+        --host 0.0.0.0 --port 8000 --app-dir /home/site/wwwroot
+else
+    # Sync mode: the upload page's status events are polled (see sessionData.views.session_events).
+    gunicorn --workers 2 --threads 4 --timeout 60 --access-logfile \
+        '-' --error-logfile '-' --bind=0.0.0.0:8000 \
+         --chdir=/home/site/wwwroot azureproject.wsgi
+fi